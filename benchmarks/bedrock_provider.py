@@ -0,0 +1,91 @@
+import json
+import logging
+import sys
+import threading
+import timeit
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+import boto3  # type: ignore
+from langchain_aws import BedrockLLM  # type: ignore
+
+from src.bedrock_wrapper import NativeBedrockLLM, setup_model_kwargs
+from src.config import (BEDROCK_SERVICE, LLAMA_3_70B_MODEL_ID,
+                        MIXTRAL_8X7B_MODEL_ID)
+
+# Compares the per-call overhead of langchain_aws.BedrockLLM with the native
+# invoke_model provider, against a local stub of the bedrock-runtime
+# endpoint that answers instantly.
+# Run with: python -m benchmarks.bedrock_provider [iterations]
+
+STUB_RESPONSES: Dict[str, Dict] = {
+    LLAMA_3_70B_MODEL_ID: {"generation": " 3", "stop_reason": "stop"},
+    MIXTRAL_8X7B_MODEL_ID: {"outputs": [{"text": " 3",
+                                         "stop_reason": "stop"}]},
+}
+
+PROMPT: str = "Which intent does the email conversation have?"
+
+
+class StubBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        # The path is /model/<model id>/invoke, with the model id quoted.
+        model_id: str = self.path.split("/")[2].replace("%3A", ":")
+        body: bytes = json.dumps(STUB_RESPONSES[model_id]).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def measure(function: Callable[[], str], iterations: int) -> float:
+    function()
+    return min(timeit.repeat(function, number=iterations, repeat=3)) / (
+            iterations) * 1e6
+
+
+def main(iterations: int) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    warnings.simplefilter("ignore")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBedrockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    bedrock_client = boto3.client(
+            service_name=BEDROCK_SERVICE,
+            region_name="us-west-2",
+            endpoint_url=f"http://127.0.0.1:{server.server_port}",
+            aws_access_key_id="stub",
+            aws_secret_access_key="stub")
+
+    print(f"{'model':<40}{'langchain (us)':>16}{'native (us)':>14}")
+    for model_id in STUB_RESPONSES:
+        model_kwargs: dict = setup_model_kwargs(model_id, "intent")
+        langchain_llm = BedrockLLM(client=bedrock_client, model_id=model_id,
+                                   model_kwargs=model_kwargs)
+        native_llm = NativeBedrockLLM(bedrock_client, model_id, model_kwargs)
+
+        assert langchain_llm.invoke(PROMPT) == native_llm.invoke(PROMPT)
+
+        langchain_time: float = measure(
+                lambda: langchain_llm.invoke(PROMPT), iterations)
+        native_time: float = measure(
+                lambda: native_llm.invoke(PROMPT), iterations)
+
+        print(f"{model_id:<40}{langchain_time:>16.1f}{native_time:>14.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,89 @@
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Prints a per-module import time breakdown of the handler, based on
+# python -X importtime, and fails when it exceeds the budget or when a
+# dependency that should load lazily is imported eagerly.
+# Run with: python -m benchmarks.import_time [--budget-ms 400] [--runs 5]
+
+TARGET_MODULE: str = "src.lambda_handler"
+LAZY_MODULES: Tuple[str, ...] = ("boto3", "botocore", "langchain_aws",
+                                 "langchain_core", "requests", "httpx",
+                                 "numpy")
+
+
+def measure_imports(module: str) -> Dict[str, Tuple[int, int]]:
+    # Imports the module in a fresh interpreter and returns the self and
+    # cumulative import time of every imported module, in microseconds.
+    completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, check=True)
+    timings: Dict[str, Tuple[int, int]] = {}
+
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_time, cumulative_time, name = line[12:].split("|")
+        timings[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return timings
+
+
+def group_by_package(
+        timings: Dict[str, Tuple[int, int]]) -> List[Tuple[str, int]]:
+    packages: Dict[str, int] = defaultdict(int)
+
+    for name, (self_time, _) in timings.items():
+        package: str = name if name.startswith("src.") else (
+            name.split(".")[0])
+        packages[package] += self_time
+
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default=TARGET_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    arguments = parser.parse_args()
+
+    # The fastest run is the least disturbed by the rest of the machine.
+    runs: List[Dict[str, Tuple[int, int]]] = [
+        measure_imports(arguments.module) for _ in range(arguments.runs)
+    ]
+    timings: Dict[str, Tuple[int, int]] = min(
+            runs, key=lambda run: run[arguments.module][1])
+    total_ms: float = timings[arguments.module][1] / 1000
+
+    print(f"{'package':<40}{'self (ms)':>12}")
+    for package, self_time in group_by_package(timings)[:arguments.top]:
+        print(f"{package:<40}{self_time / 1000:>12.1f}")
+
+    eager_modules: List[str] = [
+        module for module in LAZY_MODULES if module in timings
+    ]
+
+    print(f"\n{arguments.module}: {total_ms:.1f} ms "
+          f"(budget {arguments.budget_ms:.1f} ms, best of {arguments.runs})")
+
+    failed: bool = False
+    if total_ms > arguments.budget_ms:
+        print("FAIL: import time exceeds the budget.")
+        failed = True
+    if eager_modules:
+        print(f"FAIL: imported eagerly: {', '.join(eager_modules)}.")
+        failed = True
+
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
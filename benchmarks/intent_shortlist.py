@@ -0,0 +1,99 @@
+import argparse
+import json
+import sys
+import timeit
+from typing import Any, Dict, List, Optional
+
+from src.intent_shortlist import (build_intent_index,
+                                  generate_catalog_signature,
+                                  shortlist_intents)
+from src.models import Intent, IntentRequest
+
+# Reports the recall of the lexical intent shortlist against a labelled set
+# for a range of top k values, i.e. how often the labelled intent is still in
+# the prompt, together with the share of the intent list that is sent, and
+# suggests the smallest k that reaches the target recall.
+# Run with: python -m benchmarks.intent_shortlist [--k 1 3 5 10]
+#           [--target-recall 1.0] [--dataset path]
+
+DATASET_PATH: str = "tests/data/intent_shortlist_labelled.json"
+
+
+def load_requests(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as dataset_file:
+        dataset: Dict[str, Any] = json.load(dataset_file)
+
+    return [
+        {
+            "request": IntentRequest(messages=conversation["messages"],
+                                     intents=dataset["intents"]),
+            "intent": conversation["intent"],
+        }
+        for conversation in dataset["conversations"]
+    ]
+
+
+def stringify(intents: List[Intent]) -> str:
+    return "\n".join(str(intent) for intent in intents)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--k", type=int, nargs="+",
+                        default=[1, 2, 3, 5, 8, 10, 15])
+    parser.add_argument("--target-recall", type=float, default=1.0)
+    arguments = parser.parse_args()
+
+    labelled: List[Dict[str, Any]] = load_requests(arguments.dataset)
+    intents: List[Intent] = labelled[0]["request"].intents
+    full_length: int = len(stringify(intents))
+
+    build_time: float = min(timeit.repeat(
+            lambda: build_intent_index.__wrapped__(
+                    generate_catalog_signature(intents)),
+            number=10, repeat=3)) / 10 * 1e3
+
+    print(f"conversations: {len(labelled)}, intents: {len(intents)}, "
+          f"index build: {build_time:.2f} ms")
+    print(f"\n{'k':>4}{'recall':>10}{'intents':>10}{'list size':>12}"
+          f"{'shortlist (us)':>16}")
+
+    suggested_k: Optional[int] = None
+    for top_k in arguments.k:
+        hits: int = 0
+        sent_intents: int = 0
+        sent_length: int = 0
+
+        for entry in labelled:
+            shortlist: List[Intent] = shortlist_intents(entry["request"],
+                                                        top_k)
+            hits += entry["intent"] in [intent.slug for intent in shortlist]
+            sent_intents += len(shortlist)
+            sent_length += len(stringify(shortlist))
+
+        recall: float = hits / len(labelled)
+        shortlist_time: float = min(timeit.repeat(
+                lambda: [shortlist_intents(entry["request"], top_k)
+                         for entry in labelled],
+                number=10, repeat=3)) / (10 * len(labelled)) * 1e6
+
+        print(f"{top_k:>4}{recall:>10.3f}"
+              f"{sent_intents / len(labelled):>10.1f}"
+              f"{sent_length / (len(labelled) * full_length):>12.1%}"
+              f"{shortlist_time:>16.1f}")
+
+        if suggested_k is None and recall >= arguments.target_recall:
+            suggested_k = top_k
+
+    if suggested_k is None:
+        print(f"\nNo k reaches a recall of {arguments.target_recall:.3f}.")
+        return 1
+
+    print(f"\nSmallest k with a recall of at least "
+          f"{arguments.target_recall:.3f}: {suggested_k}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import argparse
+import json
+import logging
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Tuple
+
+from src import data_extraction_service, intent_identification_service, \
+    joint_extraction_service
+from src.bedrock_wrapper import resolve_model_id
+from src.models import ExtractRequest, Intent, IntentRequest
+from src.prompt_renderer import get_model_family
+from src.token_budget import count_tokens
+
+# Compares the two-step flow, an intent prompt and then a parsing prompt for
+# the detected intent, with the joint prompt over a labelled set, offline.
+# The labelled answers stand in for the model: the benchmark counts the
+# input and output tokens of both flows, checks that the joint answers pass
+# validation, and estimates the model latency from a per-call overhead, a
+# prefill cost per input token and a decode cost per output token. The
+# default costs are assumptions; pass the ones measured for the model.
+# Run with: python -m benchmarks.joint_prompt [--dataset path]
+#           [--call-overhead-ms 250] [--prefill-ms-per-token 0.15]
+#           [--decode-ms-per-token 25]
+
+DATASET_PATH: str = "tests/data/joint_prompt_labelled.json"
+
+
+def load_conversations(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as dataset_file:
+        dataset: Dict[str, Any] = json.load(dataset_file)
+
+    return [
+        {
+            "request": IntentRequest(messages=conversation["messages"],
+                                     intents=dataset["intents"]),
+            "intent": conversation["intent"],
+            "parameters": conversation["parameters"],
+        }
+        for conversation in dataset["conversations"]
+    ]
+
+
+def find_intent(request: IntentRequest, slug: str) -> Intent:
+    return next(intent for intent in request.intents if intent.slug == slug)
+
+
+def render_two_step(entry: Dict[str, Any]) -> List[Tuple[str, str]]:
+    request: IntentRequest = entry["request"]
+    intent: Intent = find_intent(request, entry["intent"])
+    extract_request: ExtractRequest = ExtractRequest(
+            messages=request.messages,
+            data_parameters=intent.data_parameters or [])
+
+    calls: List[Tuple[str, str]] = [(
+        intent_identification_service.generate_prompt(request),
+        str(intent.id))]
+    # An intent without parameters needs no parsing prompt.
+    if intent.data_parameters:
+        calls.append((data_extraction_service.generate_prompt(extract_request),
+                      json.dumps(entry["parameters"], ensure_ascii=False)))
+    return calls
+
+
+def render_joint(entry: Dict[str, Any]) -> List[Tuple[str, str]]:
+    request: IntentRequest = entry["request"]
+    answer: str = json.dumps(
+            {"intent_id": find_intent(request, entry["intent"]).id,
+             **entry["parameters"]}, ensure_ascii=False)
+    return [(joint_extraction_service.generate_prompt(request), answer)]
+
+
+def is_valid_joint_answer(entry: Dict[str, Any], answer: str) -> bool:
+    validated_answer = joint_extraction_service.validate_llm_response(
+            answer, entry["request"])
+    if validated_answer is None:
+        return False
+
+    _, slug, validated_parameters, rejected_values = validated_answer
+    expected: Dict[str, Any] = {
+        key: value for key, value in entry["parameters"].items()
+        if value is not None
+    }
+    return (slug == entry["intent"] and validated_parameters == expected
+            and all(value is None for value in rejected_values.values()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--call-overhead-ms", type=float, default=250.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.15)
+    parser.add_argument("--decode-ms-per-token", type=float, default=25.0)
+    arguments = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    conversations: List[Dict[str, Any]] = load_conversations(
+            arguments.dataset)
+    family: str = get_model_family(resolve_model_id())
+    flows: Dict[str, Callable[[Dict[str, Any]], List[Tuple[str, str]]]] = {
+        "two-step": render_two_step,
+        "joint": render_joint,
+    }
+
+    print(f"conversations: {len(conversations)}, model family: {family}")
+    print(f"\n{'flow':>10}{'calls':>8}{'input':>10}{'output':>10}"
+          f"{'latency (ms)':>15}{'render (us)':>14}")
+
+    results: Dict[str, Tuple[float, float]] = {}
+    for name, render in flows.items():
+        calls: int = 0
+        input_tokens: int = 0
+        output_tokens: int = 0
+
+        for entry in conversations:
+            for prompt, answer in render(entry):
+                calls += 1
+                input_tokens += count_tokens(prompt, family)
+                output_tokens += count_tokens(answer, family)
+
+        latency: float = (calls * arguments.call_overhead_ms
+                          + input_tokens * arguments.prefill_ms_per_token
+                          + output_tokens * arguments.decode_ms_per_token
+                          ) / len(conversations)
+        render_time: float = min(timeit.repeat(
+                lambda: [render(entry) for entry in conversations],
+                number=5, repeat=3)) / (5 * len(conversations)) * 1e6
+        results[name] = (input_tokens / len(conversations), latency)
+
+        print(f"{name:>10}{calls / len(conversations):>8.2f}"
+              f"{input_tokens / len(conversations):>10.0f}"
+              f"{output_tokens / len(conversations):>10.1f}"
+              f"{latency:>15.0f}{render_time:>14.0f}")
+
+    two_step_tokens, two_step_latency = results["two-step"]
+    joint_tokens, joint_latency = results["joint"]
+    print(f"\nThe joint prompt saves {1 - joint_tokens / two_step_tokens:.1%}"
+          f" of the input tokens and "
+          f"{1 - joint_latency / two_step_latency:.1%} of the latency.")
+
+    invalid: int = sum(
+            not is_valid_joint_answer(entry, render_joint(entry)[0][1])
+            for entry in conversations)
+    if invalid:
+        print(f"FAIL: {invalid} labelled joint answers fail validation.")
+        return 1
+
+    print("OK: every labelled joint answer passes validation.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
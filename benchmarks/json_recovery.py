@@ -0,0 +1,80 @@
+import json
+import re
+import sys
+import timeit
+from typing import Any, Callable, Dict, List
+
+from src.json_recovery import recover_json_object
+
+# Replays the handcrafted bad responses through the previous regex extraction
+# and the recovering parser, counting the alternate model retries each one
+# triggers, and times both on short and long responses.
+# Run with: python -m benchmarks.json_recovery [iterations]
+
+CORPUS_PATH: str = "tests/data/json_recovery_corpus.json"
+
+
+def legacy_parse(response: str) -> Dict[str, Any]:
+    # extract_json_like_content followed by json.loads, as before.
+    match = re.search(r'\{.*?\}', response)
+    if match:
+        response = re.sub(r',\s*}', '}', match.group(0))
+    return json.loads(response)
+
+
+def recovering_parse(response: str) -> Dict[str, Any]:
+    return recover_json_object(response)[0]
+
+
+def count_retries(parse: Callable[[str], Dict[str, Any]],
+                  responses: List[str]) -> int:
+    retries: int = 0
+    for response in responses:
+        try:
+            parse(response)
+        except ValueError:
+            retries += 1
+    return retries
+
+
+def measure(parse: Callable[[str], Any], response: str,
+            iterations: int) -> float:
+    def run() -> None:
+        try:
+            parse(response)
+        except ValueError:
+            pass
+
+    return min(timeit.repeat(run, number=iterations, repeat=3)) / (
+            iterations) * 1e6
+
+
+def main(iterations: int) -> None:
+    with open(CORPUS_PATH, encoding="utf-8") as corpus_file:
+        corpus: List[Dict[str, Any]] = json.load(corpus_file)
+    responses: List[str] = [
+        entry["response"].replace("\n", "") for entry in corpus
+    ]
+
+    legacy_retries: int = count_retries(legacy_parse, responses)
+    recovering_retries: int = count_retries(recovering_parse, responses)
+
+    print(f"handcrafted responses: {len(responses)}")
+    print(f"retries before: {legacy_retries}, after: {recovering_retries}, "
+          f"avoided: {legacy_retries - recovering_retries}")
+
+    print(f"\n{'response':<32}{'before (us)':>14}{'after (us)':>14}")
+    for size in (1, 10, 100):
+        response: str = "{'notes': '" + "x" * (size * 1000) + "', 'a': None,}"
+        print(f"{f'repairable, {size} KB':<32}"
+              f"{measure(legacy_parse, response, iterations):>14.1f}"
+              f"{measure(recovering_parse, response, iterations):>14.1f}")
+
+    valid_response: str = responses[0]
+    print(f"{'valid JSON':<32}"
+          f"{measure(legacy_parse, valid_response, iterations):>14.1f}"
+          f"{measure(recovering_parse, valid_response, iterations):>14.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
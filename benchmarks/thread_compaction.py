@@ -0,0 +1,100 @@
+import argparse
+import random
+import sys
+import timeit
+from typing import List, Tuple
+
+from src.thread_compaction import compact_bodies
+
+# Compacts synthetic email threads in which every reply quotes the whole
+# previous message, so the input grows quadratically with the number of
+# messages, and reports the characters saved and the time per input
+# character. The time per character staying flat shows the compaction runs
+# in linear time; it fails when it grows by more than the allowed factor.
+# Run with: python -m benchmarks.thread_compaction [--messages 5 10 20 40 80]
+#           [--max-ratio 2.0]
+
+WORDS: Tuple[str, ...] = (
+    "tolk", "bokning", "arabiska", "somaliska", "mötet", "adressen", "kl",
+    "patienten", "kliniken", "behöver", "imorgon", "fredag", "översättning",
+    "dokumentet", "interpreter", "booking", "appointment", "please", "confirm",
+    "address", "reception", "hour", "minutes", "doctor", "translation",
+)
+SIGNATURE: str = ("\n\nMed vänlig hälsning\nAnna Berg\nKoordinator\n"
+                  "070-123 45 67\n")
+DISCLAIMER: str = ("\nDetta e-postmeddelande är konfidentiellt och endast "
+                   "avsett för mottagaren. This e-mail is confidential.\n")
+
+
+def generate_text(generator: random.Random, sentences: int) -> str:
+    return "\n".join(
+            " ".join(generator.choice(WORDS)
+                     for _ in range(generator.randint(6, 14))).capitalize()
+            + "." for _ in range(sentences))
+
+
+def generate_thread(messages: int, seed: int = 0) -> List[str]:
+    generator: random.Random = random.Random(seed)
+    bodies: List[str] = []
+    previous: str = ""
+
+    for index in range(messages):
+        plain: str = f"Hej,\n\n{generate_text(generator, 4)}{SIGNATURE}"
+        plain += DISCLAIMER
+        quote: str = ""
+        if previous:
+            quote = "\n".join(f"> {line}" for line in previous.splitlines())
+            quote = f"\n\nDen 3 juni 2024 kl. 10:{index % 60:02d} skrev " \
+                    f"Anna Berg <anna@example.se>:\n{quote}"
+
+        # Every third message is sent as HTML.
+        if index % 3 == 2:
+            bodies.append("<html><body><div>" + plain.replace("\n", "<br>")
+                          + "</div><blockquote>" + quote.replace("\n", "<br>")
+                          + "</blockquote></body></html>")
+        else:
+            bodies.append(plain + quote)
+        previous = plain + quote
+
+    return bodies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, nargs="+",
+                        default=[5, 10, 20, 40, 80])
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+    parser.add_argument("--runs", type=int, default=3)
+    arguments = parser.parse_args()
+
+    print(f"{'messages':>8}{'input':>12}{'output':>10}{'saved':>8}"
+          f"{'time (ms)':>12}{'ns/char':>10}")
+
+    times_per_character: List[float] = []
+    for messages in arguments.messages:
+        bodies: List[str] = generate_thread(messages)
+        input_characters: int = sum(map(len, bodies))
+        output_characters: int = sum(map(len, compact_bodies(bodies)))
+        seconds: float = min(timeit.repeat(lambda: compact_bodies(bodies),
+                                           number=1, repeat=arguments.runs))
+        time_per_character: float = seconds / input_characters * 1e9
+        times_per_character.append(time_per_character)
+
+        print(f"{messages:>8}{input_characters:>12}{output_characters:>10}"
+              f"{1 - output_characters / input_characters:>8.1%}"
+              f"{seconds * 1e3:>12.2f}{time_per_character:>10.1f}")
+
+    ratio: float = max(times_per_character) / min(times_per_character)
+    print(f"\nTime per character varies by a factor of {ratio:.2f} "
+          f"(allowed {arguments.max_ratio:.2f}).")
+
+    if ratio > arguments.max_ratio:
+        print("FAIL: compaction time does not grow linearly.")
+        return 1
+
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import json
+import logging
+import sys
+import timeit
+import warnings
+from typing import Callable
+from unittest.mock import patch
+
+from src.data_extraction_service import (compile_validation_model,
+                                         generate_schema_signature,
+                                         validate_llm_response)
+from src.models import DataParameter, ExtractRequest, Message
+from tests.test_utilites import VALID_DATA_PARAMETERS, VALID_MESSAGE_LIST
+
+# Compares building the extraction validation model on every call, as
+# before, with the LRU-cached compiler.
+# Run with: python -m benchmarks.validation_model [iterations]
+
+EXTRACT_REQUEST = ExtractRequest(
+        messages=[Message(**VALID_MESSAGE_LIST[0])],
+        data_parameters=[
+            DataParameter(**params) for params in VALID_DATA_PARAMETERS
+        ]
+)
+
+LLM_RESPONSE = json.dumps({
+    "customer_id": "731264",
+    "duration": "60",
+    "date": "2024-05-01",
+    "time": "14:20",
+    "type": "physical",
+    "is_immediate": True,
+    "language": "ara",
+    "address": "Vänortsstråket 80 A",
+    "city": "Stockholm",
+})
+
+
+def build_uncached() -> None:
+    compile_validation_model.__wrapped__(
+            generate_schema_signature(EXTRACT_REQUEST))
+
+
+def build_cached() -> None:
+    compile_validation_model(generate_schema_signature(EXTRACT_REQUEST))
+
+
+def validate() -> None:
+    validate_llm_response(LLM_RESPONSE, EXTRACT_REQUEST)
+
+
+def measure(function: Callable[[], None], iterations: int) -> float:
+    return min(timeit.repeat(function, number=iterations, repeat=3)) / (
+            iterations) * 1e6
+
+
+def main(iterations: int) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    warnings.simplefilter("ignore")
+
+    uncached_build: float = measure(build_uncached, iterations)
+    cached_build: float = measure(build_cached, iterations)
+
+    with patch('src.data_extraction_service.compile_validation_model',
+               compile_validation_model.__wrapped__):
+        uncached_validate: float = measure(validate, iterations)
+    compile_validation_model.cache_clear()
+    cached_validate: float = measure(validate, iterations)
+
+    print(f"{'stage':<24}{'before (us)':>14}{'after (us)':>14}")
+    print(f"{'validator build':<24}{uncached_build:>14.1f}"
+          f"{cached_build:>14.1f}")
+    print(f"{'validate_llm_response':<24}{uncached_validate:>14.1f}"
+          f"{cached_validate:>14.1f}")
+    print(f"cached compiler: {compile_validation_model.cache_info()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -1,39 +1,234 @@
-from typing import Optional
+from __future__ import annotations
 
-import boto3  # type: ignore
-from langchain_aws import BedrockLLM  # type: ignore
+import json
+import threading
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator,
+                    Optional, Tuple, Type, Union)
 
 from src import logger
-from src.config import (ALTERNATE_LLM_MODEL_ID, BEDROCK_REGION,
+from src.config import (ALTERNATE_LLM_MODEL_ID,
+                        BEDROCK_API_PAYLOAD_ACCEPT,
+                        BEDROCK_API_PAYLOAD_CONTENT_TYPE,
+                        BEDROCK_CLIENT_PROVIDER, BEDROCK_REGION,
                         BEDROCK_SERVICE, LLAMA_INTENT_KWARGS,
                         LLAMA_PARSING_KWARGS, LLM_MODEL_ID,
-                        MISTRAL_INTENT_KWARGS, MISTRAL_PARSING_KWARGS)
+                        LLM_STREAMING_ENABLED,
+                        MISTRAL_INTENT_KWARGS, MISTRAL_PARSING_KWARGS,
+                        TOKEN_BUDGET_ENABLED)
+from src.deadline import Deadline, create_client_config
+from src.lazy_module import LazyModule
+from src.llm_cache import (LLMResponseCache, generate_cache_key,
+                           get_response_cache)
+from src.metrics import increment, set_dimension, span
+from src.stream_scanner import create_scanner, read_until_complete
+from src.token_budget import record_token_usage
+
+if TYPE_CHECKING:
+    import boto3  # type: ignore
+    from langchain_aws import BedrockLLM  # type: ignore
+else:
+    # boto3 and langchain_aws dominate the cold start, so both are only
+    # imported when the first client or LLM is set up.
+    boto3 = LazyModule("boto3")
+    BedrockLLM = None
+
+
+class NativeBedrockLLM:
+    # One invoke_model request per prompt, with the request body and the
+    # response shape of the model family, and the same invoke interface as
+    # BedrockLLM.
+    def __init__(self, client: boto3.client, model_id: str,
+                 model_kwargs: dict) -> None:
+        self.client: boto3.client = client
+        self.model_id: str = model_id
+        self.model_kwargs: dict = model_kwargs
+        self.provider: str = get_model_provider(model_id)
+
+    def invoke(self, prompt: str, **model_kwargs: Any) -> str:
+        response: Dict[str, Any] = self.client.invoke_model(
+                modelId=self.model_id,
+                body=build_request_body(
+                        prompt, {**self.model_kwargs, **model_kwargs}),
+                contentType=BEDROCK_API_PAYLOAD_CONTENT_TYPE,
+                accept=BEDROCK_API_PAYLOAD_ACCEPT)
+
+        return parse_response_body(self.provider, response["body"].read())
+
+    def stream(self, prompt: str, **model_kwargs: Any) -> Iterator[str]:
+        response: Dict[str, Any] = (
+            self.client.invoke_model_with_response_stream(
+                modelId=self.model_id,
+                body=build_request_body(
+                        prompt, {**self.model_kwargs, **model_kwargs}),
+                contentType=BEDROCK_API_PAYLOAD_CONTENT_TYPE,
+                accept=BEDROCK_API_PAYLOAD_ACCEPT))
+        event_stream: Iterable[Dict[str, Any]] = response["body"]
+
+        try:
+            for event in event_stream:
+                if "chunk" in event:
+                    yield parse_response_body(self.provider,
+                                              event["chunk"]["bytes"])
+        finally:
+            close_stream(event_stream)
+
+
+LLM = Union["BedrockLLM", NativeBedrockLLM]
+
+
+# Process-wide pool of Bedrock clients and LLM instances, kept across warm
+# invocations and shared between the batch worker threads.
+_pool_lock: threading.RLock = threading.RLock()
+_bedrock_clients: Dict[str, boto3.client] = {}
+_llm_instances: Dict[Tuple[str, str, str], LLM] = {}
+_pool_stats: Dict[str, int] = {
+    "client_hits": 0,
+    "client_creations": 0,
+    "llm_hits": 0,
+    "llm_creations": 0,
+}
 
 
 def prompt_llm(
-        prompt: str, operation_type: str, change_llm: bool = False) -> str:
-    bedrock_client: boto3.client = setup_bedrock_client()
-    llm: BedrockLLM
+        prompt: str, operation_type: str, change_llm: bool = False,
+        deadline: Optional[Deadline] = None,
+        model_kwargs: Optional[dict] = None) -> str:
+    # model_kwargs override the pooled model's kwargs for this call only.
+    model_id: str = resolve_model_id(alternate_model=change_llm)
+    response_cache: Optional[LLMResponseCache] = get_response_cache()
+    cache_key: Optional[str] = None
 
+    set_dimension("operation_type", operation_type)
+    set_dimension("model_id", model_id)
     if change_llm:
-        llm = setup_llm(bedrock_client,
-                        alternate_model=True,
-                        operation_type=operation_type)
-    else:
-        llm = setup_llm(bedrock_client,
-                        operation_type=operation_type)
-
-    response: str = llm.invoke(prompt)
+        set_dimension("retry_used", True)
+
+    if response_cache:
+        cache_key = generate_cache_key(
+                model_id,
+                {**setup_model_kwargs(model_id, operation_type),
+                 **(model_kwargs or {})},
+                prompt)
+        cached_response: Optional[str] = response_cache.get(
+                cache_key, operation_type)
+
+        if cached_response is not None:
+            logger.info("Prompt served from the LLM response cache.")
+            set_dimension("cache_hit", True)
+            return cached_response
+
+    llm: LLM = get_llm(operation_type, alternate_model=change_llm)
+
+    generate: Callable[..., str] = llm.invoke
+    arguments: Tuple[Any, ...] = (prompt,)
+    if LLM_STREAMING_ENABLED:
+        generate, arguments = stream_llm, (llm, prompt, operation_type)
+    overrides: dict = model_kwargs or {}
+
+    with span("llm_retry" if change_llm else "llm_primary"):
+        response: str = (
+            deadline.run("llm", generate, *arguments, **overrides)
+            if deadline else generate(*arguments, **overrides))
     logger.info("Prompting successful.")
+
+    if TOKEN_BUDGET_ENABLED:
+        record_token_usage(model_id, prompt, response)
+
+    if response_cache and cache_key:
+        response_cache.set(cache_key, response)
     return response
 
 
+def stream_llm(llm: LLM, prompt: str, operation_type: str,
+               **model_kwargs: Any) -> str:
+    chunks: Iterator[str] = iter(llm.stream(prompt, **model_kwargs))
+
+    try:
+        response, stopped_early = read_until_complete(
+                chunks, create_scanner(operation_type))
+    finally:
+        close_stream(chunks)
+
+    if stopped_early:
+        logger.info(f"Stopped the {operation_type} stream after the first "
+                    "complete answer.")
+        increment("llm_stream_early_stops")
+    return response
+
+
+def close_stream(stream: Any) -> None:
+    close: Optional[Callable[[], None]] = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+def resolve_model_id(alternate_model: bool = False) -> str:
+    return ALTERNATE_LLM_MODEL_ID if alternate_model else LLM_MODEL_ID
+
+
+def get_bedrock_client() -> boto3.client:
+    with _pool_lock:
+        bedrock_client: Optional[boto3.client] = _bedrock_clients.get(
+                BEDROCK_REGION)
+
+        if bedrock_client is not None:
+            _pool_stats["client_hits"] += 1
+            return bedrock_client
+
+        bedrock_client = setup_bedrock_client()
+        _bedrock_clients[BEDROCK_REGION] = bedrock_client
+        _pool_stats["client_creations"] += 1
+        return bedrock_client
+
+
+def get_llm(operation_type: str, alternate_model: bool = False) -> LLM:
+    model_id: str = resolve_model_id(alternate_model)
+    pool_key: Tuple[str, str, str] = (BEDROCK_REGION, model_id, operation_type)
+
+    with _pool_lock:
+        llm: Optional[LLM] = _llm_instances.get(pool_key)
+
+        if llm is not None:
+            _pool_stats["llm_hits"] += 1
+            logger.debug(f"Reusing pooled LLM for {pool_key}.")
+            return llm
+
+        bedrock_client: boto3.client = get_bedrock_client()
+
+        if alternate_model:
+            llm = setup_llm(bedrock_client,
+                            alternate_model=True,
+                            operation_type=operation_type)
+        else:
+            llm = setup_llm(bedrock_client,
+                            operation_type=operation_type)
+
+        _llm_instances[pool_key] = llm
+        _pool_stats["llm_creations"] += 1
+        logger.info(f"Pooled a new LLM for {pool_key}.")
+        return llm
+
+
+def get_pool_stats() -> Dict[str, int]:
+    with _pool_lock:
+        return dict(_pool_stats)
+
+
+def clear_pool() -> None:
+    with _pool_lock:
+        _bedrock_clients.clear()
+        _llm_instances.clear()
+        for stat in _pool_stats:
+            _pool_stats[stat] = 0
+
+
 def setup_bedrock_client() -> boto3.client:
     logger.debug("Setting up the Bedrock client.")
     try:
         bedrock_client: boto3.client = boto3.client(
                 service_name=BEDROCK_SERVICE,
-                region_name=BEDROCK_REGION
+                region_name=BEDROCK_REGION,
+                config=create_client_config("llm")
         )
 
         logger.info("Bedrock client successfully set up.")
@@ -46,16 +241,25 @@ def setup_bedrock_client() -> boto3.client:
 
 def setup_llm(bedrock_client: boto3.client,
               operation_type: str,
-              alternate_model: Optional[bool] = False) -> BedrockLLM:
-    model_id: str = ALTERNATE_LLM_MODEL_ID if alternate_model else LLM_MODEL_ID
+              alternate_model: Optional[bool] = False) -> LLM:
+    model_id: str = resolve_model_id(bool(alternate_model))
     model_kwargs: dict = setup_model_kwargs(model_id, operation_type)
 
+    if BEDROCK_CLIENT_PROVIDER not in ("langchain", "native"):
+        logger.error("Invalid Bedrock client provider: "
+                     f"{BEDROCK_CLIENT_PROVIDER}.")
+        raise ValueError("Invalid Bedrock client provider.")
+
     try:
-        llm: BedrockLLM = BedrockLLM(
-                client=bedrock_client,
-                model_id=model_id,
-                model_kwargs=model_kwargs
-        )
+        llm: LLM
+        if BEDROCK_CLIENT_PROVIDER == "native":
+            llm = NativeBedrockLLM(bedrock_client, model_id, model_kwargs)
+        else:
+            llm = load_bedrock_llm_class()(
+                    client=bedrock_client,
+                    model_id=model_id,
+                    model_kwargs=model_kwargs
+            )
 
         logger.info("Bedrock client successfully set up.")
         return llm
@@ -65,6 +269,56 @@ def setup_llm(bedrock_client: boto3.client,
         raise RuntimeError(f"Failed to setup Bedrock: {str(error)}")
 
 
+def load_bedrock_llm_class() -> Type[BedrockLLM]:
+    global BedrockLLM
+
+    if BedrockLLM is None:
+        logger.debug("Importing langchain_aws.")
+        from langchain_aws import BedrockLLM as bedrock_llm_class
+        BedrockLLM = bedrock_llm_class
+    return BedrockLLM
+
+
+def get_model_provider(model_id: str) -> str:
+    if "mistral" in model_id:
+        return "mistral"
+    elif "llama" in model_id:
+        return "meta"
+
+    raise ValueError("Invalid model ID.")
+
+
+def build_request_body(prompt: str, model_kwargs: dict) -> str:
+    # Both families take the prompt next to their own sampling parameters,
+    # which is exactly what the *_KWARGS dictionaries hold.
+    return json.dumps({"prompt": prompt, **model_kwargs})
+
+
+def parse_response_body(provider: str, body: bytes) -> str:
+    try:
+        response_body: Dict[str, Any] = json.loads(body)
+
+        if provider == "meta":
+            return response_body["generation"]
+        elif provider == "mistral":
+            return response_body["outputs"][0]["text"]
+
+    except (ValueError, KeyError, IndexError, TypeError) as error:
+        logger.error(f"Unexpected {provider} response body: {str(error)}")
+        raise RuntimeError(f"Unexpected {provider} response body.")
+
+    raise ValueError("Invalid model provider.")
+
+
+def setup_max_tokens_kwargs(model_id: str, max_tokens: int) -> dict:
+    if "mistral" in model_id:
+        return {"max_tokens": max_tokens}
+    elif "llama" in model_id:
+        return {"max_gen_len": max_tokens}
+
+    raise ValueError("Invalid model ID.")
+
+
 def setup_model_kwargs(model_id: str, operation_type: str) -> dict:
     if "mistral" in model_id:
         if operation_type == "intent":
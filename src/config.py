@@ -1,29 +1,118 @@
 import os
-from datetime import datetime, timedelta
 
 LLM_PROVIDER: str = os.environ.get("LLM_PROVIDER", "amazon")
 AWS_CREDENTIAL_NAME: str = os.environ.get("AWS_CREDENTIAL_NAME", "default")
 
+# Per-stage latency metrics, written to stdout in the CloudWatch embedded
+# metric format once per processed record.
+METRICS_ENABLED: bool = (
+    os.environ.get("METRICS_ENABLED", "false").lower() == "true")
+METRICS_NAMESPACE: str = os.environ.get("METRICS_NAMESPACE",
+                                        "SupportCopilot")
+
+# The maximum number of SQS records processed concurrently in one invocation.
+SQS_BATCH_MAX_WORKERS: int = int(os.environ.get("SQS_BATCH_MAX_WORKERS", 5))
+
+# The local cache for S3 payloads, validated against the object's ETag.
+# The size cap keeps the cache within the Lambda ephemeral storage.
+S3_PAYLOAD_CACHE_ENABLED: bool = (
+    os.environ.get("S3_PAYLOAD_CACHE_ENABLED", "false").lower() == "true")
+S3_PAYLOAD_CACHE_DIR: str = os.environ.get("S3_PAYLOAD_CACHE_DIR",
+                                           "/tmp/s3-payload-cache")
+S3_PAYLOAD_CACHE_MAX_BYTES: int = int(
+        os.environ.get("S3_PAYLOAD_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# The time, in seconds, kept back from the Lambda timeout so the error
+# response can still be sent when a stage runs out of time.
+DEADLINE_ERROR_RESERVE_SECONDS: float = float(
+        os.environ.get("DEADLINE_ERROR_RESERVE_SECONDS", 3.0))
+
+# The maximum time, in seconds, each stage may take, capped by the time left.
+DEADLINE_STAGE_BUDGET_SECONDS: dict = {
+    "s3": float(os.environ.get("S3_BUDGET_SECONDS", 5.0)),
+    "llm": float(os.environ.get("LLM_BUDGET_SECONDS", 30.0)),
+}
+
+# The S3 and Bedrock clients time out on their own at the stage budget and
+# make a single attempt, so a call abandoned by its deadline stops at the
+# client timeout instead of running in the background.
+AWS_CONNECT_TIMEOUT_SECONDS: float = float(
+        os.environ.get("AWS_CONNECT_TIMEOUT_SECONDS", 3.05))
+
+# The threads that run stages against their deadline. A stage that finds
+# every thread busy runs in the calling thread, bounded by the client
+# timeouts, rather than waiting in a queue.
+DEADLINE_MAX_WORKERS: int = int(os.environ.get("DEADLINE_MAX_WORKERS", 32))
+
+# The minimum time, in seconds, needed to call the alternate model. The
+# fallback is skipped when less time is left.
+ALTERNATE_MODEL_MIN_SECONDS: dict = {
+    "intent": float(os.environ.get("INTENT_ALTERNATE_MIN_SECONDS", 3.0)),
+    "parsing": float(os.environ.get("PARSING_ALTERNATE_MIN_SECONDS", 8.0)),
+}
+
 BEDROCK_REGION: str = os.environ.get("BEDROCK_REGION", "us-west-2")
 BEDROCK_SERVICE: str = "bedrock-runtime"
 BEDROCK_API_PAYLOAD_CONTENT_TYPE: str = "application/json"
 BEDROCK_API_PAYLOAD_ACCEPT: str = "application/json"
 
+# How Bedrock is called: "langchain" goes through langchain_aws.BedrockLLM,
+# "native" sends invoke_model requests to bedrock-runtime directly.
+BEDROCK_CLIENT_PROVIDER: str = os.environ.get(
+        "BEDROCK_CLIENT_PROVIDER", "langchain").lower()
+
+# Streams generations and stops reading once the first complete answer,
+# an integer for intent and a JSON object for parsing, has arrived.
+LLM_STREAMING_ENABLED: bool = (
+    os.environ.get("LLM_STREAMING_ENABLED", "false").lower() == "true")
+
 # The model IDs for different LLM models.
 MIXTRAL_8X7B_MODEL_ID: str = "mistral.mixtral-8x7b-instruct-v0:1"
 MISTRAL_7B_MODEL_ID: str = "mistral.mistral-7b-instruct-v0:2"
 LLAMA_3_7B_MODEL_ID: str = "meta.llama3-8b-instruct-v1:0"
 LLAMA_3_70B_MODEL_ID: str = "meta.llama3-70b-instruct-v1:0"
 
+# The context window, in tokens, of each model. Models that are not listed
+# get the smallest window.
+MODEL_CONTEXT_TOKENS: dict = {
+    MIXTRAL_8X7B_MODEL_ID: 32768,
+    MISTRAL_7B_MODEL_ID: 32768,
+    LLAMA_3_7B_MODEL_ID: 8192,
+    LLAMA_3_70B_MODEL_ID: 8192,
+}
+
 # Selected LLM
 LLM_MODEL_ID: str = os.environ.get("LLM_MODEL_ID", LLAMA_3_70B_MODEL_ID)
 ALTERNATE_LLM_MODEL_ID: str = (
     os.environ.get("ALTERNATE_LLM_MODEL_ID", MIXTRAL_8X7B_MODEL_ID))
 
+# The cache for LLM responses, keyed by model, model kwargs and prompt.
+# Valid backends are: none, memory, sqlite.
+LLM_CACHE_BACKEND: str = os.environ.get("LLM_CACHE_BACKEND", "none").lower()
+LLM_CACHE_TTL_SECONDS: float = float(
+        os.environ.get("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES: int = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_SQLITE_PATH: str = os.environ.get("LLM_CACHE_SQLITE_PATH",
+                                            "/tmp/llm-response-cache.sqlite3")
+
+# Hedged requests launch the alternate model while the primary model is
+# still running and keep the first response that validates. The delay, in
+# seconds, before the alternate model is launched trades Bedrock spend
+# against tail latency; 0 launches both models at once.
+LLM_HEDGING_ENABLED: bool = (
+    os.environ.get("LLM_HEDGING_ENABLED", "false").lower() == "true")
+LLM_HEDGE_DELAY_SECONDS: dict = {
+    "intent": float(os.environ.get("INTENT_HEDGE_DELAY_SECONDS", 1.0)),
+    "parsing": float(os.environ.get("PARSING_HEDGE_DELAY_SECONDS", 3.0)),
+}
+LLM_HEDGE_MAX_WORKERS: int = int(os.environ.get("LLM_HEDGE_MAX_WORKERS", 10))
+
 # The maximum number of tokens to generate.
 # Lower values will make the model less likely to produce irrelevant text.
 MAX_TOKEN_OUTPUT_FOR_INTENT: int = 1
 MAX_TOKEN_OUTPUT_FOR_PARSING: int = 200
+# The joint answer adds the intent id to the parameters.
+MAX_TOKEN_OUTPUT_FOR_JOINT: int = MAX_TOKEN_OUTPUT_FOR_PARSING + 10
 
 # The temperature parameter controls the randomness of the output.
 # Lower values will make the model more deterministic and repetitive,
@@ -44,6 +133,35 @@ LLM_TOP_P: float = float(os.environ.get("LLM_TOP_P", 0.4))
 # The value should be an integer greater than 0.
 LLM_TOP_K: int = int(os.environ.get("LLM_TOP_K", 5))
 
+# Lists the intents under per-request labels that are single tokens for the
+# model family, instead of their ids, so answers fit the output budget.
+INTENT_LABEL_ENCODING_ENABLED: bool = (
+    os.environ.get("INTENT_LABEL_ENCODING_ENABLED", "false").lower() == "true")
+
+# Sends only the intents that rank highest against the conversation, by BM25
+# over their slugs and descriptions, plus the fallback intent, so prompts
+# stop growing with the catalog. Use benchmarks.intent_shortlist to pick a
+# top k with enough recall.
+INTENT_SHORTLIST_ENABLED: bool = (
+    os.environ.get("INTENT_SHORTLIST_ENABLED", "false").lower() == "true")
+INTENT_SHORTLIST_TOP_K: int = int(os.environ.get("INTENT_SHORTLIST_TOP_K", 10))
+INTENT_SHORTLIST_FALLBACK_SLUG: str = os.environ.get(
+        "INTENT_SHORTLIST_FALLBACK_SLUG", "other")
+# The number of intent catalogs whose index is kept in memory.
+INTENT_INDEX_CACHE_SIZE: int = int(
+        os.environ.get("INTENT_INDEX_CACHE_SIZE", 32))
+
+# Answers intent without the model when a rule from the versioned rules file
+# matches the latest message with at least the minimum confidence, e.g. for
+# auto-replies and machine-generated booking mail.
+INTENT_RULES_ENABLED: bool = (
+    os.environ.get("INTENT_RULES_ENABLED", "false").lower() == "true")
+INTENT_RULES_PATH: str = os.environ.get(
+        "INTENT_RULES_PATH",
+        os.path.join(os.path.dirname(__file__), "intent_rules.json"))
+INTENT_RULES_MIN_CONFIDENCE: float = float(
+        os.environ.get("INTENT_RULES_MIN_CONFIDENCE", 0.9))
+
 # The keyword arguments for the LLM model for intent identification.
 LLAMA_INTENT_KWARGS: dict = {
     "temperature": LLM_TEMPERATURE,
@@ -72,6 +190,99 @@ MISTRAL_PARSING_KWARGS = {
     "top_k": LLM_TOP_K,
 }
 
+# Re-asks only for the extraction parameters that were missing or failed
+# validation, with an output budget sized to the number of those keys.
+PARTIAL_REPROMPT_ENABLED: bool = (
+    os.environ.get("PARTIAL_REPROMPT_ENABLED", "false").lower() == "true")
+PARTIAL_REPROMPT_BASE_TOKENS: int = int(
+        os.environ.get("PARTIAL_REPROMPT_BASE_TOKENS", 10))
+PARTIAL_REPROMPT_TOKENS_PER_KEY: int = int(
+        os.environ.get("PARTIAL_REPROMPT_TOKENS_PER_KEY", 30))
+PARTIAL_REPROMPT_MIN_SECONDS: float = float(
+        os.environ.get("PARTIAL_REPROMPT_MIN_SECONDS", 3.0))
+
+# Fills the parameters simple parsers handle, e.g. dates, times, email
+# addresses, phone numbers, reference numbers and languages, before the model
+# is asked for the rest, and skips the model when nothing is left.
+PRE_EXTRACTION_ENABLED: bool = (
+    os.environ.get("PRE_EXTRACTION_ENABLED", "false").lower() == "true")
+
+# Compacts email threads before they are rendered into prompts: quoted
+# history that the thread already contains, signatures, disclaimers and HTML
+# are removed and whitespace is normalised. Quoted text counts as contained
+# when this share of it appears in the other messages.
+THREAD_COMPACTION_ENABLED: bool = (
+    os.environ.get("THREAD_COMPACTION_ENABLED", "false").lower() == "true")
+THREAD_COMPACTION_QUOTE_COVERAGE: float = float(
+        os.environ.get("THREAD_COMPACTION_QUOTE_COVERAGE", 0.8))
+
+# Checks every rendered prompt against the input budget of its model, the
+# context window less the output tokens and a safety margin for the
+# approximate count, and drops the lowest priority messages until it fits:
+# the latest messages from the priority role are kept first. Estimated input
+# and output tokens are recorded for every model call. Token counts are exact
+# for a model family when the path to its tokenizer.json is set and the
+# tokenizers package is installed.
+TOKEN_BUDGET_ENABLED: bool = (
+    os.environ.get("TOKEN_BUDGET_ENABLED", "false").lower() == "true")
+TOKEN_BUDGET_SAFETY_MARGIN: float = float(
+        os.environ.get("TOKEN_BUDGET_SAFETY_MARGIN", 0.1))
+TOKEN_BUDGET_PRIORITY_ROLE: str = os.environ.get(
+        "TOKEN_BUDGET_PRIORITY_ROLE", "customer").lower()
+TOKENIZER_PATHS: dict = {
+    "llama": os.environ.get("LLAMA_TOKENIZER_PATH", ""),
+    "mistral": os.environ.get("MISTRAL_TOKENIZER_PATH", ""),
+}
+
+# Remembers, per conversation and stage, the last message processed and its
+# result, so later messages in the conversation are sent to the model with a
+# summary of that result instead of the whole thread, and redelivered
+# messages reuse it. Valid backends are: none, sqlite.
+CONVERSATION_STATE_BACKEND: str = os.environ.get(
+        "CONVERSATION_STATE_BACKEND", "none").lower()
+CONVERSATION_STATE_SQLITE_PATH: str = os.environ.get(
+        "CONVERSATION_STATE_SQLITE_PATH", "/tmp/conversation-state.sqlite3")
+CONVERSATION_STATE_TTL_SECONDS: float = float(
+        os.environ.get("CONVERSATION_STATE_TTL_SECONDS", 7 * 24 * 60 * 60))
+
+# Extracts the parameters of the detected intent in the intent invocation,
+# from the messages it already parsed, and posts them for validation, when
+# the intents in the payload carry their data parameters.
+FUSED_PIPELINE_ENABLED: bool = (
+    os.environ.get("FUSED_PIPELINE_ENABLED", "false").lower() == "true")
+
+# Asks for the intent and its parameters in one prompt, instead of one
+# prompt each, when every intent in the payload carries its data parameters
+# and the catalog has at most this many parameters in total. The two-step
+# flow is used when the answer fails validation.
+JOINT_PROMPT_ENABLED: bool = (
+    os.environ.get("JOINT_PROMPT_ENABLED", "false").lower() == "true")
+JOINT_PROMPT_MAX_PARAMETERS: int = int(
+        os.environ.get("JOINT_PROMPT_MAX_PARAMETERS", 30))
+
+# Starts the extraction for the most likely intents, ranked by BM25 over the
+# intent descriptions, while the intent is identified, and keeps the one for
+# the detected intent. Needs the fused pipeline. Speculation only runs when
+# the top candidates hold at least the minimum share of the BM25 score and
+# the deadline leaves PARSING_ALTERNATE_MIN_SECONDS for a parsing call.
+# Calls over the concurrency cap or the token spend per minute are skipped.
+SPECULATIVE_EXTRACTION_ENABLED: bool = (
+    os.environ.get("SPECULATIVE_EXTRACTION_ENABLED",
+                   "false").lower() == "true")
+SPECULATIVE_EXTRACTION_TOP_K: int = int(
+        os.environ.get("SPECULATIVE_EXTRACTION_TOP_K", 2))
+SPECULATIVE_EXTRACTION_MIN_SCORE_SHARE: float = float(
+        os.environ.get("SPECULATIVE_EXTRACTION_MIN_SCORE_SHARE", 0.5))
+SPECULATIVE_EXTRACTION_MAX_CONCURRENCY: int = int(
+        os.environ.get("SPECULATIVE_EXTRACTION_MAX_CONCURRENCY", 4))
+SPECULATIVE_EXTRACTION_MAX_TOKENS_PER_MINUTE: int = int(
+        os.environ.get("SPECULATIVE_EXTRACTION_MAX_TOKENS_PER_MINUTE",
+                       100000))
+
+# The number of compiled extraction validation models kept in memory.
+VALIDATION_MODEL_CACHE_SIZE: int = int(
+        os.environ.get("VALIDATION_MODEL_CACHE_SIZE", 128))
+
 SYSTEM_INTENT_PROMPT: str = """
 You are an assistant that detects the intent of incoming email inquiries
 for a translation agency. Your task is to classify the incoming emails
@@ -82,8 +293,9 @@ interpreter, select the intent closest to "other". If customer, find the most
 relevant intent from the given intent list first before defaulting to "other".
 
 Below are the possible intents with brief descriptions. Use these to
-accurately categorise the provided conversation. Respond only with the integer
-representing the identified intent ID. Do not include any additional text.
+accurately categorise the provided conversation. Respond only with the ID of
+the identified intent, as written before the "=" sign. Do not include any
+additional text.
 
 
 <Output format>
@@ -91,10 +303,13 @@ identified_intent_id
 </Output format>
 """
 
-current_date_time = (datetime.now() +
-                     timedelta(hours=2)).strftime("%Y-%m-%d %H:%M")
+# The offset, in hours, from the container clock to the local time used for
+# "today" in the prompts.
+PROMPT_TIME_OFFSET_HOURS: float = float(
+        os.environ.get("PROMPT_TIME_OFFSET_HOURS", 2))
 
-SYSTEM_PARSING_PROMPT: str = f"""
+# The current date and time is a slot that is filled on every request.
+SYSTEM_PARSING_PROMPT: str = """
 You are customer support assistant that extracts data from incoming emails.
 You will receive an email conversation between a customer and a customer
 support agent, as well as a list of parameters to extract from the email.
@@ -117,13 +332,57 @@ be set to a date and time in the future. Today's date and time is
 
 Respond only in the output format specified below, and do not include any
 additional text. Prioritise accuracy; if you are unsure about a parameter,
-output null. """ + """
+output null.
 
 <Output format>
 {{"given_intent_parameter_key_1": "identified_value_1", ...,
 "given_intent_parameter_key_n": "identified_value_n"}}
 </Output format>"""
 
+SYSTEM_JOINT_PROMPT: str = """
+You are customer support assistant for a translation agency that classifies
+incoming email inquiries and extracts data from them. You will receive an
+email conversation between a customer and a customer support agent, as well
+as a list of possible intents, each with the parameters to extract for it.
+
+First, identify if the sender is a interpreter or a customer. If identified as
+interpreter, select the intent closest to "other". If customer, find the most
+relevant intent from the given intent list first before defaulting to "other".
+
+Then extract the values of the selected intent's parameters from the email. Do
+not extract any information from the sender's signature unless explicitly
+requested. If a parameter is not present in the email, output null (not a
+string) for it. If translation between two languages is requested, extract the
+one that is not Swedish. If the email is a request for booking an
+interpretation session, the date must be set to a date and time in the future.
+Today's date and time is {current_date_time}.
+
+Respond only in the output format specified below, with the ID of the intent
+as written before the "=" sign followed by the selected intent's parameters,
+and do not include any additional text.
+
+<Output format>
+{{"intent_id": identified_intent_id,
+"intent_parameter_key_1": "identified_value_1", ...,
+"intent_parameter_key_n": "identified_value_n"}}
+</Output format>"""
+
+SYSTEM_REPAIR_PROMPT: str = """
+You are customer support assistant that extracts data from incoming emails.
+An earlier answer left out the parameters listed below or gave values that do
+not match their data type; the rejected values are listed as well.
+
+Extract only these parameters from the email conversation. If a parameter is
+not present in the email, output null (not a string) for it. Today's date and
+time is {current_date_time}.
+
+Respond only in the output format specified below, and do not include any
+additional text.
+
+<Output format>
+{{"given_intent_parameter_key_1": "identified_value_1", ...}}
+</Output format>"""
+
 MISTRAL_INSTRUCT_TEMPLATE: str = """
 [INST]{system_prompt}
 {user_prompt}[/INST]
@@ -155,6 +414,28 @@ USER_PARSING_PROMPT: str = """
 {email_conversation}
 </Email Conversation>"""
 
+USER_JOINT_PROMPT: str = """
+<Intents>
+{intent_list}
+</Intents>
+
+<Email Conversation>
+{email_conversation}
+</Email Conversation>"""
+
+USER_REPAIR_PROMPT: str = """
+<Intent Parameters>
+{intent_parameters}
+</Intent Parameters>
+
+<Rejected Values>
+{rejected_values}
+</Rejected Values>
+
+<Email Conversation>
+{email_conversation}
+</Email Conversation>"""
+
 
 # The prompt templates for the LLMs.
 LLAMA_INTENT_PROMPT_TEMPLATE = LLAMA_INSTRUCT_TEMPLATE.format(
@@ -177,9 +458,44 @@ MISTRAL_PARSING_PROMPT_TEMPLATE = MISTRAL_INSTRUCT_TEMPLATE.format(
         user_prompt=USER_PARSING_PROMPT
 )
 
+LLAMA_JOINT_PROMPT_TEMPLATE = LLAMA_INSTRUCT_TEMPLATE.format(
+        system_prompt=SYSTEM_JOINT_PROMPT,
+        user_prompt=USER_JOINT_PROMPT
+)
+
+MISTRAL_JOINT_PROMPT_TEMPLATE = MISTRAL_INSTRUCT_TEMPLATE.format(
+        system_prompt=SYSTEM_JOINT_PROMPT,
+        user_prompt=USER_JOINT_PROMPT
+)
+
+LLAMA_REPAIR_PROMPT_TEMPLATE = LLAMA_INSTRUCT_TEMPLATE.format(
+        system_prompt=SYSTEM_REPAIR_PROMPT,
+        user_prompt=USER_REPAIR_PROMPT
+)
+
+MISTRAL_REPAIR_PROMPT_TEMPLATE = MISTRAL_INSTRUCT_TEMPLATE.format(
+        system_prompt=SYSTEM_REPAIR_PROMPT,
+        user_prompt=USER_REPAIR_PROMPT
+)
+
 SMART_DRAFT_BASE_URL: str = os.environ.get("SMART_DRAFT_BASE_URL",
                                            "http://localhost:8000")
 
+# The number of keep-alive connections kept open to Smart Draft.
+SMART_DRAFT_POOL_SIZE: int = int(os.environ.get("SMART_DRAFT_POOL_SIZE", 10))
+
+# The connect and read timeouts, in seconds, for the Smart Draft endpoints.
+SMART_DRAFT_CONNECT_TIMEOUT: float = float(
+        os.environ.get("SMART_DRAFT_CONNECT_TIMEOUT", 3.05))
+SMART_DRAFT_READ_TIMEOUTS: dict = {
+    "intent-detection": float(
+            os.environ.get("SMART_DRAFT_INTENT_READ_TIMEOUT", 10)),
+    "validation": float(
+            os.environ.get("SMART_DRAFT_VALIDATION_READ_TIMEOUT", 10)),
+    "execution": float(
+            os.environ.get("SMART_DRAFT_EXECUTION_READ_TIMEOUT", 10)),
+}
+
 SMART_DRAFT_DETECT_INTENT_ENDPOINT: str = ("/conversations/{"
                                            "conversation_id}/intent-detected")
 
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple, TypeVar, Union
+
+from src import logger
+from src.config import (CONVERSATION_STATE_BACKEND,
+                        CONVERSATION_STATE_SQLITE_PATH,
+                        CONVERSATION_STATE_TTL_SECONDS)
+from src.metrics import increment, set_property
+from src.models import ConversationState, ExtractRequest, IntentRequest, \
+    Message
+
+RequestT = TypeVar("RequestT", bound=Union[IntentRequest, ExtractRequest])
+
+
+class ConversationStateStore(ABC):
+    # The interface for conversation state stores, keyed by conversation and
+    # stage. A shared store, e.g. DynamoDB, implements it to share the state
+    # between containers.
+    @abstractmethod
+    def get(self, conversation_id: int,
+            operation_type: str) -> Optional[ConversationState]:
+        pass
+
+    @abstractmethod
+    def set(self, state: ConversationState, ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class SQLiteConversationStateStore(ConversationStateStore):
+    def __init__(self, path: str = CONVERSATION_STATE_SQLITE_PATH) -> None:
+        self.path: str = path
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None)
+
+        with self._lock:
+            self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS conversation_states ("
+                    "conversation_id INTEGER NOT NULL, "
+                    "operation_type TEXT NOT NULL, state TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, "
+                    "PRIMARY KEY (conversation_id, operation_type))")
+
+    def get(self, conversation_id: int,
+            operation_type: str) -> Optional[ConversationState]:
+        with self._lock:
+            row: Optional[Tuple[str, float]] = self._connection.execute(
+                    "SELECT state, expires_at FROM conversation_states "
+                    "WHERE conversation_id = ? AND operation_type = ?",
+                    (conversation_id, operation_type)).fetchone()
+
+            if row is None:
+                return None
+
+            if row[1] <= time.time():
+                self._connection.execute(
+                        "DELETE FROM conversation_states "
+                        "WHERE conversation_id = ? AND operation_type = ?",
+                        (conversation_id, operation_type))
+                return None
+
+        return ConversationState.model_validate_json(row[0])
+
+    def set(self, state: ConversationState, ttl_seconds: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                    "INSERT OR REPLACE INTO conversation_states "
+                    "(conversation_id, operation_type, state, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (state.conversation_id, state.operation_type,
+                     state.model_dump_json(), time.time() + ttl_seconds))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM conversation_states")
+
+
+_store_lock: threading.Lock = threading.Lock()
+_state_store: Optional[ConversationStateStore] = None
+
+
+def get_conversation_state_store() -> Optional[ConversationStateStore]:
+    global _state_store
+
+    if CONVERSATION_STATE_BACKEND == "none":
+        return None
+
+    with _store_lock:
+        if _state_store is None:
+            _state_store = setup_conversation_state_store(
+                    CONVERSATION_STATE_BACKEND)
+        return _state_store
+
+
+def setup_conversation_state_store(
+        backend_name: str) -> ConversationStateStore:
+    if backend_name == "sqlite":
+        return SQLiteConversationStateStore()
+
+    raise ValueError("Invalid conversation state backend.")
+
+
+def load_conversation_state(
+        conversation_id: int,
+        operation_type: str) -> Optional[ConversationState]:
+    # A state that cannot be read only costs the savings, so errors are
+    # logged and the whole thread is processed.
+    state_store: Optional[ConversationStateStore] = (
+        get_conversation_state_store())
+    if state_store is None:
+        return None
+
+    try:
+        return state_store.get(conversation_id, operation_type)
+    except Exception as error:
+        logger.warning(f"Failed to read the conversation state: {str(error)}")
+        return None
+
+
+def save_conversation_state(state: ConversationState) -> None:
+    state_store: Optional[ConversationStateStore] = (
+        get_conversation_state_store())
+    if state_store is None:
+        return
+
+    try:
+        state_store.set(state, CONVERSATION_STATE_TTL_SECONDS)
+    except Exception as error:
+        logger.warning(f"Failed to write the conversation state: "
+                       f"{str(error)}")
+
+
+def hash_messages(messages: List[Message]) -> List[str]:
+    return [
+        hashlib.sha256(message.model_dump_json().encode("utf-8")).hexdigest()
+        for message in messages
+    ]
+
+
+def summarize_state(state: ConversationState) -> str:
+    if state.operation_type == "intent":
+        return ("Summary of the earlier messages in this conversation: "
+                f"their intent was {state.intent}.")
+
+    return ("Summary of the earlier messages in this conversation: they gave "
+            "these parameter values, keep them unless the messages below "
+            "change them: "
+            + json.dumps(state.parameters, ensure_ascii=False, default=str))
+
+
+def resume_request(request: RequestT, message_hashes: List[str],
+                   state: Optional[ConversationState]) -> RequestT:
+    # Keeps only the messages after the last one the stage processed,
+    # with a summary of its result in place of the earlier ones. The whole
+    # thread is kept when that message is not in it.
+    if state is None or state.message_hash not in message_hashes:
+        return request
+
+    processed_messages: int = len(message_hashes) - list(
+            reversed(message_hashes)).index(state.message_hash)
+    logger.info(f"Resuming the conversation after {processed_messages} of "
+                f"{len(message_hashes)} messages.")
+    increment("conversation_state_resumes")
+    set_property("resumed_messages", processed_messages)
+    return request.model_copy(update={
+        "messages": request.messages[processed_messages:],
+        "summary": summarize_state(state),
+    })
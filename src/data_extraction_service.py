@@ -1,40 +1,103 @@
 import json
-import re
-from datetime import date, time
-from typing import Any, Dict, Optional
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
 
-from langchain_core.prompts import PromptTemplate  # type: ignore
-from pydantic import (BaseModel, Field, ValidationError,  # type: ignore
-                      create_model)  # type: ignore
+from pydantic import (BaseModel, ConfigDict, Field,  # type: ignore
+                      ValidationError, create_model)  # type: ignore
 
 from src import logger
-from src.bedrock_wrapper import prompt_llm
-from src.config import LLAMA_PARSING_PROMPT_TEMPLATE, LLM_MODEL_ID, \
-    MISTRAL_PARSING_PROMPT_TEMPLATE
+from src.bedrock_wrapper import (prompt_llm, resolve_model_id,
+                                 setup_max_tokens_kwargs)
+from src.config import (LLM_HEDGING_ENABLED, MAX_TOKEN_OUTPUT_FOR_PARSING,
+                        PARTIAL_REPROMPT_BASE_TOKENS,
+                        PARTIAL_REPROMPT_ENABLED,
+                        PARTIAL_REPROMPT_MIN_SECONDS,
+                        PARTIAL_REPROMPT_TOKENS_PER_KEY,
+                        PRE_EXTRACTION_ENABLED, TOKEN_BUDGET_ENABLED,
+                        VALIDATION_MODEL_CACHE_SIZE)
+from src.deadline import Deadline
+from src.hedging import hedged_call
+from src.json_recovery import recover_json_object
+from src.metrics import increment, timed
 from src.models import ExtractRequest
+from src.pre_extraction import pre_extract_parameters, remove_parameters
+from src.prompt_renderer import render_prompt
+from src.token_budget import fit_prompt
+
+# The supported DataParameter data types, matched exactly. Any other data
+# type is validated as a string.
+DATA_TYPES: Dict[str, type] = {
+    "int": int,
+    "integer": int,
+    "date": date,
+    "time": time,
+    "datetime": datetime,
+    "bool": bool,
+    "boolean": bool,
+    "str": str,
+    "string": str,
+}
+
+
+def extract_data(parse_request: ExtractRequest,
+                 deadline: Optional[Deadline] = None) -> dict[str, Any]:
+    if not PRE_EXTRACTION_ENABLED:
+        return extract_data_with_llm(parse_request, deadline)
+
+    pre_extracted: Dict[str, Any] = pre_extract_parameters(parse_request)
+    if len(pre_extracted) == len(parse_request.data_parameters):
+        logger.info("All parameters pre-extracted, skipping the LLM.")
+        increment("parsing_llm_skipped")
+        return pre_extracted
+
+    logger.info(f"Pre-extracted {len(pre_extracted)} of "
+                f"{len(parse_request.data_parameters)} parameters.")
+    validated_parameters: Dict[str, Any] = extract_data_with_llm(
+            remove_parameters(parse_request, pre_extracted), deadline)
+
+    if "error" in validated_parameters:
+        return validated_parameters
+    return {**validated_parameters, **pre_extracted}
+
 
+def extract_data_with_llm(parse_request: ExtractRequest,
+                          deadline: Optional[Deadline] = None
+                          ) -> dict[str, Any]:
+    if LLM_HEDGING_ENABLED:
+        return extract_data_hedged(parse_request, deadline)
 
-def extract_data(parse_request: ExtractRequest) -> dict[str, Any]:
     prompt: str = generate_prompt(parse_request)
-    llm_response: str = prompt_llm(prompt, operation_type="parsing")
-    validated_parameters: Dict[str, Any] = validate_llm_response(
+    llm_response: str = prompt_llm(
+            prompt, operation_type="parsing", deadline=deadline)
+    validated_parameters, rejected_values = validate_llm_response_fields(
             llm_response, parse_request)
 
     if "error" not in validated_parameters:
         logger.debug(f"Identified parameters: {validated_parameters}")
         logger.info("Initial parsing successful.")
+        return complete_parameters(parse_request, validated_parameters,
+                                   rejected_values, deadline=deadline)
+
+    if deadline and not deadline.can_afford_alternate_model("parsing"):
+        logger.info("Initial parsing failed and there is not enough time "
+                    "left to retry.")
         return validated_parameters
 
     logger.info(
         "Initial parsing failed. Retrying with alternate configuration.")
+    prompt = generate_prompt(parse_request, change_llm=True)
     llm_response = prompt_llm(
-            prompt, operation_type="parsing", change_llm=True)
-    validated_parameters = validate_llm_response(llm_response,
-                                                 parse_request)
+            prompt, operation_type="parsing", change_llm=True,
+            deadline=deadline)
+    validated_parameters, rejected_values = validate_llm_response_fields(
+            llm_response, parse_request)
 
     if "error" not in validated_parameters:
         logger.info("Parsing successful after retry.")
-        return validated_parameters
+        return complete_parameters(parse_request, validated_parameters,
+                                   rejected_values, change_llm=True,
+                                   deadline=deadline)
 
     else:
         logger.debug("Failed to identify a valid intent after retry. "
@@ -43,22 +106,53 @@ def extract_data(parse_request: ExtractRequest) -> dict[str, Any]:
         return validated_parameters
 
 
-def generate_prompt(parse_request: ExtractRequest) -> str:
+def extract_data_hedged(parse_request: ExtractRequest,
+                        deadline: Optional[Deadline] = None
+                        ) -> dict[str, Any]:
+    def attempt(change_llm: bool) -> Tuple[Dict[str, Any], Dict[str, Any],
+                                           bool]:
+        prompt: str = generate_prompt(parse_request, change_llm=change_llm)
+        llm_response: str = prompt_llm(
+                prompt, operation_type="parsing", change_llm=change_llm,
+                deadline=deadline)
+        return validate_llm_response_fields(
+                llm_response, parse_request) + (change_llm,)
+
+    validated_parameters, rejected_values, change_llm = hedged_call(
+            attempt,
+            is_valid=lambda result: "error" not in result[0],
+            operation_type="parsing",
+            deadline=deadline)
+
+    if "error" in validated_parameters:
+        logger.info("Hedged parsing failed on both models.")
+        return validated_parameters
+
+    logger.info("Hedged parsing successful.")
+    return complete_parameters(parse_request, validated_parameters,
+                               rejected_values, change_llm=change_llm,
+                               deadline=deadline)
+
+
+@timed("prompt_render")
+def generate_prompt(
+        parse_request: ExtractRequest, change_llm: bool = False) -> str:
     logger.debug("Generating prompt for LLM.")
+    model_id: str = resolve_model_id(alternate_model=change_llm)
     intent_params: str = parse_request.output_stringified_data_parameters()
-    messages: str = parse_request.output_stringified_messages()
 
-    prompt_template: PromptTemplate = PromptTemplate(
-            template=(
-                MISTRAL_PARSING_PROMPT_TEMPLATE if "mistral" in LLM_MODEL_ID
-                else LLAMA_PARSING_PROMPT_TEMPLATE),
-            input_variables=["intent_parameters", "email_conversation"]
-    )
+    def render(request: ExtractRequest) -> str:
+        return render_prompt(
+                model_id,
+                operation_type="parsing",
+                intent_parameters=intent_params,
+                email_conversation=request.output_stringified_messages()
+        )
 
-    prompt: str = prompt_template.format(
-            intent_parameters=intent_params,
-            email_conversation=messages
-    )
+    prompt: str = (
+        fit_prompt(parse_request, model_id, MAX_TOKEN_OUTPUT_FOR_PARSING,
+                   render)
+        if TOKEN_BUDGET_ENABLED else render(parse_request))
 
     logger.debug(f"Generated prompt: {prompt}")
     logger.info("Prompt generated for LLM processing.")
@@ -67,67 +161,177 @@ def generate_prompt(parse_request: ExtractRequest) -> str:
 
 def validate_llm_response(
         response: str, extract_request: ExtractRequest) -> dict[str, Any]:
-    ValidationModel: BaseModel = generate_dynamic_model(extract_request)
-    dynamic_model = ValidationModel()  # type: ignore
+    return validate_llm_response_fields(response, extract_request)[0]
+
+
+@timed("validation")
+def validate_llm_response_fields(
+        response: str, extract_request: ExtractRequest
+        ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # Returns the valid parameters and the rejected ones: invalid keys with
+    # the value the model gave, and keys it left out entirely with None.
+    ValidationModel: Type[BaseModel] = generate_dynamic_model(extract_request)
     try:
         if "\n" in response:
             response = response.replace("\n", "")
 
-        response = extract_json_like_content(response)
-        llm_response_dict: dict = json.loads(response)
-
-        for field_name in dynamic_model.model_fields.keys():
-            try:
-                if field_name in llm_response_dict:
-                    setattr(dynamic_model, field_name,
-                            llm_response_dict[field_name])
-            except ValidationError:
-                setattr(dynamic_model, field_name, None)
+        llm_response_dict: Dict[str, Any] = parse_json_response(response)
+        validated_parameters, rejected_values = validate_fields(
+                ValidationModel, llm_response_dict)
 
         logger.info("LLM response validated.")
-        return dynamic_model.model_dump(exclude_none=True)
+        return validated_parameters, rejected_values
 
     except json.JSONDecodeError as error:
         logger.error(f"Failed to validate LLM response: {str(error)}")
-        return {"error": f"invalid_response: {response}"}
+        return {"error": f"invalid_response: {response}"}, {}
 
     except Exception as error:
         logger.error(f"Validation failed: {str(error)}", exc_info=True)
-        return {"error": f"invalid_response: {str(error)}"}
+        return {"error": f"invalid_response: {str(error)}"}, {}
 
 
-def extract_json_like_content(input_string: str) -> str:
-    match = re.search(r'\{.*?\}', input_string)
+def parse_json_response(response: str) -> Dict[str, Any]:
+    llm_response_dict, repairs = recover_json_object(response)
 
-    if not match:
-        return input_string
+    if repairs:
+        logger.info(f"Recovered LLM response JSON: {', '.join(repairs)}")
+        increment("json_recoveries")
+    return llm_response_dict
 
-    json_like_content = match.group(0)
-    return re.sub(r',\s*}', '}', json_like_content)
 
+def validate_fields(
+        ValidationModel: Type[BaseModel], values: Dict[str, Any],
+        field_names: Optional[Iterable[str]] = None
+        ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # Valid values are kept as the model gave them; the model only checks
+    # that they coerce to the parameter's data type.
+    dynamic_model = ValidationModel()  # type: ignore
+    validated_parameters: Dict[str, Any] = {}
+    rejected_values: Dict[str, Any] = {}
 
-def generate_dynamic_model(parse_request: ExtractRequest) -> BaseModel:
-    intent_parameters = {
-        param.key: param.data_type for param in parse_request.data_parameters
+    for field_name in field_names or ValidationModel.model_fields:
+        if field_name not in values:
+            rejected_values[field_name] = None
+            continue
+
+        if values[field_name] is None:
+            continue
+
+        try:
+            setattr(dynamic_model, field_name, values[field_name])
+            validated_parameters[field_name] = values[field_name]
+        except ValidationError:
+            logger.debug(f"Invalid value for {field_name}: "
+                         f"{values[field_name]}")
+            rejected_values[field_name] = values[field_name]
+
+    return validated_parameters, rejected_values
+
+
+def complete_parameters(
+        parse_request: ExtractRequest, validated_parameters: Dict[str, Any],
+        rejected_values: Dict[str, Any], change_llm: bool = False,
+        deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    if not rejected_values or not PARTIAL_REPROMPT_ENABLED:
+        return validated_parameters
+
+    if deadline and not deadline.can_afford(PARTIAL_REPROMPT_MIN_SECONDS):
+        logger.info("Not enough time left to re-prompt for "
+                    f"{len(rejected_values)} parameters.")
+        return validated_parameters
+
+    logger.info(f"Re-prompting for {len(rejected_values)} missing or invalid "
+                "parameters.")
+    increment("partial_reprompts")
+    model_id: str = resolve_model_id(alternate_model=change_llm)
+
+    try:
+        llm_response: str = prompt_llm(
+                generate_repair_prompt(parse_request, rejected_values,
+                                       change_llm=change_llm),
+                operation_type="parsing",
+                change_llm=change_llm,
+                deadline=deadline,
+                model_kwargs=setup_max_tokens_kwargs(
+                        model_id, calculate_repair_budget(rejected_values)))
+
+        repaired_parameters, still_rejected = validate_fields(
+                generate_dynamic_model(parse_request),
+                parse_json_response(llm_response.replace("\n", "")),
+                field_names=list(rejected_values))
+
+    except Exception as error:
+        logger.warning(f"Re-prompting failed: {str(error)}")
+        return validated_parameters
+
+    logger.info(f"Re-prompting recovered {len(repaired_parameters)} of "
+                f"{len(rejected_values)} parameters.")
+    return {**validated_parameters, **repaired_parameters}
+
+
+def calculate_repair_budget(rejected_values: Dict[str, Any]) -> int:
+    return min(MAX_TOKEN_OUTPUT_FOR_PARSING,
+               PARTIAL_REPROMPT_BASE_TOKENS +
+               PARTIAL_REPROMPT_TOKENS_PER_KEY * len(rejected_values))
+
+
+@timed("prompt_render")
+def generate_repair_prompt(
+        parse_request: ExtractRequest, rejected_values: Dict[str, Any],
+        change_llm: bool = False) -> str:
+    intent_params: str = "\n".join(
+            str(param) for param in parse_request.data_parameters
+            if param.key in rejected_values)
+    invalid_values: Dict[str, Any] = {
+        key: value for key, value in rejected_values.items()
+        if value is not None
     }
 
-    field_definitions: Dict[str, Any] = {}
+    model_id: str = resolve_model_id(alternate_model=change_llm)
+
+    def render(request: ExtractRequest) -> str:
+        return render_prompt(
+                model_id,
+                operation_type="repair",
+                intent_parameters=intent_params,
+                rejected_values=json.dumps(invalid_values,
+                                           ensure_ascii=False, default=str),
+                email_conversation=request.output_stringified_messages()
+        )
+
+    if TOKEN_BUDGET_ENABLED:
+        return fit_prompt(parse_request, model_id,
+                          calculate_repair_budget(rejected_values), render)
+    return render(parse_request)
 
-    for key, data_type in intent_parameters.items():
-        if "int" in data_type.lower():
-            field_definitions[key] = (Optional[int], Field(default=None))
 
-        elif "date" in data_type.lower():
-            field_definitions[key] = (Optional[date], Field(default=None))
+def generate_dynamic_model(parse_request: ExtractRequest) -> Type[BaseModel]:
+    return compile_validation_model(generate_schema_signature(parse_request))
 
-        elif "time" in data_type.lower():
-            field_definitions[key] = (Optional[time], Field(default=None))
 
-        elif "bool" in data_type.lower():
-            field_definitions[key] = (Optional[bool], Field(default=None))
+def generate_schema_signature(
+        parse_request: ExtractRequest) -> Tuple[Tuple[str, str], ...]:
+    intent_parameters = {
+        param.key: param.data_type.strip().lower()
+        for param in parse_request.data_parameters
+    }
+
+    return tuple(sorted(intent_parameters.items()))
 
-        else:
-            field_definitions[key] = (Optional[str], Field(default=None))
 
+@lru_cache(maxsize=VALIDATION_MODEL_CACHE_SIZE)
+def compile_validation_model(
+        schema_signature: Tuple[Tuple[str, str], ...]) -> Type[BaseModel]:
+    logger.debug(f"Compiling validation model for {schema_signature}.")
+    field_definitions: Dict[str, Any] = {
+        key: (Optional[DATA_TYPES.get(data_type, str)], Field(default=None))
+        for key, data_type in schema_signature
+    }
+
+    # Assignments are validated so each field can be checked on its own;
+    # numbers the model gives for string parameters stay valid.
     return create_model('ValidationModel',
+                        __config__=ConfigDict(validate_assignment=True,
+                                              coerce_numbers_to_str=True),
                         **field_definitions)  # type: ignore
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from src import logger
+from src.config import (ALTERNATE_MODEL_MIN_SECONDS,
+                        AWS_CONNECT_TIMEOUT_SECONDS,
+                        DEADLINE_ERROR_RESERVE_SECONDS, DEADLINE_MAX_WORKERS,
+                        DEADLINE_STAGE_BUDGET_SECONDS)
+from src.lazy_module import LazyModule
+from src.metrics import bind_context, increment
+
+if TYPE_CHECKING:
+    from botocore.config import Config  # type: ignore
+else:
+    botocore_config = LazyModule("botocore.config")
+
+T = TypeVar("T")
+
+_executor_lock: threading.Lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+# One slot per executor thread, taken before a stage is submitted, so stages
+# never wait in the executor queue and the budget only counts the call.
+_slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+        DEADLINE_MAX_WORKERS)
+
+
+class DeadlineExceededError(RuntimeError):
+    pass
+
+
+class Deadline:
+    # The point in time by which an invocation must finish, minus the time
+    # reserved for sending the error response.
+    def __init__(self, expires_at: float,
+                 reserve_seconds: float = DEADLINE_ERROR_RESERVE_SECONDS
+                 ) -> None:
+        self.expires_at: float = expires_at
+        self.reserve_seconds: float = reserve_seconds
+
+    @classmethod
+    def after(cls, seconds: float,
+              reserve_seconds: float = DEADLINE_ERROR_RESERVE_SECONDS
+              ) -> "Deadline":
+        return cls(time.monotonic() + seconds, reserve_seconds)
+
+    def remaining(self) -> float:
+        return max(0.0,
+                   self.expires_at - self.reserve_seconds - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def can_afford(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def can_afford_alternate_model(self, operation_type: str) -> bool:
+        return self.can_afford(ALTERNATE_MODEL_MIN_SECONDS[operation_type])
+
+    def budget(self, stage: str) -> float:
+        if stage not in DEADLINE_STAGE_BUDGET_SECONDS:
+            raise ValueError("Invalid deadline stage.")
+
+        return min(DEADLINE_STAGE_BUDGET_SECONDS[stage], self.remaining())
+
+    def without_reserve(self) -> "Deadline":
+        return Deadline(self.expires_at, reserve_seconds=0.0)
+
+    def run(self, stage: str, function: Callable[..., T], *args: Any,
+            **kwargs: Any) -> T:
+        timeout: float = self.budget(stage)
+
+        if timeout <= 0:
+            logger.error(f"No time left for the {stage} stage.")
+            raise DeadlineExceededError(f"No time left for the {stage} stage.")
+
+        if not _slots.acquire(blocking=False):
+            logger.warning(f"No free deadline worker, running the {stage} "
+                           "stage in the calling thread.")
+            increment("deadline_inline_stages")
+            return function(*args, **kwargs)
+
+        future: Future = get_executor().submit(
+                bind_context(run_in_slot), function, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+
+        except FutureTimeoutError:
+            # The call keeps its thread until the client timeout ends it.
+            logger.error(f"The {stage} stage exceeded its {timeout:.2f}s "
+                         "budget.")
+            raise DeadlineExceededError(
+                    f"The {stage} stage exceeded its {timeout:.2f}s budget.")
+
+
+def run_in_slot(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _slots.release()
+
+
+def create_client_config(stage: str) -> Config:
+    # The boto3 client settings that end a call of the stage at its budget.
+    # Botocore retries read timeouts by default, which would run the call
+    # for several budgets, so the client makes a single attempt.
+    if stage not in DEADLINE_STAGE_BUDGET_SECONDS:
+        raise ValueError("Invalid deadline stage.")
+
+    return botocore_config.Config(
+            connect_timeout=AWS_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=DEADLINE_STAGE_BUDGET_SECONDS[stage],
+            retries={"mode": "standard", "total_max_attempts": 1})
+
+
+def create_deadline(context: Any) -> Optional[Deadline]:
+    try:
+        remaining_milliseconds: float = float(
+                context.get_remaining_time_in_millis())
+    except (AttributeError, TypeError, ValueError):
+        logger.debug("No remaining time in the context; running without "
+                     "a deadline.")
+        return None
+
+    return Deadline.after(remaining_milliseconds / 1000)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEADLINE_MAX_WORKERS,
+                                           thread_name_prefix="deadline")
+        return _executor
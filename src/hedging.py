@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from typing import Callable, Dict, Optional, Set, Tuple, TypeVar
+
+from src import logger
+from src.config import LLM_HEDGE_DELAY_SECONDS, LLM_HEDGE_MAX_WORKERS
+from src.deadline import Deadline
+from src.metrics import bind_context
+
+T = TypeVar("T")
+
+_executor_lock: threading.Lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def hedged_call(attempt: Callable[[bool], T], is_valid: Callable[[T], bool],
+                operation_type: str,
+                deadline: Optional[Deadline] = None) -> T:
+    # Runs attempt(change_llm=False) and, after the hedge delay, also
+    # attempt(change_llm=True), keeping the first result that validates.
+    hedge_delay: float = get_hedge_delay(operation_type)
+    executor: ThreadPoolExecutor = get_executor()
+    labels: Dict[Future, str] = {}
+
+    primary: Future = executor.submit(bind_context(attempt), False)
+    labels[primary] = "primary"
+    pending: Set[Future] = {primary}
+
+    if hedge_delay > 0:
+        _, pending = wait(pending, timeout=hedge_delay)
+
+    results: Dict[str, T] = {}
+    error: Optional[Exception] = None
+
+    if not pending:
+        result, error = collect(primary)
+        if error is None and is_valid(result):
+            logger.info("Primary model answered before the hedge delay.")
+            return result
+        if error is None:
+            results["primary"] = result
+
+    if deadline and not deadline.can_afford_alternate_model(operation_type):
+        logger.info("Not enough time left for the alternate model.")
+    else:
+        logger.info("Launching the hedged alternate model for "
+                    f"{operation_type}.")
+        alternate: Future = executor.submit(bind_context(attempt), True)
+        labels[alternate] = "alternate"
+        pending.add(alternate)
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            result, future_error = collect(future)
+            if future_error is not None:
+                error = future_error
+                continue
+
+            if is_valid(result):
+                for other_future in pending:
+                    other_future.cancel()
+                logger.info(f"Hedged call answered by the {labels[future]} "
+                            "model.")
+                return result
+
+            results[labels[future]] = result
+
+    if "alternate" in results:
+        return results["alternate"]
+    if "primary" in results:
+        return results["primary"]
+
+    if error is not None:
+        raise error
+    raise RuntimeError("Hedged call returned no result.")
+
+
+def collect(future: Future) -> Tuple[Optional[T], Optional[Exception]]:
+    try:
+        return future.result(), None
+    except Exception as error:
+        logger.error(f"Hedged model call failed: {str(error)}")
+        return None, error
+
+
+def get_hedge_delay(operation_type: str) -> float:
+    if operation_type not in LLM_HEDGE_DELAY_SECONDS:
+        raise ValueError("Invalid operation type.")
+
+    return max(0.0, LLM_HEDGE_DELAY_SECONDS[operation_type])
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                    max_workers=LLM_HEDGE_MAX_WORKERS,
+                    thread_name_prefix="hedge")
+        return _executor
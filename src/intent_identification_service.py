@@ -1,19 +1,42 @@
 import re
-from typing import List
+from typing import List, Optional
 
-from langchain_core.prompts import PromptTemplate  # type: ignore
 from pydantic import ValidationError  # type: ignore
 
 from src import logger
-from src.bedrock_wrapper import prompt_llm
-from src.config import LLAMA_INTENT_PROMPT_TEMPLATE, LLM_MODEL_ID, \
-    MISTRAL_INTENT_PROMPT_TEMPLATE
+from src.bedrock_wrapper import (prompt_llm, resolve_model_id,
+                                 setup_max_tokens_kwargs)
+from src.config import (INTENT_LABEL_ENCODING_ENABLED, INTENT_RULES_ENABLED,
+                        INTENT_SHORTLIST_ENABLED, LLM_HEDGING_ENABLED,
+                        MAX_TOKEN_OUTPUT_FOR_INTENT, TOKEN_BUDGET_ENABLED)
+from src.deadline import Deadline
+from src.hedging import hedged_call
+from src.intent_labels import IntentLabels, decode_intent_label
+from src.intent_rules import match_intent_rule
+from src.intent_shortlist import shortlist_intent_request
+from src.metrics import timed
 from src.models import IdentifiedIntent, Intent, IntentRequest
+from src.prompt_renderer import get_model_family, render_prompt
+from src.token_budget import fit_prompt
 
 
-def identify_intent(intent_request: IntentRequest) -> str:
+def identify_intent(intent_request: IntentRequest,
+                    deadline: Optional[Deadline] = None) -> str:
+    if INTENT_RULES_ENABLED:
+        rule_intent: Optional[str] = match_intent_rule(intent_request)
+        if rule_intent:
+            return rule_intent
+
+    if INTENT_SHORTLIST_ENABLED:
+        intent_request = shortlist_intent_request(intent_request)
+
+    if LLM_HEDGING_ENABLED:
+        return identify_intent_hedged(intent_request, deadline)
+
     prompt: str = generate_prompt(intent_request)
-    llm_response: str = prompt_llm(prompt, operation_type="intent")
+    llm_response: str = prompt_llm(
+            prompt, operation_type="intent", deadline=deadline,
+            model_kwargs=setup_label_model_kwargs(intent_request))
     identified_intent: str = validate_llm_response(llm_response,
                                                    intent_request.intents)
 
@@ -21,12 +44,22 @@ def identify_intent(intent_request: IntentRequest) -> str:
         logger.info("Initial intent identification successful.")
         return identified_intent
 
+    if deadline and not deadline.can_afford_alternate_model("intent"):
+        logger.info("Initial intent identification failed and there is not "
+                    "enough time left to retry.")
+        return identified_intent
+
     logger.info("Initial intent identification failed. Retrying with alternate"
                 " configuration.")
+    prompt = generate_prompt(intent_request, change_llm=True)
     llm_response = prompt_llm(
-            prompt, operation_type="intent", change_llm=True)
+            prompt, operation_type="intent", change_llm=True,
+            deadline=deadline,
+            model_kwargs=setup_label_model_kwargs(intent_request,
+                                                  change_llm=True))
     identified_intent = validate_llm_response(llm_response,
-                                              intent_request.intents)
+                                              intent_request.intents,
+                                              change_llm=True)
 
     if identified_intent != "invalid_intent":
         logger.info("Intent identification successful after retry.")
@@ -37,28 +70,95 @@ def identify_intent(intent_request: IntentRequest) -> str:
         return identified_intent
 
 
-def generate_prompt(intent_request: IntentRequest) -> str:
-    intents: str = intent_request.output_stringified_intents()
-    messages: str = intent_request.output_stringified_messages()
-
-    prompt_template: PromptTemplate = PromptTemplate(
-            template=(MISTRAL_INTENT_PROMPT_TEMPLATE
-                      if "mistral" in LLM_MODEL_ID
-                      else LLAMA_INTENT_PROMPT_TEMPLATE),
-            input_variables=["intent_list", "email_conversation"]
-    )
+def identify_intent_hedged(intent_request: IntentRequest,
+                           deadline: Optional[Deadline] = None) -> str:
+    def attempt(change_llm: bool) -> str:
+        prompt: str = generate_prompt(intent_request, change_llm=change_llm)
+        llm_response: str = prompt_llm(
+                prompt, operation_type="intent", change_llm=change_llm,
+                deadline=deadline,
+                model_kwargs=setup_label_model_kwargs(intent_request,
+                                                      change_llm))
+        return validate_llm_response(llm_response, intent_request.intents,
+                                     change_llm)
+
+    identified_intent: str = hedged_call(
+            attempt,
+            is_valid=lambda intent: intent != "invalid_intent",
+            operation_type="intent",
+            deadline=deadline)
 
-    prompt: str = prompt_template.format(
-            intent_list=intents,
-            email_conversation=messages
-    )
+    if identified_intent != "invalid_intent":
+        logger.info("Hedged intent identification successful.")
+    else:
+        logger.info("Failed to identify a valid intent with hedging.")
+    return identified_intent
+
+
+@timed("prompt_render")
+def generate_prompt(
+        intent_request: IntentRequest, change_llm: bool = False) -> str:
+    model_id: str = resolve_model_id(alternate_model=change_llm)
+    intents: str = (
+        IntentLabels(intent_request.intents,
+                     get_model_family(model_id)).render()
+        if INTENT_LABEL_ENCODING_ENABLED
+        else intent_request.output_stringified_intents())
+
+    def render(request: IntentRequest) -> str:
+        return render_prompt(
+                model_id,
+                operation_type="intent",
+                intent_list=intents,
+                email_conversation=request.output_stringified_messages()
+        )
+
+    prompt: str = (
+        fit_prompt(intent_request, model_id, MAX_TOKEN_OUTPUT_FOR_INTENT,
+                   render)
+        if TOKEN_BUDGET_ENABLED else render(intent_request))
 
     logger.info("Prompt generated for LLM processing.")
     return prompt
 
 
-def validate_llm_response(response: str, intents: List[Intent]) -> str:
+def setup_label_model_kwargs(intent_request: IntentRequest,
+                             change_llm: bool = False) -> Optional[dict]:
+    # Raises the output budget only for catalogs too large for single token
+    # labels.
+    if not INTENT_LABEL_ENCODING_ENABLED:
+        return None
+
+    model_id: str = resolve_model_id(alternate_model=change_llm)
+    labels: IntentLabels = IntentLabels(intent_request.intents,
+                                        get_model_family(model_id))
+
+    if labels.max_tokens <= MAX_TOKEN_OUTPUT_FOR_INTENT:
+        return None
+
+    logger.info(f"{len(labels.labels)} intents need {labels.max_tokens} "
+                "token labels.")
+    return setup_max_tokens_kwargs(model_id, labels.max_tokens)
+
+
+@timed("validation")
+def validate_llm_response(response: str, intents: List[Intent],
+                          change_llm: bool = False) -> str:
     logger.debug(f"Validating LLM response: {response}")
+
+    if INTENT_LABEL_ENCODING_ENABLED:
+        # Decoded with the labels of the model that answered; a number
+        # further into the answer is the fallback, as without labels.
+        family: str = get_model_family(
+                resolve_model_id(alternate_model=change_llm))
+        slug: Optional[str] = (
+            decode_intent_label(response, intents, family)
+            or decode_intent_label(extract_integer(response), intents,
+                                   family))
+        if slug is None:
+            logger.error(f"Failed to decode an intent label: {response}")
+        return slug or "invalid_intent"
+
     try:
         response = extract_integer(response)
         identified_intent: IdentifiedIntent = IdentifiedIntent(
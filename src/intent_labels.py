@@ -0,0 +1,77 @@
+import math
+import re
+from string import ascii_uppercase
+from typing import Dict, List, Optional, Tuple
+
+from src.models import Intent
+from src.token_budget import DIGITS_PER_TOKEN
+
+# Labels that are single tokens for each model family's tokenizer. Llama 3
+# splits digit runs into groups of up to three digits, so 1-999 are single
+# tokens. The Mistral tokenizer splits every digit, so it gets 1-9 followed
+# by the uppercase letters; lowercase letters are left out so labels stay
+# distinct when the model changes the case of its answer.
+SINGLE_TOKEN_LABELS: Dict[str, Tuple[str, ...]] = {
+    "llama": tuple(str(number) for number in range(1, 1000)),
+    "mistral": tuple("123456789" + ascii_uppercase),
+}
+
+# Words a model may put before the label, as in "Label: B" or "Intent 5".
+LABEL_LEAD_INS: Tuple[str, ...] = ("intent", "label", "id")
+
+LABEL_PATTERN: re.Pattern = re.compile(
+        r"^\W*(?:(?:" + "|".join(LABEL_LEAD_INS) + r")\b\W*)*(\w+)",
+        re.IGNORECASE)
+
+
+class IntentLabels:
+    # Maps the intents of one request, by position, to the shortest labels
+    # of a model family, and decodes the model's answer back to a slug.
+    # Catalogs larger than the single token labels get two letter labels
+    # for Mistral, and numbers for Llama or the largest Mistral catalogs.
+    def __init__(self, intents: List[Intent], family: str) -> None:
+        if family not in SINGLE_TOKEN_LABELS:
+            raise ValueError("Invalid model family.")
+
+        single_token_labels: Tuple[str, ...] = SINGLE_TOKEN_LABELS[family]
+        self.family: str = family
+
+        if len(intents) <= len(single_token_labels):
+            self.max_tokens: int = 1
+            self.labels: List[str] = list(
+                    single_token_labels[:len(intents)])
+        elif family == "mistral" and len(intents) <= len(ascii_uppercase) ** 2:
+            self.max_tokens = 2
+            self.labels = [generate_two_token_label(index)
+                           for index in range(len(intents))]
+        else:
+            self.max_tokens = math.ceil(
+                    len(str(len(intents))) / DIGITS_PER_TOKEN[family])
+            self.labels = [str(index + 1) for index in range(len(intents))]
+
+        self.intents_by_label: Dict[str, Intent] = dict(
+                zip(self.labels, intents))
+
+    def render(self) -> str:
+        return "\n".join(
+                f"{label} = {intent.slug}: {intent.description}"
+                for label, intent in self.intents_by_label.items())
+
+    def decode(self, response: str) -> Optional[str]:
+        match = LABEL_PATTERN.search(response)
+        if not match:
+            return None
+
+        intent: Optional[Intent] = self.intents_by_label.get(
+                match.group(1).upper())
+        return intent.slug if intent else None
+
+
+def generate_two_token_label(index: int) -> str:
+    first, second = divmod(index, len(ascii_uppercase))
+    return ascii_uppercase[first] + ascii_uppercase[second]
+
+
+def decode_intent_label(response: str, intents: List[Intent],
+                        family: str) -> Optional[str]:
+    return IntentLabels(intents, family).decode(response)
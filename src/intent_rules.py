@@ -0,0 +1,161 @@
+import json
+import re
+import threading
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from src import logger
+from src.config import INTENT_RULES_MIN_CONFIDENCE, INTENT_RULES_PATH
+from src.metrics import set_property, timed
+from src.models import IntentRequest, IntentRule, IntentRuleSet, Message, \
+    RuleCondition
+
+# The message fields rules can match on, besides the sender role.
+RULE_FIELDS: tuple = ("subject", "message", "sender")
+
+_engine: Optional["IntentRuleEngine"] = None
+_engine_lock: threading.Lock = threading.Lock()
+
+
+class IntentRuleEngine:
+    # Compiles the patterns and keywords of every rule into one alternation
+    # per field, which skips fields no rule matches in a single scan. Each
+    # distinct condition is then searched on its own and marks every rule
+    # using it, so rules with the same or overlapping conditions all match.
+    # A rule fires when all of its fields matched and the role fits; the
+    # first such rule in file order wins.
+    def __init__(self, rule_set: IntentRuleSet,
+                 min_confidence: float = INTENT_RULES_MIN_CONFIDENCE) -> None:
+        self.version: str = rule_set.version
+        self.rules: List[IntentRule] = [
+            rule for rule in rule_set.rules
+            if rule.confidence >= min_confidence
+        ]
+        self.required_fields: List[FrozenSet[str]] = []
+        self.roles: List[FrozenSet[str]] = []
+        conditions: Dict[str, Dict[str, List[int]]] = {
+            field: {} for field in RULE_FIELDS
+        }
+
+        for index, rule in enumerate(self.rules):
+            fields: Set[str] = set()
+            for field in RULE_FIELDS:
+                condition: Optional[RuleCondition] = getattr(rule, field)
+                if condition and (condition.patterns or condition.keywords):
+                    pattern: str = compile_condition(rule, condition)
+                    conditions[field].setdefault(pattern, []).append(index)
+                    fields.add(field)
+
+            if not fields:
+                logger.error(f"Intent rule {rule.name} has no conditions.")
+                raise ValueError("Invalid intent rule.")
+
+            self.required_fields.append(frozenset(fields))
+            self.roles.append(frozenset(role.lower() for role in rule.roles))
+
+        self.prefilters: Dict[str, re.Pattern] = {
+            field: re.compile("|".join(f"(?:{pattern})"
+                                       for pattern in field_conditions),
+                              re.IGNORECASE)
+            for field, field_conditions in conditions.items()
+            if field_conditions
+        }
+        self.conditions: Dict[str, List[Tuple[re.Pattern, List[int]]]] = {
+            field: [(re.compile(pattern, re.IGNORECASE), indices)
+                    for pattern, indices in field_conditions.items()]
+            for field, field_conditions in conditions.items()
+            if field_conditions
+        }
+
+    def match(self, message: Message,
+              slugs: Set[str]) -> Optional[IntentRule]:
+        matched_fields: Dict[int, Set[str]] = {}
+
+        for field, prefilter in self.prefilters.items():
+            text: str = getattr(message, field) or ""
+            if not prefilter.search(text):
+                continue
+
+            for pattern, indices in self.conditions[field]:
+                if pattern.search(text):
+                    for index in indices:
+                        matched_fields.setdefault(index, set()).add(field)
+
+        for index in sorted(matched_fields):
+            rule: IntentRule = self.rules[index]
+            roles: FrozenSet[str] = self.roles[index]
+
+            if (matched_fields[index] == self.required_fields[index]
+                    and (not roles or message.role.lower() in roles)
+                    and rule.intent in slugs):
+                return rule
+        return None
+
+
+def compile_condition(rule: IntentRule, condition: RuleCondition) -> str:
+    # Conditions are joined into one pattern per field, so patterns may not
+    # name their groups.
+    for pattern in condition.patterns:
+        try:
+            re.compile(pattern)
+        except re.error:
+            logger.error(f"Invalid pattern in intent rule {rule.name}: "
+                         f"{pattern}")
+            raise ValueError("Invalid intent rule pattern.")
+
+        if "(?P<" in pattern:
+            logger.error(f"Named group in intent rule {rule.name}: {pattern}")
+            raise ValueError("Invalid intent rule pattern.")
+
+    keyword_patterns: List[str] = [
+        r"\b" + r"\s+".join(map(re.escape, keyword.split())) + r"\b"
+        for keyword in condition.keywords
+    ]
+    return "|".join(f"(?:{pattern})"
+                    for pattern in condition.patterns + keyword_patterns)
+
+
+def load_intent_rules(path: str = INTENT_RULES_PATH) -> IntentRuleEngine:
+    with open(path, encoding="utf-8") as rules_file:
+        rule_set: IntentRuleSet = IntentRuleSet(**json.load(rules_file))
+
+    engine: IntentRuleEngine = IntentRuleEngine(rule_set)
+    logger.info(f"Loaded {len(engine.rules)} intent rules, version "
+                f"{engine.version}.")
+    return engine
+
+
+def get_intent_rule_engine() -> IntentRuleEngine:
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = load_intent_rules()
+        return _engine
+
+
+def clear_intent_rule_engine() -> None:
+    global _engine
+
+    with _engine_lock:
+        _engine = None
+
+
+@timed("intent_rules")
+def match_intent_rule(intent_request: IntentRequest) -> Optional[str]:
+    # Rules look at the latest message, which is the one being answered.
+    if not intent_request.messages:
+        return None
+
+    engine: IntentRuleEngine = get_intent_rule_engine()
+    rule: Optional[IntentRule] = engine.match(
+            intent_request.messages[-1],
+            {intent.slug for intent in intent_request.intents})
+
+    if rule is None:
+        return None
+
+    logger.info(f"Intent rule {rule.name} (version {engine.version}) "
+                f"matched: {rule.intent}")
+    set_property("intent_rule", rule.name)
+    set_property("intent_rules_version", engine.version)
+    return rule.intent
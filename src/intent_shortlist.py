@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from src import logger
+from src.config import (INTENT_INDEX_CACHE_SIZE,
+                        INTENT_SHORTLIST_FALLBACK_SLUG,
+                        INTENT_SHORTLIST_TOP_K)
+from src.lazy_module import LazyModule
+from src.metrics import set_property, timed
+from src.models import Intent, IntentRequest
+
+if TYPE_CHECKING:
+    import numpy  # type: ignore
+else:
+    numpy = LazyModule("numpy")
+
+# The BM25 term frequency saturation and document length normalisation.
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+TOKEN_PATTERN: re.Pattern = re.compile(r"[^\W\d_]+")
+STOP_WORDS: frozenset = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for",
+    "from", "has", "have", "hi", "i", "if", "in", "is", "it", "me", "my",
+    "of", "on", "or", "our", "please", "so", "that", "the", "their", "this",
+    "to", "us", "was", "we", "with", "would", "you", "your",
+))
+SUFFIXES: Tuple[str, ...] = ("ing", "ed", "es", "s")
+STEM_LENGTH: int = 6
+
+
+class IntentIndex:
+    # An inverted BM25 index over the slugs and descriptions of one intent
+    # catalog. Each term maps to the positions of the intents containing it
+    # and their precomputed weights, so a conversation is scored with one
+    # vectorised addition per distinct term.
+    def __init__(self, documents: List[List[str]]) -> None:
+        self.size: int = len(documents)
+        term_frequencies: Dict[str, Dict[int, int]] = {}
+
+        for position, document in enumerate(documents):
+            for token in document:
+                postings: Dict[int, int] = term_frequencies.setdefault(
+                        token, {})
+                postings[position] = postings.get(position, 0) + 1
+
+        lengths = numpy.array([len(document) for document in documents],
+                              dtype=float)
+        average_length: float = max(float(lengths.mean()), 1.0) if (
+            self.size) else 1.0
+        normalisation = BM25_K1 * (
+                1 - BM25_B + BM25_B * lengths / average_length)
+
+        self.postings: Dict[str, Tuple[numpy.ndarray, numpy.ndarray]] = {}
+        for token, postings in term_frequencies.items():
+            positions = numpy.fromiter(postings.keys(), dtype=int)
+            frequencies = numpy.fromiter(postings.values(), dtype=float)
+            idf: float = float(numpy.log(
+                    1 + (self.size - len(postings) + 0.5) / (
+                            len(postings) + 0.5)))
+            self.postings[token] = (
+                positions,
+                idf * frequencies * (BM25_K1 + 1) / (
+                        frequencies + normalisation[positions]))
+
+    def score(self, tokens: List[str]) -> numpy.ndarray:
+        scores = numpy.zeros(self.size)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            if token in self.postings:
+                counts[token] = counts.get(token, 0) + 1
+
+        for token, count in counts.items():
+            positions, weights = self.postings[token]
+            scores[positions] += weights * count
+        return scores
+
+    def rank(self, tokens: List[str], top_k: int) -> List[int]:
+        # The positions of the best scoring intents, leaving out intents
+        # that share no term with the conversation.
+        return [position for position, _ in self.rank_scores(tokens, top_k)]
+
+    def rank_scores(self, tokens: List[str],
+                    top_k: int) -> List[Tuple[int, float]]:
+        scores = self.score(tokens)
+        order = numpy.argsort(-scores, kind="stable")[:top_k]
+        return [(int(position), float(scores[position]))
+                for position in order if scores[position] > 0]
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        stem(token) for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def stem(token: str) -> str:
+    # Strips one inflection and keeps a fixed length prefix, so that e.g.
+    # "translation", "translated" and "translator" share a term.
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            token = token[:-len(suffix)]
+            break
+    return token[:STEM_LENGTH]
+
+
+def generate_catalog_signature(
+        intents: List[Intent]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((intent.slug, intent.description) for intent in intents)
+
+
+@lru_cache(maxsize=INTENT_INDEX_CACHE_SIZE)
+def build_intent_index(
+        catalog_signature: Tuple[Tuple[str, str], ...]) -> IntentIndex:
+    logger.debug(f"Building intent index for {len(catalog_signature)} "
+                 "intents.")
+    return IntentIndex([
+        tokenize(f"{slug.replace('_', ' ')} {description}")
+        for slug, description in catalog_signature
+    ])
+
+
+def generate_conversation_text(intent_request: IntentRequest) -> str:
+    return "\n".join(f"{message.subject or ''}\n{message.message}"
+                     for message in intent_request.messages)
+
+
+def rank_intents(intent_request: IntentRequest,
+                 top_k: int) -> List[Tuple[Intent, float]]:
+    # The best scoring intents with their BM25 scores, best first.
+    index: IntentIndex = build_intent_index(
+            generate_catalog_signature(intent_request.intents))
+    return [
+        (intent_request.intents[position], score)
+        for position, score in index.rank_scores(
+                tokenize(generate_conversation_text(intent_request)), top_k)
+    ]
+
+
+def shortlist_intents(intent_request: IntentRequest,
+                      top_k: int = INTENT_SHORTLIST_TOP_K) -> List[Intent]:
+    # The top k intents plus the fallback intent, in catalog order. The
+    # whole catalog is kept when it is already small enough or when nothing
+    # in the conversation matches it.
+    intents: List[Intent] = intent_request.intents
+    if len(intents) <= top_k + 1:
+        return intents
+
+    index: IntentIndex = build_intent_index(
+            generate_catalog_signature(intents))
+    ranked: List[int] = index.rank(
+            tokenize(generate_conversation_text(intent_request)), top_k)
+
+    if not ranked:
+        logger.info("No intent matches the conversation, keeping all "
+                    "intents.")
+        return intents
+
+    selected: set = set(ranked) | {
+        position for position, intent in enumerate(intents)
+        if intent.slug == INTENT_SHORTLIST_FALLBACK_SLUG
+    }
+    return [intents[position] for position in sorted(selected)]
+
+
+@timed("intent_shortlist")
+def shortlist_intent_request(intent_request: IntentRequest) -> IntentRequest:
+    intents: List[Intent] = shortlist_intents(intent_request,
+                                              INTENT_SHORTLIST_TOP_K)
+    set_property("intent_shortlist_size", len(intents))
+
+    if len(intents) == len(intent_request.intents):
+        return intent_request
+
+    logger.info(f"Shortlisted {len(intents)} of "
+                f"{len(intent_request.intents)} intents.")
+    return intent_request.model_copy(update={"intents": intents})
@@ -0,0 +1,134 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError  # type: ignore
+
+from src import logger
+from src.bedrock_wrapper import (prompt_llm, resolve_model_id,
+                                 setup_max_tokens_kwargs)
+from src.config import (INTENT_RULES_ENABLED, JOINT_PROMPT_MAX_PARAMETERS,
+                        MAX_TOKEN_OUTPUT_FOR_JOINT, TOKEN_BUDGET_ENABLED)
+from src.data_extraction_service import (complete_parameters,
+                                         generate_dynamic_model,
+                                         parse_json_response, validate_fields)
+from src.deadline import Deadline
+from src.intent_rules import match_intent_rule
+from src.metrics import increment, timed
+from src.models import ExtractRequest, IdentifiedIntent, Intent, \
+    IntentRequest
+from src.prompt_renderer import render_prompt
+from src.token_budget import fit_prompt
+
+
+def supports_joint_prompt(intent_request: IntentRequest) -> bool:
+    if any(intent.data_parameters is None
+           for intent in intent_request.intents):
+        return False
+
+    parameters: int = sum(len(intent.data_parameters)
+                          for intent in intent_request.intents)
+    return 0 < parameters <= JOINT_PROMPT_MAX_PARAMETERS
+
+
+def identify_intent_and_extract_data(
+        intent_request: IntentRequest, deadline: Optional[Deadline] = None
+        ) -> Optional[Tuple[str, Dict[str, Any]]]:
+    # Returns the intent and its parameters, or None when the caller should
+    # use the two-step flow: for intent rules, which need no model, and for
+    # answers that fail validation.
+    if INTENT_RULES_ENABLED and match_intent_rule(intent_request):
+        logger.info("An intent rule matched, skipping the joint prompt.")
+        return None
+
+    increment("joint_prompts")
+    model_id: str = resolve_model_id()
+    llm_response: str = prompt_llm(
+            generate_prompt(intent_request), operation_type="parsing",
+            deadline=deadline,
+            model_kwargs=setup_max_tokens_kwargs(
+                    model_id, MAX_TOKEN_OUTPUT_FOR_JOINT))
+    validated_answer: Optional[
+        Tuple[ExtractRequest, str, Dict[str, Any], Dict[str, Any]]
+    ] = validate_llm_response(llm_response, intent_request)
+
+    if validated_answer is None:
+        increment("joint_prompt_fallbacks")
+        return None
+
+    extract_request, slug, validated_parameters, rejected_values = (
+        validated_answer)
+    logger.info("Joint intent identification and parsing successful.")
+    return slug, complete_parameters(extract_request, validated_parameters,
+                                     rejected_values, deadline=deadline)
+
+
+@timed("prompt_render")
+def generate_prompt(intent_request: IntentRequest) -> str:
+    model_id: str = resolve_model_id()
+    intents: str = stringify_intents(intent_request.intents)
+
+    def render(request: IntentRequest) -> str:
+        return render_prompt(
+                model_id,
+                operation_type="joint",
+                intent_list=intents,
+                email_conversation=request.output_stringified_messages()
+        )
+
+    prompt: str = (
+        fit_prompt(intent_request, model_id, MAX_TOKEN_OUTPUT_FOR_JOINT,
+                   render)
+        if TOKEN_BUDGET_ENABLED else render(intent_request))
+
+    logger.info("Joint prompt generated for LLM processing.")
+    return prompt
+
+
+def stringify_intents(intents: List[Intent]) -> str:
+    lines: List[str] = []
+    for intent in intents:
+        lines.append(str(intent))
+        lines.extend(f"    - {parameter}"
+                     for parameter in intent.data_parameters or [])
+    return "\n".join(lines)
+
+
+@timed("validation")
+def validate_llm_response(
+        response: str, intent_request: IntentRequest
+        ) -> Optional[Tuple[ExtractRequest, str, Dict[str, Any],
+                            Dict[str, Any]]]:
+    # The answer is the parameters with the intent id as one more key.
+    # Returns the extraction request of the identified intent, its slug,
+    # the valid parameters and the rejected ones.
+    logger.debug(f"Validating joint LLM response: {response}")
+    try:
+        answer: Dict[str, Any] = parse_json_response(
+                response.replace("\n", ""))
+        identified_intent: IdentifiedIntent = IdentifiedIntent(
+                intent_id=answer.pop("intent_id", None))  # type: ignore
+
+    except (json.JSONDecodeError, ValidationError) as error:
+        logger.error(f"Failed to validate joint LLM response: {str(error)}")
+        return None
+
+    # Any other parsing failure is a failed answer too, so the two-step flow
+    # runs instead of the error reaching the intent response.
+    except Exception as error:
+        logger.error(f"Failed to parse joint LLM response: {str(error)}",
+                     exc_info=True)
+        return None
+
+    intent: Optional[Intent] = next(
+            (intent for intent in intent_request.intents
+             if intent.id == identified_intent.intent_id), None)
+    if intent is None:
+        logger.error(f"Failed to identify a valid intent: {response}")
+        return None
+
+    extract_request: ExtractRequest = ExtractRequest(
+            messages=intent_request.messages,
+            data_parameters=intent.data_parameters or [])
+    validated_parameters, rejected_values = validate_fields(
+            generate_dynamic_model(extract_request), answer)
+    return extract_request, intent.slug, validated_parameters, rejected_values
@@ -0,0 +1,255 @@
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+# The names of the repairs reported by recover_json_object.
+CODE_FENCE: str = "code_fence"
+TRAILING_COMMA: str = "trailing_comma"
+SINGLE_QUOTES: str = "single_quotes"
+UNQUOTED_KEY: str = "unquoted_key"
+PYTHON_LITERAL: str = "python_literal"
+INVALID_ESCAPE: str = "invalid_escape"
+CONTROL_CHARACTER: str = "control_character"
+
+LITERALS: Dict[str, Tuple[Any, bool]] = {
+    "true": (True, False),
+    "false": (False, False),
+    "null": (None, False),
+    "True": (True, True),
+    "False": (False, True),
+    "None": (None, True),
+}
+ESCAPES: Dict[str, str] = {
+    '"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f",
+    "n": "\n", "r": "\r", "t": "\t",
+}
+WHITESPACE_PATTERN: re.Pattern = re.compile(r"[ \t\n\r]*")
+# The characters that end a plain run inside a string, per quote.
+STRING_SPECIAL_PATTERNS: Dict[str, re.Pattern] = {
+    '"': re.compile(r'["\\\x00-\x1f]'),
+    "'": re.compile(r"['\\\x00-\x1f]"),
+}
+NUMBER_CHARACTERS: str = "+-0123456789.eE"
+
+
+class JsonRecoveryError(json.JSONDecodeError):
+    pass
+
+
+class JsonRecoveryParser:
+    # A single pass, recursive descent parser for the first JSON object in
+    # a model response, which accepts the mistakes models commonly make and
+    # records every repair it needed.
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+        self.position: int = 0
+        self.repairs: List[str] = []
+
+    def parse(self) -> Tuple[Dict[str, Any], List[str]]:
+        start: int = self.text.find("{")
+        if start == -1:
+            raise self.error("No JSON object found")
+
+        if "```" in self.text[:start]:
+            self.repair(CODE_FENCE)
+
+        self.position = start
+        return self.parse_object(), self.repairs
+
+    def parse_value(self) -> Any:
+        self.skip_whitespace()
+        character: str = self.peek()
+
+        if character == "{":
+            return self.parse_object()
+        elif character == "[":
+            return self.parse_array()
+        elif character and character in "\"'":
+            return self.parse_string()
+        elif character and character in "-0123456789":
+            return self.parse_number()
+        elif character.isalpha():
+            return self.parse_literal()
+
+        raise self.error("Expecting value")
+
+    def parse_object(self) -> Dict[str, Any]:
+        self.position += 1
+        result: Dict[str, Any] = {}
+
+        while True:
+            self.skip_whitespace()
+            character: str = self.peek()
+
+            if character == "}":
+                self.position += 1
+                return result
+            elif character and character in "\"'":
+                key: str = self.parse_string()
+            elif character.isalpha() or character == "_":
+                self.repair(UNQUOTED_KEY)
+                key = self.read_word()
+            else:
+                raise self.error("Expecting property name")
+
+            self.skip_whitespace()
+            self.expect(":")
+            result[key] = self.parse_value()
+
+            if self.parse_separator("}"):
+                return result
+
+    def parse_array(self) -> List[Any]:
+        self.position += 1
+        result: List[Any] = []
+
+        self.skip_whitespace()
+        if self.peek() == "]":
+            self.position += 1
+            return result
+
+        while True:
+            result.append(self.parse_value())
+
+            if self.parse_separator("]"):
+                return result
+
+    def parse_separator(self, closing: str) -> bool:
+        # Consumes the comma or the closing bracket after a member, and
+        # returns whether the container is closed.
+        self.skip_whitespace()
+        character: str = self.peek()
+
+        if character == closing:
+            self.position += 1
+            return True
+
+        self.expect(",")
+        self.skip_whitespace()
+        if self.peek() == closing:
+            self.repair(TRAILING_COMMA)
+            self.position += 1
+            return True
+        return False
+
+    def parse_string(self) -> str:
+        quote: str = self.text[self.position]
+        if quote == "'":
+            self.repair(SINGLE_QUOTES)
+
+        self.position += 1
+        special_pattern: re.Pattern = STRING_SPECIAL_PATTERNS[quote]
+        parts: List[str] = []
+        chunk_start: int = self.position
+
+        # Jumps from one quote, backslash or control character to the next,
+        # so plain runs are skipped by the regex engine.
+        while True:
+            match = special_pattern.search(self.text, self.position)
+            if match is None:
+                self.position = len(self.text)
+                raise self.error("Unterminated string")
+
+            self.position = match.start()
+            character: str = match.group()
+
+            if character == quote:
+                parts.append(self.text[chunk_start:self.position])
+                self.position += 1
+                return "".join(parts)
+
+            if character == "\\":
+                parts.append(self.text[chunk_start:self.position])
+                parts.append(self.parse_escape())
+                chunk_start = self.position
+                continue
+
+            self.repair(CONTROL_CHARACTER)
+            self.position += 1
+
+    def parse_escape(self) -> str:
+        escaped: str = self.text[self.position + 1:self.position + 2]
+
+        if escaped == "u":
+            code: str = self.text[self.position + 2:self.position + 6]
+            if len(code) == 4 and all(
+                    digit in "0123456789abcdefABCDEF" for digit in code):
+                self.position += 6
+                return chr(int(code, 16))
+
+        elif escaped in ESCAPES:
+            self.position += 2
+            return ESCAPES[escaped]
+
+        if not escaped:
+            raise self.error("Unterminated string")
+
+        # Unknown escapes keep the escaped character, as a lenient reader
+        # would interpret them.
+        self.repair(INVALID_ESCAPE)
+        self.position += 2
+        return escaped
+
+    def parse_number(self) -> Any:
+        start: int = self.position
+        while self.peek() and self.peek() in NUMBER_CHARACTERS:
+            self.position += 1
+
+        try:
+            return json.loads(self.text[start:self.position])
+        except ValueError:
+            self.position = start
+            raise self.error("Invalid number")
+
+    def parse_literal(self) -> Any:
+        start: int = self.position
+        word: str = self.read_word()
+
+        if word not in LITERALS:
+            self.position = start
+            raise self.error("Expecting value")
+
+        value, is_python_literal = LITERALS[word]
+        if is_python_literal:
+            self.repair(PYTHON_LITERAL)
+        return value
+
+    def read_word(self) -> str:
+        start: int = self.position
+        while self.peek().isalnum() or self.peek() == "_":
+            self.position += 1
+        return self.text[start:self.position]
+
+    def skip_whitespace(self) -> None:
+        self.position = WHITESPACE_PATTERN.match(self.text,
+                                                 self.position).end()
+
+    def expect(self, character: str) -> None:
+        if self.peek() != character:
+            raise self.error(f"Expecting '{character}' delimiter")
+        self.position += 1
+
+    def peek(self) -> str:
+        return self.text[self.position:self.position + 1]
+
+    def repair(self, repair: str) -> None:
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def error(self, message: str) -> JsonRecoveryError:
+        return JsonRecoveryError(message, self.text, self.position)
+
+
+def recover_json_object(text: str) -> Tuple[Dict[str, Any], List[str]]:
+    # Strict JSON takes the C decoder; everything else goes through the
+    # recovering parser, which raises JsonRecoveryError when it gives up.
+    stripped: str = text.strip()
+    if stripped.startswith("{"):
+        try:
+            result: Any = json.loads(stripped)
+            if isinstance(result, dict):
+                return result, []
+        except ValueError:
+            pass
+
+    return JsonRecoveryParser(text).parse()
@@ -1,33 +1,123 @@
 import json
-from typing import Any, Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from pydantic import ValidationError  # type: ignore
 
 from src import logger
+from src.bedrock_wrapper import get_pool_stats
+from src.config import (FUSED_PIPELINE_ENABLED, JOINT_PROMPT_ENABLED,
+                        SPECULATIVE_EXTRACTION_ENABLED, SQS_BATCH_MAX_WORKERS,
+                        THREAD_COMPACTION_ENABLED)
+from src.conversation_state import (hash_messages, load_conversation_state,
+                                    resume_request, save_conversation_state)
 from src.data_extraction_service import extract_data
+from src.deadline import Deadline, create_deadline
 from src.intent_identification_service import identify_intent
-from src.models import IntentRequest, ExtractRequest, SQSMessage
+from src.joint_extraction_service import (identify_intent_and_extract_data,
+                                          supports_joint_prompt)
+from src.llm_cache import LLMResponseCache, get_response_cache
+from src.metrics import (increment, record_invocation, set_dimension,
+                         set_property)
+from src.models import (ConversationState, Intent, IntentRequest,
+                        ExtractRequest, SQSMessage)
 from src.s3_wrapper import retrieve_s3_payload
 from src.smart_draft_api import send_intent_response, send_validation_response
+from src.speculative_extraction import (get_speculation_stats,
+                                        resolve_speculation,
+                                        start_speculative_extraction)
 
 
-def lambda_handler(event: Dict[str, Any], context: Any):
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     logger.info("Lambda function has been invoked.")
-    record: Dict[str, Any] = event["Records"][0]
+    records: List[Dict[str, Any]] = event["Records"]
+    failed_message_ids: List[Optional[str]] = process_batch(records, context)
+
+    if failed_message_ids:
+        logger.info(f"{len(failed_message_ids)} of {len(records)} records "
+                    "failed and will be redelivered.")
+
+    logger.info(f"Bedrock pool stats: {get_pool_stats()}")
+
+    response_cache: Optional[LLMResponseCache] = get_response_cache()
+    if response_cache:
+        logger.info(f"LLM cache stats: {response_cache.get_stats()}")
+
+    if FUSED_PIPELINE_ENABLED and SPECULATIVE_EXTRACTION_ENABLED:
+        logger.info(f"Speculation stats: {get_speculation_stats()}")
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id}
+            for message_id in failed_message_ids
+        ]
+    }
+
+
+def process_batch(
+        records: List[Dict[str, Any]], context: Any) -> List[Optional[str]]:
+    results: List[bool]
+
+    if len(records) == 1:
+        results = [run_record(records[0], context)]
+
+    else:
+        max_workers: int = max(1, min(SQS_BATCH_MAX_WORKERS, len(records)))
+        logger.info(f"Processing {len(records)} records with "
+                    f"{max_workers} workers.")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures: List[Future] = [
+                executor.submit(run_record, record, context)
+                for record in records
+            ]
+            results = [future.result() for future in futures]
+
+    return [
+        record.get("messageId")
+        for record, succeeded in zip(records, results) if not succeeded
+    ]
+
+
+def run_record(record: Dict[str, Any], context: Any) -> bool:
+    try:
+        process_record(record, context)
+        return True
+
+    except Exception as error:
+        logger.error(f"Failed to process record "
+                     f"{record.get('messageId')}: {str(error)}")
+        return False
+
+
+def process_record(record: Dict[str, Any], context: Any) -> None:
+    with record_invocation():
+        set_property("message_id", record.get("messageId"))
+        handle_record(record, context)
+
+
+def handle_record(record: Dict[str, Any], context: Any) -> None:
     sqs_payload: Dict[str, Any] = json.loads(record["body"])
     event_source_arn = record["eventSourceARN"]
     conversation_id: int = sqs_payload["conversation_id"]
+    set_property("conversation_id", conversation_id)
+    deadline: Optional[Deadline] = create_deadline(context)
+    error_deadline: Optional[Deadline] = (
+        deadline.without_reserve() if deadline else None)
 
     try:
-        s3_payload: Dict[str, Any] = retrieve_data(sqs_payload)
+        s3_payload: Dict[str, Any] = retrieve_data(sqs_payload, deadline)
 
         if "intent" in event_source_arn.lower():
             logger.info("Processing the intent.")
-            handle_intent_request(conversation_id, s3_payload)
+            set_dimension("operation_type", "intent")
+            handle_intent_request(conversation_id, s3_payload, deadline)
             logger.info("Successfully processed the intent.")
         elif "extraction" in event_source_arn.lower():
             logger.info("Processing the extraction request.")
-            handle_extraction_request(s3_payload, sqs_payload, conversation_id)
+            set_dimension("operation_type", "parsing")
+            handle_extraction_request(
+                    s3_payload, sqs_payload, conversation_id, deadline)
             logger.info("Successfully processed the extraction request.")
         else:
             logger.error(f"Unknown event source ARN: {event_source_arn}.")
@@ -36,34 +126,40 @@ def lambda_handler(event: Dict[str, Any], context: Any):
     except ValidationError as error:
         if "intent" in event_source_arn:
             logger.error(f"Failed to parse IntentRequest: {error}")
-            send_intent_response(conversation_id, str(error))
+            send_intent_response(conversation_id, str(error),
+                                 deadline=error_deadline)
         elif "extraction" in event_source_arn:
             logger.error(f"Failed to parse ExtractRequest: {error}")
             validation_error: dict = {"error": str(error)}
             send_validation_response(
-                    sqs_payload["intent"], validation_error, conversation_id)
+                    sqs_payload["intent"], validation_error, conversation_id,
+                    deadline=error_deadline)
 
     except Exception as error:
         logger.error(f"Lambda handler encountered an error: {str(error)}")
 
         if "intent" in event_source_arn:
-            send_intent_response(conversation_id, str(error))
+            send_intent_response(conversation_id, str(error),
+                                 deadline=error_deadline)
 
         elif "extraction" in event_source_arn:
             error_message: dict = {"error": str(error)}
             send_validation_response(
-                    sqs_payload["intent"], error_message, conversation_id)
+                    sqs_payload["intent"], error_message, conversation_id,
+                    deadline=error_deadline)
 
         else:
             logger.error(f"Failed to handle request : {conversation_id}")
 
 
-def retrieve_data(sqs_payload: Dict[str, Any]) -> Dict[str, Any]:
+def retrieve_data(sqs_payload: Dict[str, Any],
+                  deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     try:
         sqs_message: SQSMessage = SQSMessage(**sqs_payload)
         s3_payload_path: str = sqs_message.payload_path
 
-        s3_payload: dict[str, Any] = retrieve_s3_payload(s3_payload_path)
+        s3_payload: dict[str, Any] = retrieve_s3_payload(
+                s3_payload_path, deadline=deadline)
         logger.debug("Successfully retrieved S3 payload: "
                      f"{json.dumps(s3_payload)}")
 
@@ -74,19 +170,235 @@ def retrieve_data(sqs_payload: Dict[str, Any]) -> Dict[str, Any]:
         raise error
 
 
-def handle_intent_request(conversation_id: int, s3_payload: Dict[str, Any]):
+def handle_intent_request(conversation_id: int, s3_payload: Dict[str, Any],
+                          deadline: Optional[Deadline] = None):
     intent_request: IntentRequest = IntentRequest(**s3_payload)
-    detected_intent: str = identify_intent(intent_request)
+    if (JOINT_PROMPT_ENABLED and supports_joint_prompt(intent_request)
+            and handle_joint_request(conversation_id, intent_request,
+                                     deadline)):
+        return
+
+    speculation: Dict[str, Future] = {}
+    if FUSED_PIPELINE_ENABLED and SPECULATIVE_EXTRACTION_ENABLED:
+        speculation = start_speculative_extraction(
+                intent_request,
+                lambda intent: extract_parameters(
+                        conversation_id,
+                        ExtractRequest(messages=intent_request.messages,
+                                       data_parameters=intent.data_parameters),
+                        intent.slug, deadline, persist=False),
+                deadline)
+
+    detected_intent: str = detect_intent(conversation_id, intent_request,
+                                         deadline)
+
+    logger.info(f"Detected intent: {detected_intent}")
+    send_intent_response(conversation_id, detected_intent, deadline=deadline)
+
+    if FUSED_PIPELINE_ENABLED:
+        handle_fused_extraction(conversation_id, intent_request,
+                                detected_intent, deadline, speculation)
+
+
+def handle_joint_request(conversation_id: int, intent_request: IntentRequest,
+                         deadline: Optional[Deadline] = None) -> bool:
+    # Returns False when the two-step flow has to run instead, which also
+    # reuses the state when there are no new messages.
+    message_hashes: List[str] = hash_messages(intent_request.messages)
+    state: Optional[ConversationState] = load_conversation_state(
+            conversation_id, "intent")
+    if state and message_hashes and state.message_hash == message_hashes[-1]:
+        return False
+
+    if THREAD_COMPACTION_ENABLED:
+        intent_request = intent_request.compact()
+
+    joint_result: Optional[Tuple[str, Dict[str, Any]]] = (
+        identify_intent_and_extract_data(intent_request, deadline))
+    if joint_result is None:
+        logger.info("Falling back to separate intent and parsing prompts.")
+        return False
+
+    detected_intent, detected_parameters = joint_result
+    if message_hashes:
+        save_conversation_state(ConversationState(
+                conversation_id=conversation_id, operation_type="intent",
+                message_hash=message_hashes[-1], intent=detected_intent))
 
     logger.info(f"Detected intent: {detected_intent}")
-    send_intent_response(conversation_id, detected_intent)
+    send_intent_response(conversation_id, detected_intent, deadline=deadline)
+
+    intent: Optional[Intent] = next(
+            (intent for intent in intent_request.intents
+             if intent.slug == detected_intent), None)
+    if intent is None or not intent.data_parameters:
+        logger.info("No parameters in the payload for the detected intent.")
+        return True
+
+    # Failures are reported as an extraction error, since the intent has
+    # already been sent.
+    try:
+        save_parameters(conversation_id, message_hashes, detected_intent,
+                        detected_parameters)
+        logger.info(f"Detected parameters: {json.dumps(detected_parameters)}")
+        send_validation_response(detected_intent, detected_parameters,
+                                 conversation_id, deadline=deadline)
+
+    except Exception as error:
+        logger.error(f"Joint extraction encountered an error: {str(error)}")
+        send_validation_response(
+                detected_intent, {"error": str(error)}, conversation_id,
+                deadline=deadline.without_reserve() if deadline else None)
+    return True
+
+
+def detect_intent(conversation_id: int, intent_request: IntentRequest,
+                  deadline: Optional[Deadline] = None) -> str:
+    message_hashes: List[str] = hash_messages(intent_request.messages)
+    state: Optional[ConversationState] = load_conversation_state(
+            conversation_id, "intent")
+
+    if state and message_hashes and state.message_hash == message_hashes[-1]:
+        logger.info("No new messages since the intent was detected.")
+        increment("conversation_state_reuses")
+        return state.intent
+
+    if THREAD_COMPACTION_ENABLED:
+        intent_request = intent_request.compact()
+    intent_request = resume_request(intent_request, message_hashes, state)
+    detected_intent: str = identify_intent(intent_request, deadline=deadline)
+
+    if message_hashes and detected_intent != "invalid_intent":
+        save_conversation_state(ConversationState(
+                conversation_id=conversation_id, operation_type="intent",
+                message_hash=message_hashes[-1], intent=detected_intent))
+    return detected_intent
+
+
+def handle_fused_extraction(conversation_id: int,
+                            intent_request: IntentRequest,
+                            detected_intent: str,
+                            deadline: Optional[Deadline] = None,
+                            speculation: Optional[Dict[str, Future]] = None
+                            ) -> None:
+    # Extracts the detected intent's parameters from the messages already
+    # parsed when the payload carries them, instead of waiting for the
+    # extraction queue to fetch the payload again. Failures are reported
+    # as an extraction error, since the intent has already been sent.
+    speculated_parameters: Optional[Dict[str, Any]] = (
+        resolve_speculation(speculation, detected_intent)
+        if speculation else None)
+    intent: Optional[Intent] = next(
+            (intent for intent in intent_request.intents
+             if intent.slug == detected_intent), None)
+    if intent is None or not intent.data_parameters:
+        logger.info("No parameters in the payload for the detected intent.")
+        return
+
+    logger.info("Processing the extraction request in the same invocation.")
+    increment("fused_extractions")
+    extraction_request: ExtractRequest = ExtractRequest(
+            messages=intent_request.messages,
+            data_parameters=intent.data_parameters)
+    try:
+        if speculated_parameters is None:
+            handle_parsed_extraction_request(
+                    extraction_request, detected_intent, conversation_id,
+                    deadline)
+            return
+
+        logger.info("Using the speculative extraction.")
+        save_parameters(conversation_id,
+                        hash_messages(intent_request.messages),
+                        detected_intent, speculated_parameters)
+        logger.info("Detected parameters: "
+                    f"{json.dumps(speculated_parameters)}")
+        send_validation_response(detected_intent, speculated_parameters,
+                                 conversation_id, deadline=deadline)
+
+    except Exception as error:
+        logger.error(f"Fused extraction encountered an error: {str(error)}")
+        send_validation_response(
+                detected_intent, {"error": str(error)}, conversation_id,
+                deadline=deadline.without_reserve() if deadline else None)
 
 
 def handle_extraction_request(
-        s3_payload: dict, sqs_payload: Dict[str, Any], conversation_id: int):
+        s3_payload: dict, sqs_payload: Dict[str, Any], conversation_id: int,
+        deadline: Optional[Deadline] = None):
     extraction_request: ExtractRequest = ExtractRequest(**s3_payload)
-    detected_parameters: Dict[str, Any] = extract_data(extraction_request)
-    intent: str = sqs_payload["intent"]
+    handle_parsed_extraction_request(extraction_request,
+                                     sqs_payload["intent"], conversation_id,
+                                     deadline)
+
+
+def handle_parsed_extraction_request(
+        extraction_request: ExtractRequest, intent: str,
+        conversation_id: int, deadline: Optional[Deadline] = None) -> None:
+    detected_parameters: Dict[str, Any] = extract_parameters(
+            conversation_id, extraction_request, intent, deadline)
 
     logger.info(f"Detected parameters: {json.dumps(detected_parameters)}")
-    send_validation_response(intent, detected_parameters, conversation_id)
+    send_validation_response(intent, detected_parameters, conversation_id,
+                             deadline=deadline)
+
+
+def extract_parameters(conversation_id: int,
+                       extraction_request: ExtractRequest, intent: str,
+                       deadline: Optional[Deadline] = None,
+                       persist: bool = True) -> Dict[str, Any]:
+    # Speculative extractions do not persist their state, since only the
+    # one for the detected intent is kept.
+    message_hashes: List[str] = hash_messages(extraction_request.messages)
+    state: Optional[ConversationState] = load_conversation_state(
+            conversation_id, "parsing")
+
+    # Values extracted for another intent do not carry over.
+    if state and state.intent != intent:
+        state = None
+
+    if state and message_hashes and state.message_hash == message_hashes[-1]:
+        logger.info("No new messages since the parameters were extracted.")
+        increment("conversation_state_reuses")
+        return state.parameters
+
+    if THREAD_COMPACTION_ENABLED:
+        extraction_request = extraction_request.compact()
+    extraction_request = resume_request(extraction_request, message_hashes,
+                                        state)
+    detected_parameters: Dict[str, Any] = extract_data(extraction_request,
+                                                       deadline=deadline)
+
+    if message_hashes and "error" not in detected_parameters:
+        detected_parameters = merge_parameters(
+                extraction_request, state, detected_parameters)
+        if persist:
+            save_parameters(conversation_id, message_hashes, intent,
+                            detected_parameters)
+    return detected_parameters
+
+
+def save_parameters(conversation_id: int, message_hashes: List[str],
+                    intent: str, detected_parameters: Dict[str, Any]) -> None:
+    if message_hashes and "error" not in detected_parameters:
+        save_conversation_state(ConversationState(
+                conversation_id=conversation_id, operation_type="parsing",
+                message_hash=message_hashes[-1], intent=intent,
+                parameters=detected_parameters))
+
+
+def merge_parameters(extraction_request: ExtractRequest,
+                     state: Optional[ConversationState],
+                     detected_parameters: Dict[str, Any]) -> Dict[str, Any]:
+    # Values from earlier messages stay unless the new messages gave one.
+    if state is None:
+        return detected_parameters
+
+    keys: Set[str] = {
+        parameter.key for parameter in extraction_request.data_parameters
+    }
+    return {
+        **{key: value for key, value in state.parameters.items()
+           if key in keys},
+        **detected_parameters,
+    }
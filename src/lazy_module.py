@@ -0,0 +1,31 @@
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    # Stands in for a heavy dependency and imports it on first attribute
+    # access, keeping it off the cold start import path of the handler.
+    def __init__(self, name: str) -> None:
+        self._name: str = name
+        self._module: Optional[ModuleType] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.load(), attribute)
+
+    def __repr__(self) -> str:
+        state: str = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
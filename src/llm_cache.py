@@ -0,0 +1,220 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src import logger
+from src.config import (LLM_CACHE_BACKEND, LLM_CACHE_MAX_ENTRIES,
+                        LLM_CACHE_SQLITE_PATH, LLM_CACHE_TTL_SECONDS)
+
+
+class CacheBackend(ABC):
+    # The interface for LLM response stores. A shared store, e.g. Redis or
+    # DynamoDB, implements it to share responses between containers.
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries: int = max_entries
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry: Optional[Tuple[float, str]] = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    def __init__(self, path: str = LLM_CACHE_SQLITE_PATH,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES) -> None:
+        self.path: str = path
+        self.max_entries: int = max_entries
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None)
+
+        with self._lock:
+            self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+            self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS llm_responses_last_access "
+                    "ON llm_responses (last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        now: float = time.time()
+
+        with self._lock:
+            row: Optional[Tuple[str, float]] = self._connection.execute(
+                    "SELECT value, expires_at FROM llm_responses "
+                    "WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            if row[1] <= now:
+                self._connection.execute(
+                        "DELETE FROM llm_responses WHERE key = ?", (key,))
+                return None
+
+            self._connection.execute(
+                    "UPDATE llm_responses SET last_access = ? WHERE key = ?",
+                    (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        now: float = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses "
+                    "(key, value, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value, now + ttl_seconds, now))
+            self._connection.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "SELECT key FROM llm_responses "
+                    "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_responses")
+
+
+class LocalSharedStore(CacheBackend):
+    # Local stand-in for a shared store. Instances with the same namespace
+    # see the same entries, like separate containers using one shared
+    # store; expiry is left to the store, as in Redis.
+    _namespaces: Dict[str, Dict[str, Tuple[float, str]]] = {}
+    _namespaces_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, namespace: str = "default") -> None:
+        with self._namespaces_lock:
+            self._entries: Dict[str, Tuple[float, str]] = (
+                self._namespaces.setdefault(namespace, {}))
+
+    def get(self, key: str) -> Optional[str]:
+        with self._namespaces_lock:
+            entry: Optional[Tuple[float, str]] = self._entries.get(key)
+
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(key, None)
+                return None
+
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        with self._namespaces_lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+
+    def clear(self) -> None:
+        with self._namespaces_lock:
+            self._entries.clear()
+
+
+class LLMResponseCache:
+    def __init__(self, backend: CacheBackend,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS) -> None:
+        self.backend: CacheBackend = backend
+        self.ttl_seconds: float = ttl_seconds
+        self._lock: threading.Lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def get(self, key: str, operation_type: str) -> Optional[str]:
+        try:
+            response: Optional[str] = self.backend.get(key)
+        except Exception as error:
+            logger.warning(f"Failed to read the LLM cache: {str(error)}")
+            response = None
+
+        self._record(operation_type, "hits" if response is not None
+                     else "misses")
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        try:
+            self.backend.set(key, response, self.ttl_seconds)
+        except Exception as error:
+            logger.warning(f"Failed to write the LLM cache: {str(error)}")
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {operation_type: dict(stats)
+                    for operation_type, stats in self._stats.items()}
+
+    def _record(self, operation_type: str, outcome: str) -> None:
+        with self._lock:
+            stats: Dict[str, int] = self._stats.setdefault(
+                    operation_type, {"hits": 0, "misses": 0})
+            stats[outcome] += 1
+
+
+_cache_lock: threading.Lock = threading.Lock()
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def generate_cache_key(model_id: str, model_kwargs: dict, prompt: str) -> str:
+    serialized_request: str = json.dumps(
+            [model_id, model_kwargs, prompt], sort_keys=True)
+    return hashlib.sha256(serialized_request.encode("utf-8")).hexdigest()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    global _response_cache
+
+    if LLM_CACHE_BACKEND == "none":
+        return None
+
+    with _cache_lock:
+        if _response_cache is None:
+            _response_cache = LLMResponseCache(
+                    setup_cache_backend(LLM_CACHE_BACKEND))
+        return _response_cache
+
+
+def setup_cache_backend(backend_name: str) -> CacheBackend:
+    if backend_name == "memory":
+        return InMemoryCacheBackend()
+    elif backend_name == "sqlite":
+        return SQLiteCacheBackend()
+
+    raise ValueError("Invalid LLM cache backend.")
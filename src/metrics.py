@@ -0,0 +1,156 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import Context, ContextVar, copy_context
+from functools import wraps
+from typing import (Any, Callable, ContextManager, Dict, Iterator, Optional,
+                    TypeVar)
+
+from src.config import METRICS_ENABLED, METRICS_NAMESPACE
+
+T = TypeVar("T")
+
+# The dimensions of every metrics record, with their default values.
+DIMENSIONS: Dict[str, str] = {
+    "operation_type": "unknown",
+    "model_id": "none",
+    "retry_used": "false",
+    "cache_hit": "false",
+}
+
+_NULL_SPAN: ContextManager = nullcontext()
+_current_metrics: ContextVar[Optional["InvocationMetrics"]] = ContextVar(
+        "current_metrics", default=None)
+
+
+class InvocationMetrics:
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self.dimensions: Dict[str, str] = dict(DIMENSIONS)
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self.properties: Dict[str, Any] = {}
+
+    def add_timing(self, name: str, milliseconds: float) -> None:
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + milliseconds
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def set_dimension(self, name: str, value: Any) -> None:
+        if name not in DIMENSIONS:
+            raise ValueError(f"Invalid metrics dimension: {name}.")
+
+        with self._lock:
+            self.dimensions[name] = str(value).lower() if isinstance(
+                    value, bool) else str(value)
+
+    def set_property(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.properties[name] = value
+
+    def to_emf(self) -> Dict[str, Any]:
+        with self._lock:
+            metric_definitions: list = (
+                [{"Name": name, "Unit": "Milliseconds"}
+                 for name in self.timings] +
+                [{"Name": name, "Unit": "Count"} for name in self.counts])
+
+            return {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [list(DIMENSIONS)],
+                        "Metrics": metric_definitions,
+                    }],
+                },
+                **self.properties,
+                **self.dimensions,
+                **{name: round(value, 3)
+                   for name, value in self.timings.items()},
+                **self.counts,
+            }
+
+
+class Span:
+    def __init__(self, metrics: InvocationMetrics, name: str) -> None:
+        self.metrics: InvocationMetrics = metrics
+        self.name: str = name
+        self.started_at: float = 0.0
+
+    def __enter__(self) -> "Span":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.metrics.add_timing(
+                self.name, (time.perf_counter() - self.started_at) * 1000)
+
+
+@contextmanager
+def record_invocation() -> Iterator[Optional[InvocationMetrics]]:
+    if not METRICS_ENABLED:
+        yield None
+        return
+
+    metrics: InvocationMetrics = InvocationMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        with Span(metrics, "total"):
+            yield metrics
+    finally:
+        _current_metrics.reset(token)
+        emit(metrics)
+
+
+def span(name: str) -> ContextManager:
+    metrics: Optional[InvocationMetrics] = _current_metrics.get()
+    return _NULL_SPAN if metrics is None else Span(metrics, name)
+
+
+def set_dimension(name: str, value: Any) -> None:
+    metrics: Optional[InvocationMetrics] = _current_metrics.get()
+    if metrics is not None:
+        metrics.set_dimension(name, value)
+
+
+def set_property(name: str, value: Any) -> None:
+    metrics: Optional[InvocationMetrics] = _current_metrics.get()
+    if metrics is not None:
+        metrics.set_property(name, value)
+
+
+def increment(name: str, value: float = 1) -> None:
+    metrics: Optional[InvocationMetrics] = _current_metrics.get()
+    if metrics is not None:
+        metrics.increment(name, value)
+
+
+def bind_context(function: Callable[..., T]) -> Callable[..., T]:
+    # Carries the current metrics into work submitted to another thread; a
+    # fresh copy per call, since a context cannot be entered twice at once.
+    if _current_metrics.get() is None:
+        return function
+
+    context: Context = copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def emit(metrics: InvocationMetrics) -> None:
+    sys.stdout.write(json.dumps(metrics.to_emf()) + "\n")
+    sys.stdout.flush()
+
+
+def timed(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(function: Callable[..., T]) -> Callable[..., T]:
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
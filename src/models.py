@@ -1,7 +1,11 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field  # type: ignore
 
+from src import logger
+from src.metrics import set_property
+from src.thread_compaction import compact_bodies
+
 
 class SQSMessage(BaseModel):
     conversation_id: int = Field(
@@ -30,6 +34,20 @@ class Message(BaseModel):
                f"Message: {self.message}\n"
 
 
+class DataParameter(BaseModel):
+    key: str = Field(
+            ..., description='The key of the intent parameter.')
+    data_type: str = Field(
+            ..., description='The data type of the intent parameter.')
+    description: str = Field(
+            ..., description='The description of the intent parameter.')
+
+    def __str__(self):
+        return (
+            f"{self.key} [{self.data_type}]: {self.description}"
+        )
+
+
 class Intent(BaseModel):
     id: int = Field(
             ..., description='The identifier of the intent.')
@@ -37,6 +55,8 @@ class Intent(BaseModel):
             ..., description='An intent that the sender might have.')
     description: str = Field(
             ..., description='The description of the intent.')
+    data_parameters: Optional[List[DataParameter]] = Field(
+            None, description='The parameters to extract for the intent.')
 
     def __str__(self):
         return f"{self.id} = {self.slug}: {self.description}"
@@ -47,42 +67,113 @@ class IntentRequest(BaseModel):
             ..., description='A list of messages to analyze.')
     intents: list[Intent] = Field(
             ..., description='List of intents to utilise for analysis.')
+    summary: Optional[str] = Field(
+            None, description='A summary of the messages already processed.')
 
     def output_stringified_messages(self):
-        return "\n".join([str(message) for message in self.messages])
+        return stringify_messages(self.messages, self.summary)
 
     def output_stringified_intents(self):
         return "\n".join([str(intent) for intent in self.intents])
 
+    def compact(self):
+        return self.model_copy(
+                update={"messages": compact_messages(self.messages)})
+
 
 class IdentifiedIntent(BaseModel):
     intent_id: int = Field(
             ..., description='The id of the identified intent.')
 
 
-class DataParameter(BaseModel):
-    key: str = Field(
-            ..., description='The key of the intent parameter.')
-    data_type: str = Field(
-            ..., description='The data type of the intent parameter.')
-    description: str = Field(
-            ..., description='The description of the intent parameter.')
-
-    def __str__(self):
-        return (
-            f"{self.key} [{self.data_type}]: {self.description}"
-        )
-
-
 class ExtractRequest(BaseModel):
     messages: List[Message] = Field(
             ..., description='A list of messages to analyze.')
     data_parameters: List[DataParameter] = Field(
             ...,
             description='List of parameters to extract.')
+    summary: Optional[str] = Field(
+            None, description='A summary of the messages already processed.')
 
     def output_stringified_messages(self):
-        return "\n".join(map(str, self.messages))
+        return stringify_messages(self.messages, self.summary)
 
     def output_stringified_data_parameters(self):
         return "\n".join(map(str, self.data_parameters))
+
+    def compact(self):
+        return self.model_copy(
+                update={"messages": compact_messages(
+                        self.messages, strip_signatures=False)})
+
+
+def stringify_messages(messages: List[Message],
+                       summary: Optional[str] = None) -> str:
+    conversation: str = "\n".join(map(str, messages))
+    return f"{summary}\n\n{conversation}" if summary else conversation
+
+
+def compact_messages(messages: List[Message],
+                     strip_signatures: bool = True) -> List[Message]:
+    # Removes what the prompt does not need from an email thread and
+    # reports how many characters of the rendered messages that saved.
+    compacted: List[Message] = [
+        message.model_copy(update={"message": body})
+        for message, body in zip(
+                messages, compact_bodies(
+                        (message.message for message in messages),
+                        strip_signatures))
+    ]
+
+    input_characters: int = sum(len(str(message)) for message in messages)
+    saved_characters: int = input_characters - sum(
+            len(str(message)) for message in compacted)
+    logger.info(f"Thread compaction saved {saved_characters} of "
+                f"{input_characters} characters.")
+    set_property("compaction_input_characters", input_characters)
+    set_property("compaction_saved_characters", saved_characters)
+    return compacted
+
+
+class RuleCondition(BaseModel):
+    patterns: List[str] = Field(
+            [], description='Regular expressions, matched case-insensitively.')
+    keywords: List[str] = Field(
+            [], description='Words or phrases, matched as whole words.')
+
+
+class IntentRule(BaseModel):
+    name: str = Field(
+            ..., description='The name recorded when the rule fires.')
+    intent: str = Field(
+            ..., description='The slug of the intent the rule answers.')
+    confidence: float = Field(
+            1.0, description='How reliable the rule is, from 0.0 to 1.0.')
+    subject: Optional[RuleCondition] = Field(
+            None, description='The condition on the subject line.')
+    message: Optional[RuleCondition] = Field(
+            None, description='The condition on the message body.')
+    sender: Optional[RuleCondition] = Field(
+            None, description='The condition on the sender address.')
+    roles: List[str] = Field(
+            [], description='The sender roles the rule applies to, or all.')
+
+
+class IntentRuleSet(BaseModel):
+    version: str = Field(
+            ..., description='The version of the rules file.')
+    rules: List[IntentRule] = Field(
+            ..., description='The rules, in order of precedence.')
+
+
+class ConversationState(BaseModel):
+    conversation_id: int = Field(
+            ..., description='The identifier of the conversation.')
+    operation_type: str = Field(
+            ..., description='The stage that processed the conversation.')
+    message_hash: str = Field(
+            ..., description='The hash of the last message processed.')
+    intent: str = Field(
+            ..., description='The detected intent, or the one extracted for.')
+    parameters: Dict[str, Any] = Field(
+            {}, description='The extracted parameter values.')
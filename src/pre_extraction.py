@@ -0,0 +1,368 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from src import logger
+from src.metrics import set_property, timed
+from src.models import DataParameter, ExtractRequest
+from src.prompt_renderer import get_current_datetime
+from src.thread_compaction import strip_signature
+
+STRING_TYPES: FrozenSet[str] = frozenset(("str", "string"))
+INTEGER_TYPES: FrozenSet[str] = frozenset(("int", "integer"))
+
+MONTHS: Dict[str, int] = {
+    "january": 1, "januari": 1, "jan": 1,
+    "february": 2, "februari": 2, "feb": 2,
+    "march": 3, "mars": 3, "mar": 3,
+    "april": 4, "apr": 4,
+    "may": 5, "maj": 5,
+    "june": 6, "juni": 6, "jun": 6,
+    "july": 7, "juli": 7, "jul": 7,
+    "august": 8, "augusti": 8, "aug": 8,
+    "september": 9, "sept": 9, "sep": 9,
+    "october": 10, "oktober": 10, "oct": 10, "okt": 10,
+    "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+}
+WEEKDAYS: Dict[str, int] = {
+    "monday": 0, "måndag": 0, "tuesday": 1, "tisdag": 1,
+    "wednesday": 2, "onsdag": 2, "thursday": 3, "torsdag": 3,
+    "friday": 4, "fredag": 4, "saturday": 5, "lördag": 5,
+    "sunday": 6, "söndag": 6,
+}
+# ISO 639-2 codes, the terminology code where it differs from the
+# bibliographic one. Dari, Kurmanji, Sorani, Mandarin and Cantonese only
+# have ISO 639-3 codes, which the parameter descriptions already use.
+LANGUAGES: Dict[str, str] = {
+    "albanian": "sqi", "albanska": "sqi",
+    "amharic": "amh", "amhariska": "amh",
+    "arabic": "ara", "arabiska": "ara",
+    "armenian": "hye", "armeniska": "hye",
+    "bengali": "ben",
+    "bosnian": "bos", "bosniska": "bos",
+    "bulgarian": "bul", "bulgariska": "bul",
+    "cantonese": "yue", "kantonesiska": "yue",
+    "chinese": "zho", "kinesiska": "zho",
+    "croatian": "hrv", "kroatiska": "hrv",
+    "czech": "ces", "tjeckiska": "ces",
+    "danish": "dan", "danska": "dan",
+    "dari": "prs",
+    "english": "eng", "engelska": "eng",
+    "estonian": "est", "estniska": "est",
+    "finnish": "fin", "finska": "fin",
+    "french": "fra", "franska": "fra",
+    "georgian": "kat", "georgiska": "kat",
+    "german": "deu", "tyska": "deu",
+    "greek": "ell", "grekiska": "ell",
+    "hindi": "hin",
+    "hungarian": "hun", "ungerska": "hun",
+    "italian": "ita", "italienska": "ita",
+    "japanese": "jpn", "japanska": "jpn",
+    "korean": "kor", "koreanska": "kor",
+    "kurdish": "kur", "kurdiska": "kur",
+    "kurmanji": "kmr",
+    "latvian": "lav", "lettiska": "lav",
+    "lithuanian": "lit", "litauiska": "lit",
+    "mandarin": "cmn",
+    "mongolian": "mon", "mongoliska": "mon",
+    "norwegian": "nor", "norska": "nor",
+    "oromo": "orm",
+    "pashto": "pus", "pashtu": "pus",
+    "persian": "fas", "persiska": "fas", "farsi": "fas",
+    "polish": "pol", "polska": "pol",
+    "portuguese": "por", "portugisiska": "por",
+    "punjabi": "pan",
+    "romanian": "ron", "rumänska": "ron",
+    "russian": "rus", "ryska": "rus",
+    "serbian": "srp", "serbiska": "srp",
+    "somali": "som", "somaliska": "som",
+    "sorani": "ckb",
+    "spanish": "spa", "spanska": "spa",
+    "swahili": "swa",
+    "swedish": "swe", "svenska": "swe",
+    "tamil": "tam",
+    "thai": "tha", "thailändska": "tha",
+    "tigrinya": "tir", "tigrinja": "tir",
+    "turkish": "tur", "turkiska": "tur",
+    "ukrainian": "ukr", "ukrainska": "ukr",
+    "urdu": "urd",
+    "uzbek": "uzb", "uzbekiska": "uzb",
+    "vietnamese": "vie", "vietnamesiska": "vie",
+}
+# Translations are between Swedish and the language to extract.
+EXCLUDED_LANGUAGE_CODES: FrozenSet[str] = frozenset(("swe",))
+
+
+def join_names(names: Dict[str, Any]) -> str:
+    # Longest first, so e.g. "sept" is preferred over "sep".
+    return "|".join(sorted(names, key=len, reverse=True))
+
+
+MONTH_NAMES: str = join_names(MONTHS)
+# "May" before a number is as likely to be the verb, e.g. "may 2 people".
+LEADING_MONTH_NAMES: str = join_names(
+        {name: month for name, month in MONTHS.items() if name != "may"})
+WEEKDAY_NAMES: str = join_names(WEEKDAYS)
+
+EMAIL_PATTERN: re.Pattern = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_PATTERN: re.Pattern = re.compile(
+        r"(?<![\w+])(?:\+\d|0)[\d \t()-]{6,18}\d(?!\w)")
+LANGUAGE_PATTERN: re.Pattern = re.compile(
+        rf"\b(?:{join_names(LANGUAGES)})\b", re.IGNORECASE)
+
+
+def resolve_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def resolve_upcoming_date(month: int, day: int, today: date) -> Optional[date]:
+    # A date without a year is the next one on or after today.
+    upcoming: Optional[date] = resolve_date(today.year, month, day)
+    if upcoming is not None and upcoming < today:
+        return resolve_date(today.year + 1, month, day)
+    return upcoming
+
+
+def resolve_weekday(weekday: str, today: date) -> date:
+    # A weekday is the next one after today.
+    days_ahead: int = (WEEKDAYS[weekday.lower()] - today.weekday() - 1) % 7
+    return today + timedelta(days=days_ahead + 1)
+
+
+# The date formats, most specific first. Each match is blanked out before
+# the next format is tried, so "3 juni 2024" is not read again as "3 juni".
+DATE_FORMATS: Tuple[Tuple[re.Pattern, Callable[[Any, date],
+                                               Optional[date]]], ...] = (
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"),
+     lambda match, today: resolve_date(
+             int(match[1]), int(match[2]), int(match[3]))),
+    (re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b"),
+     lambda match, today: resolve_date(
+             int(match[3]), int(match[2]), int(match[1]))),
+    (re.compile(r"\bden[ \t]+(\d{1,2})/(\d{1,2})\b", re.IGNORECASE),
+     lambda match, today: resolve_upcoming_date(
+             int(match[2]), int(match[1]), today)),
+    (re.compile(rf"\b(\d{{1,2}})(?::?e|:?a|st|nd|rd|th)?[ \t]+(?:of[ \t]+)?"
+                rf"({MONTH_NAMES})\.?(?:[ \t]+(\d{{4}}))?\b", re.IGNORECASE),
+     lambda match, today: resolve_date(
+             int(match[3]), MONTHS[match[2].lower()], int(match[1]))
+     if match[3] else resolve_upcoming_date(
+             MONTHS[match[2].lower()], int(match[1]), today)),
+    (re.compile(rf"\b({LEADING_MONTH_NAMES})\.?[ \t]+(\d{{1,2}})"
+                rf"(?:st|nd|rd|th)?(?:,?[ \t]+(\d{{4}}))?\b", re.IGNORECASE),
+     lambda match, today: resolve_date(
+             int(match[3]), MONTHS[match[1].lower()], int(match[2]))
+     if match[3] else resolve_upcoming_date(
+             MONTHS[match[1].lower()], int(match[2]), today)),
+    (re.compile(r"\b(?:(?:the[ \t]+)?day[ \t]+after[ \t]+tomorrow"
+                r"|(?:i[ \t]*)?övermorgon)\b", re.IGNORECASE),
+     lambda match, today: today + timedelta(days=2)),
+    (re.compile(r"\b(?:tomorrow|i[ \t]*morgon)\b", re.IGNORECASE),
+     lambda match, today: today + timedelta(days=1)),
+    (re.compile(r"\b(?:today|i[ \t]*dag)\b", re.IGNORECASE),
+     lambda match, today: today),
+    (re.compile(r"\b(?:in|om)[ \t]+(\d{1,2})[ \t]+(?:days|dagar)\b",
+                re.IGNORECASE),
+     lambda match, today: today + timedelta(days=int(match[1]))),
+    (re.compile(rf"\b({WEEKDAY_NAMES})(?:en)?\b", re.IGNORECASE),
+     lambda match, today: resolve_weekday(match[1], today)),
+)
+
+TIME_FORMATS: Tuple[Tuple[re.Pattern, Callable[[Any], Tuple[int, int]]],
+                    ...] = (
+    (re.compile(r"\b(?:kl\.?|klockan)[ \t]*(\d{1,2})(?:[:.](\d{2}))?\b",
+                re.IGNORECASE),
+     lambda match: (int(match[1]), int(match[2] or 0))),
+    (re.compile(r"\b(\d{1,2})(?::(\d{2}))?[ \t]*([ap])\.?m\b\.?",
+                re.IGNORECASE),
+     lambda match: (int(match[1]) % 12 + (
+             12 if match[3].lower() == "p" else 0), int(match[2] or 0))),
+    (re.compile(r"\b(\d{1,2}):(\d{2})\b"),
+     lambda match: (int(match[1]), int(match[2]))),
+)
+
+
+def find_all(text: str, formats: Tuple[Tuple[re.Pattern, Callable], ...],
+             *arguments: Any) -> List[Any]:
+    # Converts every match of every format, blanking each match out so a
+    # later, looser format cannot read it again.
+    values: List[Any] = []
+
+    def convert(match: Any) -> str:
+        values.append(converter(match, *arguments))
+        return " " * len(match[0])
+
+    for pattern, converter in formats:
+        text = pattern.sub(convert, text)
+    return values
+
+
+def extract_dates(text: str, today: date) -> List[Optional[str]]:
+    return [
+        value.isoformat() if value else None
+        for value in find_all(text, DATE_FORMATS, today)
+    ]
+
+
+def extract_times(text: str, today: date) -> List[Optional[str]]:
+    return [
+        f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else None
+        for hour, minute in find_all(text, TIME_FORMATS)
+    ]
+
+
+def extract_emails(text: str, today: date) -> List[Optional[str]]:
+    return [match.rstrip(".").lower()
+            for match in EMAIL_PATTERN.findall(text)]
+
+
+def extract_phone_numbers(text: str, today: date) -> List[Optional[str]]:
+    phone_numbers: List[Optional[str]] = []
+
+    for match in PHONE_PATTERN.findall(text):
+        # The trunk prefix in "+46 (0)8" is not dialled from abroad.
+        phone_number: str = re.sub(r"[^\d+]", "", match.replace("(0)", ""))
+        if 8 <= len(phone_number.lstrip("+")) <= 15:
+            phone_numbers.append(phone_number)
+    return phone_numbers
+
+
+def extract_languages(text: str, today: date) -> List[Optional[str]]:
+    return [
+        LANGUAGES[match.lower()] for match in LANGUAGE_PATTERN.findall(text)
+        if LANGUAGES[match.lower()] not in EXCLUDED_LANGUAGE_CODES
+    ]
+
+
+def create_reference_extractor(
+        labels: str) -> Callable[[str, date], List[Optional[str]]]:
+    # Reads the number written after one of the labels, e.g. "booking
+    # number: 4821", "bokningsnr 4821", "order #4821" or "kundnummer är
+    # 4821".
+    pattern: re.Pattern = re.compile(
+            rf"\b(?:{labels})s?(?:[ \t-]?(?:nummer|number|nr|no|id|ref))?"
+            r"\.?[ \t]*(?:[:#]|\b(?:är|is)\b)?[ \t]*(\d{3,})\b",
+            re.IGNORECASE)
+
+    def extract_references(text: str, today: date) -> List[Optional[str]]:
+        return pattern.findall(text)
+
+    return extract_references
+
+
+class PreExtractor:
+    # Fills the parameters whose data type, key and description match, from
+    # every candidate value found in the conversation.
+    def __init__(self, name: str,
+                 extract: Callable[[str, date], List[Optional[str]]],
+                 data_types: FrozenSet[str],
+                 key_pattern: Optional[str] = None,
+                 description_pattern: Optional[str] = None) -> None:
+        self.name: str = name
+        self.extract: Callable[[str, date], List[Optional[str]]] = extract
+        self.data_types: FrozenSet[str] = data_types
+        self.key_pattern: Optional[re.Pattern] = re.compile(
+                key_pattern, re.IGNORECASE) if key_pattern else None
+        self.description_pattern: Optional[re.Pattern] = re.compile(
+                description_pattern, re.IGNORECASE) if (
+            description_pattern) else None
+
+    def accepts(self, parameter: DataParameter) -> bool:
+        return (parameter.data_type.strip().lower() in self.data_types
+                and (self.key_pattern is None
+                     or bool(self.key_pattern.search(parameter.key)))
+                and (self.description_pattern is None
+                     or bool(self.description_pattern.search(
+                        parameter.description))))
+
+
+PRE_EXTRACTORS: Tuple[PreExtractor, ...] = (
+    PreExtractor("date", extract_dates, frozenset(("date",))),
+    PreExtractor("time", extract_times, frozenset(("time",))),
+    PreExtractor("email", extract_emails, STRING_TYPES,
+                 key_pattern=r"e_?mail"),
+    PreExtractor("phone", extract_phone_numbers, STRING_TYPES,
+                 key_pattern=r"phone|telefon|mobile"),
+    PreExtractor("booking_reference",
+                 create_reference_extractor(
+                         "booking|bokning|reservation|assignment|uppdrag"),
+                 STRING_TYPES | INTEGER_TYPES,
+                 key_pattern=r"^(?:booking|assignment)_?(?:id|number|nr|no|"
+                             r"ref|reference)?$"),
+    PreExtractor("order_reference",
+                 create_reference_extractor("order|beställning"),
+                 STRING_TYPES | INTEGER_TYPES,
+                 key_pattern=r"^order_?(?:id|number|nr|no)?$"),
+    PreExtractor("customer_reference",
+                 create_reference_extractor("customer|kund"),
+                 STRING_TYPES | INTEGER_TYPES,
+                 key_pattern=r"^customer_?(?:id|number|nr|no)$"),
+    PreExtractor("language", extract_languages, STRING_TYPES,
+                 key_pattern=r"language|språk|sprak",
+                 description_pattern=r"ISO[ -]?639"),
+)
+
+
+def generate_extraction_text(parse_request: ExtractRequest) -> str:
+    return "\n".join(
+            f"{message.subject or ''}\n{strip_signature(message.message)}"
+            for message in parse_request.messages)
+
+
+def select_unique_value(values: List[Optional[str]]) -> Optional[str]:
+    # A value is only used when the conversation names exactly one; none,
+    # several or one that could not be resolved is left to the model.
+    distinct_values = set(values)
+    if len(distinct_values) != 1 or None in distinct_values:
+        return None
+    return distinct_values.pop()
+
+
+@timed("pre_extraction")
+def pre_extract_parameters(parse_request: ExtractRequest,
+                           now: Optional[datetime] = None) -> Dict[str, Any]:
+    # Relative dates resolve against one clock reading per request.
+    today: date = (now or get_current_datetime()).date()
+    text: str = generate_extraction_text(parse_request)
+    parameters_by_extractor: Dict[PreExtractor, List[DataParameter]] = {}
+
+    for parameter in parse_request.data_parameters:
+        for extractor in PRE_EXTRACTORS:
+            if extractor.accepts(parameter):
+                parameters_by_extractor.setdefault(
+                        extractor, []).append(parameter)
+                break
+
+    pre_extracted: Dict[str, Any] = {}
+    for extractor, parameters in parameters_by_extractor.items():
+        # Two parameters of one kind, e.g. a start and an end date, need
+        # the model to tell them apart.
+        if len(parameters) > 1:
+            continue
+
+        value: Optional[str] = select_unique_value(
+                extractor.extract(text, today))
+        if value is None:
+            continue
+
+        parameter: DataParameter = parameters[0]
+        pre_extracted[parameter.key] = int(value) if (
+            parameter.data_type.strip().lower() in INTEGER_TYPES) else value
+        logger.debug(f"Pre-extracted {parameter.key} with {extractor.name}.")
+
+    set_property("pre_extracted_parameters", len(pre_extracted))
+    return pre_extracted
+
+
+def remove_parameters(parse_request: ExtractRequest,
+                      extracted: Dict[str, Any]) -> ExtractRequest:
+    return parse_request.model_copy(update={
+        "data_parameters": [
+            parameter for parameter in parse_request.data_parameters
+            if parameter.key not in extracted
+        ]
+    })
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (LLAMA_INTENT_PROMPT_TEMPLATE,
+                        LLAMA_JOINT_PROMPT_TEMPLATE,
+                        LLAMA_PARSING_PROMPT_TEMPLATE,
+                        LLAMA_REPAIR_PROMPT_TEMPLATE,
+                        MISTRAL_INTENT_PROMPT_TEMPLATE,
+                        MISTRAL_JOINT_PROMPT_TEMPLATE,
+                        MISTRAL_PARSING_PROMPT_TEMPLATE,
+                        MISTRAL_REPAIR_PROMPT_TEMPLATE,
+                        PROMPT_TIME_OFFSET_HOURS)
+
+
+class CompiledTemplate:
+    # A prompt template split once into static text and named slots, so
+    # rendering is a single join instead of a template parse per request.
+    def __init__(self, template: str) -> None:
+        self.segments: List[Tuple[str, Optional[str]]] = []
+        pending_literal: str = ""
+
+        for literal, slot, format_spec, conversion in (
+                Formatter().parse(template)):
+            if format_spec or conversion:
+                raise ValueError(f"Unsupported prompt slot: {slot}.")
+
+            pending_literal += literal
+            if slot is not None:
+                self.segments.append((pending_literal, slot))
+                pending_literal = ""
+
+        if pending_literal or not self.segments:
+            self.segments.append((pending_literal, None))
+
+        self.slots: Tuple[str, ...] = tuple(
+                slot for _, slot in self.segments if slot is not None)
+        self.static_prefix: str = self.segments[0][0]
+        self.static_prefix_bytes: bytes = self.static_prefix.encode("utf-8")
+
+    def render(self, **slot_values: str) -> str:
+        parts: List[str] = []
+
+        for literal, slot in self.segments:
+            parts.append(literal)
+            if slot is not None:
+                if slot not in slot_values:
+                    raise ValueError(f"Missing prompt slot: {slot}.")
+                parts.append(slot_values[slot])
+
+        return "".join(parts)
+
+
+_compiled_templates: Dict[Tuple[str, str], CompiledTemplate] = {
+    ("llama", "intent"): CompiledTemplate(LLAMA_INTENT_PROMPT_TEMPLATE),
+    ("llama", "parsing"): CompiledTemplate(LLAMA_PARSING_PROMPT_TEMPLATE),
+    ("llama", "repair"): CompiledTemplate(LLAMA_REPAIR_PROMPT_TEMPLATE),
+    ("llama", "joint"): CompiledTemplate(LLAMA_JOINT_PROMPT_TEMPLATE),
+    ("mistral", "intent"): CompiledTemplate(MISTRAL_INTENT_PROMPT_TEMPLATE),
+    ("mistral", "parsing"): CompiledTemplate(MISTRAL_PARSING_PROMPT_TEMPLATE),
+    ("mistral", "repair"): CompiledTemplate(MISTRAL_REPAIR_PROMPT_TEMPLATE),
+    ("mistral", "joint"): CompiledTemplate(MISTRAL_JOINT_PROMPT_TEMPLATE),
+}
+
+
+def render_prompt(model_id: str, operation_type: str,
+                  **slot_values: str) -> str:
+    compiled_template: CompiledTemplate = get_compiled_template(
+            model_id, operation_type)
+
+    if ("current_date_time" in compiled_template.slots
+            and "current_date_time" not in slot_values):
+        slot_values["current_date_time"] = get_current_date_time()
+
+    return compiled_template.render(**slot_values)
+
+
+def get_compiled_template(
+        model_id: str, operation_type: str) -> CompiledTemplate:
+    template_key: Tuple[str, str] = (get_model_family(model_id),
+                                     operation_type)
+
+    if template_key not in _compiled_templates:
+        raise ValueError("Invalid operation type.")
+
+    return _compiled_templates[template_key]
+
+
+def get_static_prefix_bytes(model_id: str, operation_type: str) -> bytes:
+    return get_compiled_template(model_id, operation_type).static_prefix_bytes
+
+
+def get_model_family(model_id: str) -> str:
+    return "mistral" if "mistral" in model_id else "llama"
+
+
+def get_current_date_time() -> str:
+    return get_current_datetime().strftime("%Y-%m-%d %H:%M")
+
+
+def get_current_datetime() -> datetime:
+    return datetime.now() + timedelta(hours=PROMPT_TIME_OFFSET_HOURS)
@@ -1,26 +1,227 @@
-import json
-from typing import Any, Dict
+from __future__ import annotations
 
-import boto3  # type: ignore
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 
 from src import logger
+from src.config import (S3_PAYLOAD_CACHE_DIR, S3_PAYLOAD_CACHE_ENABLED,
+                        S3_PAYLOAD_CACHE_MAX_BYTES)
+from src.deadline import Deadline, create_client_config
+from src.lazy_module import LazyModule
+from src.metrics import set_property, span
+
+if TYPE_CHECKING:
+    import boto3  # type: ignore
+    from botocore.exceptions import ClientError  # type: ignore
+else:
+    boto3 = LazyModule("boto3")
+    botocore_exceptions = LazyModule("botocore.exceptions")
+
+_client_lock: threading.Lock = threading.Lock()
+_s3_client: Optional[boto3.client] = None
+
+
+class PayloadCache:
+    # Least recently used cache of S3 payloads on the local disk. Each entry
+    # is stored as "<etag>\n<body>" and its decoded payload is kept in memory
+    # so a revalidated hit skips both the download and the JSON decode.
+    # Payloads are copied in and out, since callers may change theirs while
+    # other batch workers hit the same entry.
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._size: int = 0
+        self._load_index()
+
+    def get(self, bucket: str,
+            key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        digest: str = self._digest(bucket, key)
+
+        with self._lock:
+            if digest not in self._entries:
+                return None
+
+            self._entries.move_to_end(digest)
+            etag: str = self._entries[digest][0]
+            payload: Optional[Dict[str, Any]] = self._payloads.get(digest)
+
+        if payload is None:
+            try:
+                with open(self._path(digest), "rb") as cache_file:
+                    cache_file.readline()
+                    payload = json.loads(cache_file.read().decode("utf-8"))
+            except (OSError, ValueError):
+                logger.warning("Discarding unreadable cached S3 payload.")
+                self._discard(digest)
+                return None
+
+            with self._lock:
+                if digest in self._entries:
+                    self._payloads[digest] = payload
+
+        return etag, copy.deepcopy(payload)
+
+    def put(self, bucket: str, key: str, etag: str, body: bytes,
+            payload: Dict[str, Any]) -> None:
+        digest: str = self._digest(bucket, key)
+        size: int = len(body)
+
+        if size > self.max_bytes:
+            logger.debug("S3 payload exceeds the cache size; not cached.")
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary_path: str = (f"{self._path(digest)}."
+                                   f"{threading.get_ident()}.tmp")
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(etag.encode("utf-8") + b"\n" + body)
+            os.replace(temporary_path, self._path(digest))
+
+        except OSError as error:
+            logger.warning(f"Failed to cache S3 payload: {str(error)}")
+            return
+
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)[1]
+
+            self._entries[digest] = (etag, size)
+            self._payloads[digest] = copy.deepcopy(payload)
+            self._size += size
+            evicted: list = self._evict()
+
+        for evicted_digest in evicted:
+            self._remove_file(evicted_digest)
+
+    def clear(self) -> None:
+        with self._lock:
+            digests: list = list(self._entries)
+            self._entries.clear()
+            self._payloads.clear()
+            self._size = 0
+
+        for digest in digests:
+            self._remove_file(digest)
+
+    def _evict(self) -> list:
+        evicted: list = []
+
+        while self._size > self.max_bytes and self._entries:
+            digest, (_, size) = self._entries.popitem(last=False)
+            self._payloads.pop(digest, None)
+            self._size -= size
+            evicted.append(digest)
+
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} cached S3 payloads.")
+        return evicted
+
+    def _discard(self, digest: str) -> None:
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)[1]
+            self._payloads.pop(digest, None)
 
+        self._remove_file(digest)
 
-def retrieve_s3_payload(s3_payload_path: str) -> Dict[str, Any]:
+    def _load_index(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+
+        cached_files: list = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".payload"):
+                continue
+
+            path: str = os.path.join(self.directory, file_name)
+            try:
+                with open(path, "rb") as cache_file:
+                    header: bytes = cache_file.readline()
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            cached_files.append((stat.st_mtime, file_name[:-8],
+                                 header.decode("utf-8").rstrip("\n"),
+                                 stat.st_size - len(header)))
+
+        for _, digest, etag, size in sorted(cached_files):
+            self._entries[digest] = (etag, size)
+            self._size += size
+
+        for evicted_digest in self._evict():
+            self._remove_file(evicted_digest)
+
+    def _remove_file(self, digest: str) -> None:
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.payload")
+
+    @staticmethod
+    def _digest(bucket: str, key: str) -> str:
+        return hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+
+
+_payload_cache: Optional[PayloadCache] = None
+
+
+def retrieve_s3_payload(s3_payload_path: str,
+                        deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     try:
         payload_path_parts = s3_payload_path.split("/")
         bucket_name = payload_path_parts[1]
         file_location = "/".join(payload_path_parts[2:])
 
-        s3_boto3_client: boto3.client = boto3.client("s3")
+        s3_boto3_client: boto3.client = get_s3_client()
+        payload_cache: Optional[PayloadCache] = get_payload_cache()
+        cached_payload: Optional[Tuple[str, Dict[str, Any]]] = (
+            payload_cache.get(bucket_name, file_location)
+            if payload_cache else None)
+
+        request_arguments: Dict[str, str] = {
+            "Bucket": bucket_name,
+            "Key": file_location
+        }
+        if cached_payload:
+            request_arguments["IfNoneMatch"] = cached_payload[0]
 
-        s3_object: Dict[str, Any] = s3_boto3_client.get_object(
-                Bucket=bucket_name,
-                Key=file_location
-        )
+        def download() -> Tuple[Dict[str, Any], bytes]:
+            s3_object: Dict[str, Any] = s3_boto3_client.get_object(
+                    **request_arguments)
+            return s3_object, s3_object["Body"].read()
 
-        s3_payload: Dict[str, Any] = json.loads(
-                s3_object["Body"].read().decode("utf-8"))
+        try:
+            with span("s3_fetch"):
+                s3_object, s3_body = (deadline.run("s3", download)
+                                      if deadline else download())
+
+        except botocore_exceptions.ClientError as error:
+            if cached_payload and is_not_modified(error):
+                logger.info("S3 payload not modified; served from cache.")
+                set_property("s3_cache", "not_modified")
+                return cached_payload[1]
+            raise
+
+        set_property("s3_cache", "stale" if cached_payload else "miss")
+        with span("s3_decode"):
+            s3_payload: Dict[str, Any] = json.loads(s3_body.decode("utf-8"))
+
+        if payload_cache and s3_object.get("ETag"):
+            payload_cache.put(bucket_name, file_location,
+                              s3_object["ETag"], s3_body, s3_payload)
 
         logger.info("S3 payload retrieved and decoded successfully.")
         return s3_payload
@@ -36,3 +237,34 @@ def retrieve_s3_payload(s3_payload_path: str) -> Dict[str, Any]:
     except Exception as error:
         logger.error(f"Failed to retrieve S3 payload: {str(error)}")
         raise RuntimeError(f"Failed to retrieve S3 payload: {str(error)}")
+
+
+def is_not_modified(error: ClientError) -> bool:
+    status_code: Optional[int] = (
+        error.response.get("ResponseMetadata", {}).get("HTTPStatusCode"))
+    error_code: Optional[str] = error.response.get("Error", {}).get("Code")
+    return status_code == 304 or error_code in ("304", "NotModified")
+
+
+def get_s3_client() -> boto3.client:
+    global _s3_client
+
+    with _client_lock:
+        if _s3_client is None:
+            logger.debug("Setting up the S3 client.")
+            _s3_client = boto3.client("s3",
+                                      config=create_client_config("s3"))
+        return _s3_client
+
+
+def get_payload_cache() -> Optional[PayloadCache]:
+    global _payload_cache
+
+    if not S3_PAYLOAD_CACHE_ENABLED:
+        return None
+
+    with _client_lock:
+        if _payload_cache is None:
+            _payload_cache = PayloadCache(S3_PAYLOAD_CACHE_DIR,
+                                          S3_PAYLOAD_CACHE_MAX_BYTES)
+        return _payload_cache
@@ -1,21 +1,41 @@
-from typing import Optional
+from __future__ import annotations
 
-import requests  # type: ignore
+import threading
+from typing import TYPE_CHECKING, Any, Optional, Tuple
 
 from src import logger
 from src.config import (SMART_DRAFT_BASE_URL,
+                        SMART_DRAFT_CONNECT_TIMEOUT,
                         SMART_DRAFT_DETECT_INTENT_ENDPOINT,
+                        SMART_DRAFT_POOL_SIZE,
+                        SMART_DRAFT_READ_TIMEOUTS,
                         SMART_DRAFT_VALIDATION_ENDPOINT,
                         SMART_DRAFT_EXECUTE_ENDPOINT)
+from src.deadline import Deadline
+from src.lazy_module import LazyModule
+from src.metrics import span
 
+if TYPE_CHECKING:
+    import requests  # type: ignore
+else:
+    requests = LazyModule("requests")
 
-def send_intent_response(conversation_id: int, identified_intent: str) -> None:
+# Shared keep-alive session, reused across warm invocations and the batch
+# worker threads.
+_session_lock: threading.Lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def send_intent_response(conversation_id: int, identified_intent: str,
+                         deadline: Optional[Deadline] = None) -> None:
     endpoint_url = generate_api_endpoint(
             "intent-detection", conversation_id=conversation_id)
     try:
-        response = requests.put(
-                url=endpoint_url,
-                json={"detected_intent": identified_intent})
+        with span("smart_draft_intent"):
+            response = get_session().put(
+                    url=endpoint_url,
+                    json={"detected_intent": identified_intent},
+                    timeout=get_timeout("intent-detection", deadline))
 
         response.raise_for_status()
         logger.info("Intent response successfully sent.")
@@ -26,10 +46,15 @@ def send_intent_response(conversation_id: int, identified_intent: str) -> None:
 
 
 def send_validation_response(
-        intent: str, identified_params: dict, conversation_id: int) -> None:
+        intent: str, identified_params: dict, conversation_id: int,
+        deadline: Optional[Deadline] = None) -> None:
     endpoint_url = generate_api_endpoint("validation", intent=intent)
     try:
-        response = requests.post(url=endpoint_url, json=identified_params)
+        with span("smart_draft_validation"):
+            response = get_session().post(
+                    url=endpoint_url,
+                    json=identified_params,
+                    timeout=get_timeout("validation", deadline))
 
         response.raise_for_status()
         logger.info("Parsed validation successfully sent.")
@@ -40,12 +65,14 @@ def send_validation_response(
         if missing_parameters:
             logger.info("Missing parameters detected.")
             send_execution_response(intent, identified_params,
-                                    conversation_id, missing_parameters=True)
+                                    conversation_id, missing_parameters=True,
+                                    deadline=deadline)
 
         else:
             logger.info("No missing parameters detected.")
             send_execution_response(
-                    intent, identified_params, conversation_id)
+                    intent, identified_params, conversation_id,
+                    deadline=deadline)
 
     except requests.RequestException as error:
         logger.error(f"Failed to send validation response: {error}")
@@ -54,18 +81,18 @@ def send_validation_response(
 
 def send_execution_response(
         intent: str, identified_params: dict, conversation_id: int,
-        missing_parameters: bool = False) -> None:
+        missing_parameters: bool = False,
+        deadline: Optional[Deadline] = None) -> None:
     endpoint_url = generate_api_endpoint("execution", intent=intent)
-
-    json_payload = {
-        "conversation_id": conversation_id,
-        "payload": identified_params,
-        "generated_response": "Incomplete, but we don't care, do we?" if
-        missing_parameters else "Complete."
-    }
+    json_payload = generate_execution_payload(
+            identified_params, conversation_id, missing_parameters)
 
     try:
-        response = requests.post(url=endpoint_url, json=json_payload)
+        with span("smart_draft_execution"):
+            response = get_session().post(
+                    url=endpoint_url,
+                    json=json_payload,
+                    timeout=get_timeout("execution", deadline))
         response.raise_for_status()
 
         logger.info("Execution response successfully sent.")
@@ -75,6 +102,70 @@ def send_execution_response(
         raise RuntimeError(f"Failed to send execution response: {error}")
 
 
+def generate_execution_payload(
+        identified_params: dict, conversation_id: int,
+        missing_parameters: bool = False) -> dict:
+    return {
+        "conversation_id": conversation_id,
+        "payload": identified_params,
+        "generated_response": "Incomplete, but we don't care, do we?" if
+        missing_parameters else "Complete."
+    }
+
+
+def get_session() -> requests.Session:
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = setup_session()
+        return _session
+
+
+def setup_session() -> requests.Session:
+    logger.debug("Setting up the Smart Draft session.")
+    session: requests.Session = requests.Session()
+    adapter: requests.adapters.HTTPAdapter = requests.adapters.HTTPAdapter(
+            pool_connections=SMART_DRAFT_POOL_SIZE,
+            pool_maxsize=SMART_DRAFT_POOL_SIZE)
+
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    logger.info("Smart Draft session successfully set up.")
+    return session
+
+
+def close_session() -> None:
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_timeout(endpoint: str, deadline: Optional[Deadline] = None
+                ) -> Tuple[float, float]:
+    if endpoint not in SMART_DRAFT_READ_TIMEOUTS:
+        raise ValueError("Invalid endpoint specified.")
+
+    connect_timeout: float = SMART_DRAFT_CONNECT_TIMEOUT
+    read_timeout: float = SMART_DRAFT_READ_TIMEOUTS[endpoint]
+
+    if deadline:
+        remaining_time: float = deadline.remaining()
+        if remaining_time <= 0:
+            logger.error(f"No time left to call the {endpoint} endpoint.")
+            raise RuntimeError(
+                    f"No time left to call the {endpoint} endpoint.")
+
+        connect_timeout = min(connect_timeout, remaining_time)
+        read_timeout = min(read_timeout, remaining_time)
+
+    return connect_timeout, read_timeout
+
+
 def generate_api_endpoint(endpoint: str, intent: Optional[str] = None,
                           conversation_id: Optional[int] = None) -> str:
     if endpoint == "intent-detection":
@@ -92,3 +183,98 @@ def generate_api_endpoint(endpoint: str, intent: Optional[str] = None,
     full_url = SMART_DRAFT_BASE_URL + endpoint_part
     logger.debug(f"Generated endpoint URL for {endpoint}: {full_url}")
     return full_url
+
+
+# Optional asynchronous client that multiplexes Smart Draft calls over one
+# connection pool, e.g. with asyncio.gather. Requires httpx.
+class AsyncSmartDraftClient:
+    def __init__(self, pool_size: int = SMART_DRAFT_POOL_SIZE,
+                 transport: Any = None) -> None:
+        try:
+            import httpx  # type: ignore
+        except ImportError as error:
+            logger.error("The async Smart Draft client requires httpx.")
+            raise RuntimeError(
+                    "The async Smart Draft client requires httpx.") from error
+
+        self._httpx: Any = httpx
+        self._client: Any = httpx.AsyncClient(
+                limits=httpx.Limits(
+                        max_connections=pool_size,
+                        max_keepalive_connections=pool_size),
+                transport=transport)
+
+    async def __aenter__(self) -> "AsyncSmartDraftClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _timeout(self, endpoint: str) -> Any:
+        connect_timeout, read_timeout = get_timeout(endpoint)
+        return self._httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    async def send_intent_response(
+            self, conversation_id: int, identified_intent: str) -> None:
+        endpoint_url = generate_api_endpoint(
+                "intent-detection", conversation_id=conversation_id)
+        try:
+            response = await self._client.put(
+                    endpoint_url,
+                    json={"detected_intent": identified_intent},
+                    timeout=self._timeout("intent-detection"))
+
+            response.raise_for_status()
+            logger.info("Intent response successfully sent.")
+
+        except self._httpx.HTTPError as error:
+            logger.error(f"Failed to send intent response: {error}")
+            raise RuntimeError(f"Failed to send intent response: {error}")
+
+    async def send_validation_response(
+            self, intent: str, identified_params: dict,
+            conversation_id: int) -> None:
+        endpoint_url = generate_api_endpoint("validation", intent=intent)
+        try:
+            response = await self._client.post(
+                    endpoint_url,
+                    json=identified_params,
+                    timeout=self._timeout("validation"))
+
+            response.raise_for_status()
+            logger.info("Parsed validation successfully sent.")
+
+            response_data = response.json()
+            missing_parameters = response_data['data']['missing_parameters']
+
+        except self._httpx.HTTPError as error:
+            logger.error(f"Failed to send validation response: {error}")
+            raise RuntimeError(
+                    f"Failed to send validation response: {error}")
+
+        await self.send_execution_response(
+                intent, identified_params, conversation_id,
+                missing_parameters=bool(missing_parameters))
+
+    async def send_execution_response(
+            self, intent: str, identified_params: dict,
+            conversation_id: int, missing_parameters: bool = False) -> None:
+        endpoint_url = generate_api_endpoint("execution", intent=intent)
+        json_payload = generate_execution_payload(
+                identified_params, conversation_id, missing_parameters)
+
+        try:
+            response = await self._client.post(
+                    endpoint_url,
+                    json=json_payload,
+                    timeout=self._timeout("execution"))
+            response.raise_for_status()
+
+            logger.info("Execution response successfully sent.")
+
+        except self._httpx.HTTPError as error:
+            logger.error(f"Failed to send execution response: {error}")
+            raise RuntimeError(f"Failed to send execution response: {error}")
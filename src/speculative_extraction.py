@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from src import logger
+from src.bedrock_wrapper import resolve_model_id
+from src.config import (MAX_TOKEN_OUTPUT_FOR_PARSING,
+                        SPECULATIVE_EXTRACTION_MAX_CONCURRENCY,
+                        SPECULATIVE_EXTRACTION_MAX_TOKENS_PER_MINUTE,
+                        SPECULATIVE_EXTRACTION_MIN_SCORE_SHARE,
+                        SPECULATIVE_EXTRACTION_TOP_K)
+from src.deadline import Deadline
+from src.intent_shortlist import rank_intents
+from src.metrics import bind_context, increment, set_property
+from src.models import ExtractRequest, Intent, IntentRequest
+from src.prompt_renderer import get_model_family, render_prompt
+from src.token_budget import count_tokens
+
+
+class SpendLimiter:
+    # Caps the estimated tokens spent on speculative calls over a sliding
+    # window, so speculation cannot use up the Bedrock quota.
+    def __init__(self, max_tokens: int, window_seconds: float = 60.0) -> None:
+        self.max_tokens: int = max_tokens
+        self.window_seconds: float = window_seconds
+        self._lock: threading.Lock = threading.Lock()
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._total: int = 0
+
+    def try_spend(self, tokens: int) -> bool:
+        now: float = time.monotonic()
+        window_start: float = now - self.window_seconds
+        with self._lock:
+            while self._spent and self._spent[0][0] <= window_start:
+                self._total -= self._spent.popleft()[1]
+
+            if self._total + tokens > self.max_tokens:
+                return False
+
+            self._spent.append((now, tokens))
+            self._total += tokens
+            return True
+
+
+_executor_lock: threading.Lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+        SPECULATIVE_EXTRACTION_MAX_CONCURRENCY)
+_spend_limiter: SpendLimiter = SpendLimiter(
+        SPECULATIVE_EXTRACTION_MAX_TOKENS_PER_MINUTE)
+_stats_lock: threading.Lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "launched": 0,
+    "skipped": 0,
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def select_candidates(intent_request: IntentRequest) -> List[Intent]:
+    # The top intents with parameters to extract, when they hold at least
+    # the minimum share of the BM25 score; an unclear ranking would mostly
+    # waste the calls.
+    ranking: List[Tuple[Intent, float]] = rank_intents(
+            intent_request, len(intent_request.intents))
+    total_score: float = sum(score for _, score in ranking)
+    top_ranking: List[Tuple[Intent, float]] = (
+        ranking[:SPECULATIVE_EXTRACTION_TOP_K])
+
+    if not total_score or (sum(score for _, score in top_ranking)
+                           < SPECULATIVE_EXTRACTION_MIN_SCORE_SHARE
+                           * total_score):
+        return []
+
+    return [intent for intent, _ in top_ranking if intent.data_parameters]
+
+
+def start_speculative_extraction(
+        intent_request: IntentRequest,
+        extract: Callable[[Intent], Dict[str, Any]],
+        deadline: Optional[Deadline] = None) -> Dict[str, Future]:
+    # Runs extract(intent) in the background for each candidate intent
+    # within the concurrency cap and the spend limit, keyed by intent slug.
+    # Nothing is started when the time left cannot cover a parsing call.
+    futures: Dict[str, Future] = {}
+    candidates: List[Intent] = select_candidates(intent_request)
+
+    if candidates and deadline and not deadline.can_afford_alternate_model(
+            "parsing"):
+        logger.info("Not enough time left to speculate, skipping "
+                    f"{len(candidates)} intents.")
+        for _ in candidates:
+            record("skipped")
+        return futures
+
+    model_id: str = resolve_model_id()
+    for intent in candidates:
+        tokens: int = estimate_tokens(intent_request, intent, model_id)
+
+        if not _slots.acquire(blocking=False):
+            logger.info("Speculation concurrency cap reached, skipping "
+                        f"{intent.slug}.")
+            record("skipped")
+            continue
+
+        if not _spend_limiter.try_spend(tokens):
+            _slots.release()
+            logger.info(f"Speculation spend limit reached, skipping "
+                        f"{intent.slug}.")
+            record("skipped")
+            continue
+
+        logger.info(f"Speculatively extracting the parameters of "
+                    f"{intent.slug}.")
+        record("launched")
+        future: Future = get_executor().submit(
+                bind_context(run_speculation), extract, intent)
+        future.add_done_callback(release_cancelled)
+        futures[intent.slug] = future
+
+    return futures
+
+
+def estimate_tokens(intent_request: IntentRequest, intent: Intent,
+                    model_id: str) -> int:
+    # The parsing prompt rendered directly, so the estimate stays out of the
+    # prompt_render timings, plus the most the answer can use.
+    extract_request: ExtractRequest = ExtractRequest(
+            messages=intent_request.messages,
+            data_parameters=intent.data_parameters)
+    prompt: str = render_prompt(
+            model_id,
+            operation_type="parsing",
+            intent_parameters=(
+                extract_request.output_stringified_data_parameters()),
+            email_conversation=extract_request.output_stringified_messages())
+    return (count_tokens(prompt, get_model_family(model_id))
+            + MAX_TOKEN_OUTPUT_FOR_PARSING)
+
+
+def run_speculation(extract: Callable[[Intent], Dict[str, Any]],
+                    intent: Intent) -> Dict[str, Any]:
+    try:
+        return extract(intent)
+    finally:
+        _slots.release()
+
+
+def release_cancelled(future: Future) -> None:
+    # A call cancelled before it started never frees its slot itself.
+    if future.cancelled():
+        _slots.release()
+
+
+def resolve_speculation(futures: Dict[str, Future],
+                        detected_intent: str) -> Optional[Dict[str, Any]]:
+    # The parameters extracted for the detected intent, or None when it was
+    # not speculated on or its extraction failed. The other extractions are
+    # discarded; those already running finish in the background.
+    hit: Optional[Future] = futures.get(detected_intent)
+    for slug, future in futures.items():
+        if slug != detected_intent:
+            future.cancel()
+
+    if hit is None:
+        record("misses")
+        set_property("speculation_hit", False)
+        return None
+
+    record("hits")
+    set_property("speculation_hit", True)
+    try:
+        return hit.result()
+    except Exception as error:
+        logger.warning(f"Speculative extraction failed: {str(error)}")
+        return None
+
+
+def record(outcome: str) -> None:
+    increment(f"speculation_{outcome}")
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_speculation_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                    max_workers=SPECULATIVE_EXTRACTION_MAX_CONCURRENCY,
+                    thread_name_prefix="speculation")
+        return _executor
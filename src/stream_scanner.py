@@ -0,0 +1,124 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+
+from src.config import INTENT_LABEL_ENCODING_ENABLED
+from src.intent_labels import LABEL_LEAD_INS
+
+
+class StreamScanner(ABC):
+    # Consumes a streamed generation chunk by chunk and reports the offset
+    # right after the first complete answer, so the stream can be cut there.
+    def __init__(self) -> None:
+        self.offset: int = 0
+        self.end: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def feed(self, chunk: str) -> Optional[int]:
+        if self.end is None:
+            index: Optional[int] = self.scan(chunk)
+            if index is not None:
+                self.end = self.offset + index
+            self.offset += len(chunk)
+        return self.end
+
+    @abstractmethod
+    def scan(self, chunk: str) -> Optional[int]:
+        pass
+
+
+class JsonObjectScanner(StreamScanner):
+    # Tracks the nesting of the first JSON object, ignoring braces inside
+    # strings, and completes on its closing brace. Single-quoted strings
+    # count too, since the JSON recovery accepts them.
+    def __init__(self) -> None:
+        super().__init__()
+        self.depth: int = 0
+        self.quote: Optional[str] = None
+        self.escaped: bool = False
+
+    def scan(self, chunk: str) -> Optional[int]:
+        for index, character in enumerate(chunk):
+            if self.quote is not None:
+                if self.escaped:
+                    self.escaped = False
+                elif character == "\\":
+                    self.escaped = True
+                elif character == self.quote:
+                    self.quote = None
+
+            elif character == "{":
+                self.depth += 1
+
+            elif character == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return index + 1
+
+            elif character in "\"'" and self.depth > 0:
+                self.quote = character
+
+        return None
+
+
+class IntegerScanner(StreamScanner):
+    # Completes on the first character after the first run of digits.
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_digits: bool = False
+
+    def scan(self, chunk: str) -> Optional[int]:
+        for index, character in enumerate(chunk):
+            if character.isdigit():
+                self.in_digits = True
+            elif self.in_digits:
+                return index
+
+        return None
+
+
+class LabelScanner(StreamScanner):
+    # Completes on the first character after the first word that is not a
+    # lead-in such as "Label", so letter labels end the stream too.
+    def __init__(self) -> None:
+        super().__init__()
+        self.word: str = ""
+
+    def scan(self, chunk: str) -> Optional[int]:
+        for index, character in enumerate(chunk):
+            if character.isalnum():
+                self.word += character
+            elif self.word.lower() in LABEL_LEAD_INS:
+                self.word = ""
+            elif self.word:
+                return index
+
+        return None
+
+
+def create_scanner(operation_type: str) -> StreamScanner:
+    if operation_type == "intent":
+        return (LabelScanner() if INTENT_LABEL_ENCODING_ENABLED
+                else IntegerScanner())
+    elif operation_type == "parsing":
+        return JsonObjectScanner()
+
+    raise ValueError("Invalid operation type.")
+
+
+def read_until_complete(chunks: Iterable[str],
+                        scanner: StreamScanner) -> Tuple[str, bool]:
+    # Returns the text up to the first complete answer, and whether the
+    # stream was cut before it ended.
+    parts: List[str] = []
+
+    for chunk in chunks:
+        parts.append(chunk)
+        end: Optional[int] = scanner.feed(chunk)
+
+        if end is not None:
+            return "".join(parts)[:end], True
+
+    return "".join(parts), False
@@ -0,0 +1,158 @@
+import html
+import re
+from typing import Iterable, List, Set, Tuple
+
+from src.config import THREAD_COMPACTION_QUOTE_COVERAGE
+
+# The number of consecutive words compared between quoted text and the
+# other messages, which makes the comparison robust to re-wrapped quotes.
+SHINGLE_SIZE: int = 4
+
+HTML_PATTERN: re.Pattern = re.compile(
+        r"<(?:html|body|div|p|br|span|table|td|font|blockquote)\b[^>]*>"
+        r"|&nbsp;", re.IGNORECASE)
+HTML_HIDDEN_PATTERN: re.Pattern = re.compile(
+        r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+HTML_BREAK_PATTERN: re.Pattern = re.compile(
+        r"<br\s*/?>|</(?:p|div|tr|li|h[1-6]|table|blockquote)\s*>",
+        re.IGNORECASE)
+HTML_TAG_PATTERN: re.Pattern = re.compile(r"<[^>]+>")
+
+# The first line of the quoted history in a reply or a forward: a reply
+# header, which some clients wrap over two lines, an original or forwarded
+# message separator, or an Outlook style header block.
+QUOTE_START_PATTERN: re.Pattern = re.compile(
+        r"^[ \t>]*(?:On|Den|Le|Am)\b[^\n]{0,200}(?:\n[^\n]{0,200})?"
+        r"\b(?:wrote|skrev|a écrit|schrieb)\b[^\n]{0,100}:[ \t]*$"
+        r"|^[ \t>]*-{2,}[ \t]*(?:original message|ursprungligt meddelande"
+        r"|forwarded message|vidarebefordrat meddelande)[ \t]*-{2,}"
+        r"|^[ \t>]*(?:from|från):[^\n]*\n[ \t>]*(?:sent|date|skickat|datum"
+        r"|to|till):", re.IGNORECASE | re.MULTILINE)
+QUOTED_LINES_PATTERN: re.Pattern = re.compile(
+        r"(?:^[ \t]*>[^\n]*(?:\n|$))+", re.MULTILINE)
+HEADER_LINE_PATTERN: re.Pattern = re.compile(
+        r"^[ \t>]*(?:from|sent|date|to|cc|subject|från|skickat|datum|till"
+        r"|kopia|ämne):[^\n]*$", re.IGNORECASE | re.MULTILINE)
+WORD_PATTERN: re.Pattern = re.compile(r"\w+")
+
+# Signatures hold the sender's own details, which the model is told not to
+# extract unless asked; everything from the closing line on is dropped. The
+# closing line holds only the closing and at most a short name, and is only
+# looked for in the last lines, so a sentence that opens with a closing
+# phrase does not cut off the rest of the message.
+SIGNATURE_MAX_LINES: int = 8
+SIGNATURE_PATTERN: re.Pattern = re.compile(
+        r"^[ \t]*(?:--|(?:(?:med[ \t]+)?(?:vänliga?|bästa|varma)[ \t]+"
+        r"hälsning(?:ar)?|mvh|hälsningar|(?:best|kind|warm)[ \t]+regards"
+        r"|regards|best[ \t]+wishes|(?:yours[ \t]+)?sincerely)[ \t]*[,.!]?"
+        r"(?:[ \t]+[^\W\d_][\w.'-]*){0,3})[ \t]*$",
+        re.IGNORECASE | re.MULTILINE)
+DISCLAIMER_PATTERN: re.Pattern = re.compile(
+        r"\s*(?:confidentiality notice|disclaimer\b|this (?:e-?mail|message)"
+        r"(?: and any attachments?)? (?:is|are|may be|contains?) "
+        r"(?:confidential|intended|privileged)|the information (?:contained )?"
+        r"in this (?:e-?mail|message)|detta (?:e-?post)?meddelande "
+        r"(?:är|kan|innehåller)|sent from my|skickat från min|please consider "
+        r"the environment|tänk på miljön)", re.IGNORECASE)
+PARAGRAPH_BREAK_PATTERN: re.Pattern = re.compile(r"\n[ \t]*\n")
+INVISIBLE_CHARACTERS_PATTERN: re.Pattern = re.compile(
+        "[\u200b\u200c\u200d\u2060\ufeff]")
+
+
+def html_to_text(text: str) -> str:
+    if not HTML_PATTERN.search(text):
+        return text
+
+    text = HTML_HIDDEN_PATTERN.sub("", text)
+    text = HTML_BREAK_PATTERN.sub("\n", text)
+    return html.unescape(HTML_TAG_PATTERN.sub("", text))
+
+
+def split_quoted_history(text: str) -> Tuple[str, str]:
+    match = QUOTE_START_PATTERN.search(text)
+    if not match:
+        return text, ""
+    return text[:match.start()], text[match.start():]
+
+
+def generate_shingles(text: str) -> Set[str]:
+    # Reply and header lines are not content, so they are left out. The
+    # shingles are strings rather than tuples, which the garbage collector
+    # does not track.
+    text = HEADER_LINE_PATTERN.sub(" ", QUOTE_START_PATTERN.sub(" ", text))
+    words: List[str] = WORD_PATTERN.findall(text.lower())
+    return {
+        " ".join(words[index:index + SHINGLE_SIZE])
+        for index in range(max(len(words) - SHINGLE_SIZE + 1, 0))
+    }
+
+
+def is_covered(quoted: str, index: Set[str]) -> bool:
+    # Quoted text can go when the other messages already contain most of
+    # it; forwarded content that is not in the thread is kept.
+    shingles: Set[str] = generate_shingles(quoted)
+    if not shingles:
+        return True
+
+    covered: int = sum(shingle in index for shingle in shingles)
+    return covered / len(shingles) >= THREAD_COMPACTION_QUOTE_COVERAGE
+
+
+def remove_covered_quotes(text: str, index: Set[str]) -> str:
+    return QUOTED_LINES_PATTERN.sub(
+            lambda match: "" if is_covered(match[0], index) else match[0],
+            text)
+
+
+def strip_signature(text: str) -> str:
+    line_starts: List[int] = [0] + [
+        match.end() for match in re.finditer("\n", text.rstrip())]
+    match = SIGNATURE_PATTERN.search(
+            text, line_starts[-SIGNATURE_MAX_LINES:][0])
+    return text[:match.start()] if match else text
+
+
+def strip_disclaimers(text: str) -> str:
+    return "\n\n".join(
+            paragraph for paragraph in PARAGRAPH_BREAK_PATTERN.split(text)
+            if not DISCLAIMER_PATTERN.match(paragraph))
+
+
+def normalize_whitespace(text: str) -> str:
+    text = INVISIBLE_CHARACTERS_PATTERN.sub("", text).replace("\xa0", " ")
+    text = re.sub(r"[ \t]+", " ", text.replace("\r\n", "\n"))
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def compact_bodies(bodies: Iterable[str],
+                   strip_signatures: bool = True) -> List[str]:
+    # Every step is a bounded regex scan or a set lookup per word, so the
+    # time grows linearly with the length of the thread. Signatures are
+    # kept when the messages are compacted for extraction, where they can
+    # hold the parameters asked for.
+    texts: List[str] = [
+        html_to_text(body.replace("\r\n", "\n")) for body in bodies
+    ]
+    parts: List[Tuple[str, str]] = [
+        split_quoted_history(text) for text in texts
+    ]
+
+    # Only text written in a message is indexed, so quoted text is only
+    # removed when the thread still contains it elsewhere.
+    index: Set[str] = set()
+    for new_text, _ in parts:
+        index |= generate_shingles(QUOTED_LINES_PATTERN.sub("\n", new_text))
+
+    compacted: List[str] = []
+    for new_text, quoted in parts:
+        # Disclaimers go first, as they usually follow the signature.
+        text: str = strip_disclaimers(
+                remove_covered_quotes(new_text, index))
+        if strip_signatures:
+            text = strip_signature(text)
+        if quoted and not is_covered(quoted, index):
+            text = f"{text}\n\n{quoted}"
+        compacted.append(normalize_whitespace(text))
+
+    return compacted
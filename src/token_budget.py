@@ -0,0 +1,157 @@
+import math
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from src import logger
+from src.config import (MODEL_CONTEXT_TOKENS, TOKEN_BUDGET_PRIORITY_ROLE,
+                        TOKEN_BUDGET_SAFETY_MARGIN, TOKENIZER_PATHS)
+from src.metrics import increment, set_property, timed
+from src.models import ExtractRequest, IntentRequest, Message
+from src.prompt_renderer import get_model_family
+
+RequestT = TypeVar("RequestT", bound=Union[IntentRequest, ExtractRequest])
+
+# The approximate tokenizer of each model family: words up to a length are
+# a single token and longer ones take a token per so many characters, digit
+# runs take a token per so many digits, punctuation runs, e.g. '":' in JSON,
+# a token per two characters and every other visible character is a token
+# of its own. Llama 3 has a large vocabulary and groups up to three digits;
+# the Mistral tokenizer has a small vocabulary and splits every digit. The
+# safety margin of the input budget absorbs the estimate's error.
+SINGLE_TOKEN_WORD_LENGTH: Dict[str, int] = {"llama": 6, "mistral": 4}
+WORD_CHARACTERS_PER_TOKEN: Dict[str, float] = {"llama": 4.0, "mistral": 3.0}
+DIGITS_PER_TOKEN: Dict[str, int] = {"llama": 3, "mistral": 1}
+PUNCTUATION_PER_TOKEN: int = 2
+
+PIECE_PATTERN: re.Pattern = re.compile(r"[^\W\d_]+|\d+|[^\w\s]+|\S")
+
+
+def approximate_tokens(text: str, family: str) -> int:
+    if family not in WORD_CHARACTERS_PER_TOKEN:
+        raise ValueError("Invalid model family.")
+
+    single_token_length: int = SINGLE_TOKEN_WORD_LENGTH[family]
+    characters_per_token: float = WORD_CHARACTERS_PER_TOKEN[family]
+    digits_per_token: int = DIGITS_PER_TOKEN[family]
+    tokens: int = 0
+
+    for piece in PIECE_PATTERN.findall(text):
+        if len(piece) <= 1 or (len(piece) <= single_token_length
+                               and not piece.isdigit()):
+            tokens += 1
+        elif piece.isdigit():
+            tokens += math.ceil(len(piece) / digits_per_token)
+        elif not piece[0].isalpha():
+            tokens += math.ceil(len(piece) / PUNCTUATION_PER_TOKEN)
+        else:
+            tokens += math.ceil(len(piece) / characters_per_token)
+    return tokens
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(family: str) -> Optional[Any]:
+    path: str = TOKENIZER_PATHS.get(family, "")
+    if not path:
+        return None
+
+    try:
+        from tokenizers import Tokenizer  # type: ignore
+    except ImportError:
+        logger.warning("The tokenizers package is not installed, token "
+                       "counts are approximate.")
+        return None
+
+    logger.info(f"Loading the {family} tokenizer from {path}.")
+    return Tokenizer.from_file(path)
+
+
+def count_tokens(text: str, family: str) -> int:
+    tokenizer: Optional[Any] = load_tokenizer(family)
+    if tokenizer is None:
+        return approximate_tokens(text, family)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def get_input_token_budget(model_id: str, max_output_tokens: int) -> int:
+    context_tokens: int = MODEL_CONTEXT_TOKENS.get(
+            model_id, min(MODEL_CONTEXT_TOKENS.values()))
+    return int(context_tokens * (1 - TOKEN_BUDGET_SAFETY_MARGIN)
+               ) - max_output_tokens
+
+
+def truncate_message(message: Message, max_tokens: int,
+                     family: str) -> Message:
+    # Keeps the start of the body, where replies put the new text.
+    body: str = message.message
+    while body:
+        tokens: int = count_tokens(
+                str(message.model_copy(update={"message": body})), family)
+        if tokens <= max_tokens:
+            break
+        body = body[:min(len(body) - 1,
+                         int(len(body) * max_tokens / tokens))]
+
+    return message.model_copy(update={"message": body})
+
+
+def trim_messages(messages: List[Message], max_tokens: int,
+                  family: str) -> List[Message]:
+    # Keeps the latest messages of the priority role first and then the
+    # latest of the others, in their original order. The first of them is
+    # truncated when it does not fit on its own.
+    priority: List[int] = sorted(
+            range(len(messages)),
+            key=lambda index: (
+                messages[index].role.lower() != TOKEN_BUDGET_PRIORITY_ROLE,
+                -index))
+    kept: Dict[int, Message] = {}
+    remaining_tokens: int = max_tokens
+
+    for index in priority:
+        message: Message = messages[index]
+        # One more token for the line break between messages.
+        tokens: int = count_tokens(str(message), family) + 1
+        if tokens > remaining_tokens and not kept:
+            message = truncate_message(message, remaining_tokens - 1, family)
+            tokens = count_tokens(str(message), family) + 1
+
+        if tokens <= remaining_tokens:
+            kept[index] = message
+            remaining_tokens -= tokens
+
+    return [kept[index] for index in sorted(kept)]
+
+
+@timed("token_budget")
+def fit_prompt(request: RequestT, model_id: str, max_output_tokens: int,
+               render: Callable[[RequestT], str]) -> str:
+    family: str = get_model_family(model_id)
+    budget: int = get_input_token_budget(model_id, max_output_tokens)
+    prompt: str = render(request)
+    tokens: int = count_tokens(prompt, family)
+
+    if tokens <= budget:
+        return prompt
+
+    overhead: int = count_tokens(
+            render(request.model_copy(update={"messages": []})), family)
+    if overhead >= budget:
+        logger.error(f"The prompt needs {overhead} tokens without messages, "
+                     f"over the budget of {budget} for {model_id}.")
+        raise ValueError("Prompt exceeds the input token budget.")
+
+    messages: List[Message] = trim_messages(request.messages,
+                                            budget - overhead, family)
+    logger.warning(f"Prompt of {tokens} tokens exceeds the budget of "
+                   f"{budget} for {model_id}, kept {len(messages)} of "
+                   f"{len(request.messages)} messages.")
+    increment("token_budget_trims")
+    set_property("trimmed_messages", len(request.messages) - len(messages))
+    return render(request.model_copy(update={"messages": messages}))
+
+
+def record_token_usage(model_id: str, prompt: str, response: str) -> None:
+    family: str = get_model_family(model_id)
+    increment("estimated_input_tokens", count_tokens(prompt, family))
+    increment("estimated_output_tokens", count_tokens(response, family))
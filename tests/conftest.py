@@ -0,0 +1,10 @@
+import pytest
+
+from src.bedrock_wrapper import clear_pool
+
+
+@pytest.fixture(autouse=True)
+def reset_bedrock_pool():
+    clear_pool()
+    yield
+    clear_pool()
@@ -1,10 +1,20 @@
-from unittest.mock import MagicMock, patch
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
 
-from src.bedrock_wrapper import (prompt_llm, setup_bedrock_client, setup_llm,
-                                 setup_model_kwargs)
-from src.config import (BEDROCK_REGION, BEDROCK_SERVICE, LLAMA_INTENT_KWARGS,
+from src.bedrock_wrapper import (NativeBedrockLLM, build_request_body,
+                                 get_bedrock_client, get_llm,
+                                 get_model_provider, get_pool_stats,
+                                 parse_response_body, prompt_llm,
+                                 setup_bedrock_client, setup_llm,
+                                 setup_max_tokens_kwargs, setup_model_kwargs)
+from src.llm_cache import InMemoryCacheBackend, LLMResponseCache
+from src.config import (ALTERNATE_LLM_MODEL_ID, BEDROCK_REGION,
+                        BEDROCK_SERVICE, DEADLINE_STAGE_BUDGET_SECONDS,
+                        LLAMA_INTENT_KWARGS,
                         LLAMA_PARSING_KWARGS, LLM_MODEL_ID,
                         MISTRAL_INTENT_KWARGS, MISTRAL_PARSING_KWARGS)
 
@@ -51,6 +61,171 @@ class TestPromptLLM:
         assert response == expected_llm_response
 
 
+class TestPromptLLMDeadline:
+    def test_prompt_llm_runs_within_the_llm_budget(self):
+        deadline = MagicMock()
+        deadline.run.return_value = "LLM response"
+
+        with patch('src.bedrock_wrapper.get_llm') as get_llm_mock:
+            response = prompt_llm("prompt", "intent", deadline=deadline)
+
+        deadline.run.assert_called_once_with(
+                "llm", get_llm_mock.return_value.invoke, "prompt")
+        assert response == "LLM response"
+
+
+class TestPromptLLMTokenUsage:
+    def test_token_usage_is_recorded(self):
+        with patch('src.bedrock_wrapper.TOKEN_BUDGET_ENABLED', True), \
+                patch('src.bedrock_wrapper.get_llm') as get_llm_mock, \
+                patch('src.bedrock_wrapper.record_token_usage') as mock:
+            get_llm_mock.return_value.invoke.return_value = "3"
+            prompt_llm("prompt", "intent")
+
+        mock.assert_called_once_with(LLM_MODEL_ID, "prompt", "3")
+
+
+class FakeEventStream:
+    def __init__(self, provider, texts):
+        self.events = [{"chunk": {"bytes": json.dumps(
+            {"generation": text} if provider == "meta"
+            else {"outputs": [{"text": text}]}).encode("utf-8")}}
+            for text in texts]
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            self.consumed += 1
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class TestPromptLLMStreaming:
+    @pytest.mark.parametrize("model_id, provider", [
+        ("meta.llama3-70b-instruct-v1:0", "meta"),
+        ("mistral.mixtral-8x7b-instruct-v0:1", "mistral"),
+    ])
+    def test_stream_stops_after_first_object(self, model_id, provider):
+        event_stream = FakeEventStream(
+                provider, ['{"city": ', '"Stockholm"}', ' I extracted',
+                           ' the city', ' from the email.'])
+        bedrock_client = MagicMock()
+        bedrock_client.invoke_model_with_response_stream.return_value = {
+            "body": event_stream
+        }
+        llm = NativeBedrockLLM(bedrock_client, model_id,
+                               setup_model_kwargs(model_id, "parsing"))
+
+        with patch('src.bedrock_wrapper.get_llm', return_value=llm), \
+                patch('src.bedrock_wrapper.LLM_STREAMING_ENABLED', True):
+            response = prompt_llm("prompt", operation_type="parsing")
+
+        assert response == '{"city": "Stockholm"}'
+        assert event_stream.consumed == 2
+        assert event_stream.closed
+
+    def test_langchain_stream_stops_after_first_integer(self):
+        llm = MagicMock()
+        llm.stream.return_value = iter([" 3", "\n", "Because"])
+
+        with patch('src.bedrock_wrapper.get_llm', return_value=llm), \
+                patch('src.bedrock_wrapper.LLM_STREAMING_ENABLED', True):
+            response = prompt_llm("prompt", operation_type="intent")
+
+        assert response == " 3"
+        llm.stream.assert_called_once_with("prompt")
+        llm.invoke.assert_not_called()
+
+
+class TestPromptLLMCache:
+    @pytest.fixture
+    def response_cache(self):
+        response_cache = LLMResponseCache(InMemoryCacheBackend())
+        with patch('src.bedrock_wrapper.get_response_cache',
+                   return_value=response_cache):
+            yield response_cache
+
+    @pytest.fixture
+    def get_llm_mock(self):
+        with patch('src.bedrock_wrapper.get_llm') as mock:
+            mock.return_value.invoke.side_effect = ["first", "second"]
+            yield mock
+
+    def test_identical_prompt_is_served_from_cache(
+            self, response_cache, get_llm_mock):
+        first_response = prompt_llm("prompt", "intent")
+        second_response = prompt_llm("prompt", "intent")
+
+        assert first_response == second_response == "first"
+        get_llm_mock.return_value.invoke.assert_called_once_with("prompt")
+        assert response_cache.get_stats() == {
+            "intent": {"hits": 1, "misses": 1}}
+
+    def test_alternate_model_is_cached_separately(
+            self, response_cache, get_llm_mock):
+        assert prompt_llm("prompt", "intent") == "first"
+        assert prompt_llm("prompt", "intent", change_llm=True) == "second"
+        assert get_llm_mock.return_value.invoke.call_count == 2
+
+
+class TestBedrockPool:
+    @pytest.fixture
+    def setup_bedrock_client_mock(self):
+        with patch('src.bedrock_wrapper.setup_bedrock_client',
+                   side_effect=lambda: MagicMock()) as mock:
+            yield mock
+
+    @pytest.fixture
+    def setup_llm_mock(self):
+        with patch('src.bedrock_wrapper.setup_llm',
+                   side_effect=lambda *args, **kwargs: MagicMock()) as mock:
+            yield mock
+
+    def test_prompt_llm_reuses_pooled_llm(
+            self, setup_bedrock_client_mock, setup_llm_mock):
+        for _ in range(3):
+            prompt_llm("prompt", "intent")
+
+        setup_bedrock_client_mock.assert_called_once()
+        setup_llm_mock.assert_called_once()
+        assert get_pool_stats() == {
+            "client_hits": 0,
+            "client_creations": 1,
+            "llm_hits": 2,
+            "llm_creations": 1,
+        }
+
+    def test_get_llm_keys_by_model_and_operation(
+            self, setup_bedrock_client_mock, setup_llm_mock):
+        primary_intent_llm = get_llm("intent")
+        primary_parsing_llm = get_llm("parsing")
+        alternate_intent_llm = get_llm("intent", alternate_model=True)
+
+        assert len({id(primary_intent_llm), id(primary_parsing_llm),
+                    id(alternate_intent_llm)}) == 3
+        assert get_llm("intent") is primary_intent_llm
+        assert get_llm("intent", alternate_model=True) is alternate_intent_llm
+        assert LLM_MODEL_ID != ALTERNATE_LLM_MODEL_ID
+
+        setup_bedrock_client_mock.assert_called_once()
+        assert setup_llm_mock.call_count == 3
+        assert get_pool_stats()["client_hits"] == 2
+        assert get_pool_stats()["llm_hits"] == 2
+
+    def test_get_bedrock_client_is_shared_across_threads(
+            self, setup_bedrock_client_mock):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(
+                    lambda _: get_bedrock_client(), range(32)))
+
+        assert all(client is clients[0] for client in clients)
+        setup_bedrock_client_mock.assert_called_once()
+        assert get_pool_stats()["client_hits"] == 31
+
+
 class TestSetupBedrockClient:
     @pytest.fixture
     def mock_bedrock_client(self):
@@ -62,7 +237,10 @@ class TestSetupBedrockClient:
 
         mock_bedrock_client.assert_called_once_with(
                 service_name=BEDROCK_SERVICE,
-                region_name=BEDROCK_REGION)
+                region_name=BEDROCK_REGION,
+                config=ANY)
+        config = mock_bedrock_client.call_args.kwargs["config"]
+        assert config.read_timeout == DEADLINE_STAGE_BUDGET_SECONDS["llm"]
         assert bedrock_client == mock_bedrock_client.return_value
 
     def test_setup_bedrock_client_failure(self, mock_bedrock_client):
@@ -121,6 +299,66 @@ class TestSetupLLM:
                 model_id=LLM_MODEL_ID,
                 model_kwargs=self.model_kwargs)
 
+    def test_setup_llm_native_provider(
+            self, bedrock_client, setup_model_kwargs_mock, bedrock_llm_mock):
+        with patch('src.bedrock_wrapper.BEDROCK_CLIENT_PROVIDER', 'native'):
+            llm_instance = setup_llm(bedrock_client, "intent")
+
+        assert isinstance(llm_instance, NativeBedrockLLM)
+        assert llm_instance.model_id == LLM_MODEL_ID
+        assert llm_instance.model_kwargs == self.model_kwargs
+        bedrock_llm_mock.assert_not_called()
+
+    def test_setup_llm_invalid_provider(
+            self, bedrock_client, setup_model_kwargs_mock):
+        with patch('src.bedrock_wrapper.BEDROCK_CLIENT_PROVIDER', 'openai'):
+            with pytest.raises(ValueError) as exc_info:
+                setup_llm(bedrock_client, "intent")
+
+        assert str(exc_info.value) == "Invalid Bedrock client provider."
+
+
+class TestNativeBedrockLLM:
+    @pytest.mark.parametrize("model_id, body, expected", [
+        ("meta.llama3-70b-instruct-v1:0",
+         {"generation": " 3", "stop_reason": "stop"}, " 3"),
+        ("mistral.mixtral-8x7b-instruct-v0:1",
+         {"outputs": [{"text": " 3", "stop_reason": "stop"}]}, " 3"),
+    ])
+    def test_invoke(self, model_id, body, expected):
+        bedrock_client = MagicMock()
+        bedrock_client.invoke_model.return_value = {
+            "body": io.BytesIO(json.dumps(body).encode("utf-8"))
+        }
+        model_kwargs = setup_model_kwargs(model_id, "intent")
+
+        llm = NativeBedrockLLM(bedrock_client, model_id, model_kwargs)
+
+        assert llm.invoke("Which intent?") == expected
+        bedrock_client.invoke_model.assert_called_once_with(
+                modelId=model_id,
+                body=json.dumps({"prompt": "Which intent?", **model_kwargs}),
+                contentType="application/json",
+                accept="application/json")
+
+    def test_build_request_body(self):
+        assert json.loads(build_request_body(
+                "prompt", LLAMA_PARSING_KWARGS)) == {
+            "prompt": "prompt", **LLAMA_PARSING_KWARGS
+        }
+
+    def test_unexpected_response_body(self):
+        with pytest.raises(RuntimeError) as exc_info:
+            parse_response_body("mistral", b'{"generation": "3"}')
+
+        assert str(exc_info.value) == "Unexpected mistral response body."
+
+    def test_invalid_model_id(self):
+        with pytest.raises(ValueError) as exc_info:
+            get_model_provider("unicorn")
+
+        assert str(exc_info.value) == "Invalid model ID."
+
 
 class TestSetupModelKwargs:
     @pytest.mark.parametrize("model_id, operation_type, expected", [
@@ -149,3 +387,18 @@ class TestSetupModelKwargs:
             setup_model_kwargs("unicorn", "intent")
 
         assert str(exc_info.value) == "Invalid model ID."
+
+
+class TestSetupMaxTokensKwargs:
+    @pytest.mark.parametrize("model_id, expected", [
+        ("mistral.mixtral-8x7b-instruct-v0:1", {"max_tokens": 40}),
+        ("meta.llama3-70b-instruct-v1:0", {"max_gen_len": 40}),
+    ])
+    def test_success(self, model_id, expected):
+        assert setup_max_tokens_kwargs(model_id, 40) == expected
+
+    def test_invalid_model_id(self):
+        with pytest.raises(ValueError) as exc_info:
+            setup_max_tokens_kwargs("unicorn", 40)
+
+        assert str(exc_info.value) == "Invalid model ID."
@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.conversation_state import (SQLiteConversationStateStore,
+                                    get_conversation_state_store,
+                                    hash_messages, load_conversation_state,
+                                    resume_request,
+                                    setup_conversation_state_store)
+from src.models import ConversationState, ExtractRequest, IntentRequest, \
+    Message
+
+
+def create_message(message: str) -> Message:
+    return Message(sender="customer@example.com",
+                   recipient="support@example.com", subject="Booking",
+                   role="customer", message=message)
+
+
+MESSAGES = [create_message(text) for text in ("First", "Second", "Third")]
+INTENT_STATE = ConversationState(
+        conversation_id=1, operation_type="intent",
+        message_hash=hash_messages(MESSAGES)[1], intent="booking")
+PARSING_STATE = ConversationState(
+        conversation_id=1, operation_type="parsing",
+        message_hash=hash_messages(MESSAGES)[1], intent="booking",
+        parameters={"language": "ar", "date": "2024-06-03"})
+
+
+class TestSQLiteConversationStateStore:
+    @pytest.fixture
+    def store(self, tmp_path):
+        return SQLiteConversationStateStore(str(tmp_path / "state.sqlite3"))
+
+    def test_get_missing_state(self, store):
+        assert store.get(1, "intent") is None
+
+    def test_states_are_kept_per_stage(self, store):
+        store.set(INTENT_STATE, ttl_seconds=60)
+        store.set(PARSING_STATE, ttl_seconds=60)
+
+        assert store.get(1, "intent") == INTENT_STATE
+        assert store.get(1, "parsing") == PARSING_STATE
+        assert store.get(2, "intent") is None
+
+    def test_expired_state_is_not_returned(self, store):
+        with patch('src.conversation_state.time.time', return_value=1000.0):
+            store.set(INTENT_STATE, ttl_seconds=60)
+
+        with patch('src.conversation_state.time.time', return_value=1060.0):
+            assert store.get(1, "intent") is None
+
+    def test_clear(self, store):
+        store.set(INTENT_STATE, ttl_seconds=60)
+        store.clear()
+
+        assert store.get(1, "intent") is None
+
+
+class TestConversationStateStoreSetup:
+    def test_disabled_by_default(self):
+        assert get_conversation_state_store() is None
+        assert load_conversation_state(1, "intent") is None
+
+    def test_invalid_backend(self):
+        with pytest.raises(ValueError,
+                           match="Invalid conversation state backend."):
+            setup_conversation_state_store("redis")
+
+    def test_read_errors_are_ignored(self):
+        store = MagicMock()
+        store.get.side_effect = RuntimeError("locked")
+
+        with patch('src.conversation_state.get_conversation_state_store',
+                   return_value=store):
+            assert load_conversation_state(1, "intent") is None
+
+
+class TestResumeRequest:
+    def test_hashes_identify_messages(self):
+        hashes = hash_messages(MESSAGES)
+
+        assert len(set(hashes)) == 3
+        assert hashes == hash_messages(
+                [message.model_copy() for message in MESSAGES])
+
+    def test_sends_new_messages_with_a_summary(self):
+        request = IntentRequest(messages=MESSAGES, intents=[])
+
+        resumed = resume_request(request, hash_messages(MESSAGES),
+                                 INTENT_STATE)
+
+        assert resumed.messages == MESSAGES[2:]
+        assert resumed.output_stringified_messages() == (
+            "Summary of the earlier messages in this conversation: their "
+            f"intent was booking.\n\n{MESSAGES[2]}")
+
+    def test_summary_lists_extracted_values(self):
+        request = ExtractRequest(messages=MESSAGES, data_parameters=[])
+
+        resumed = resume_request(request, hash_messages(MESSAGES),
+                                 PARSING_STATE)
+
+        assert resumed.summary.endswith(
+                '{"language": "ar", "date": "2024-06-03"}')
+
+    @pytest.mark.parametrize("state", [
+        None,
+        INTENT_STATE.model_copy(update={"message_hash": "unknown"}),
+    ])
+    def test_whole_thread_without_a_known_message(self, state):
+        request = IntentRequest(messages=MESSAGES, intents=[])
+
+        assert resume_request(request, hash_messages(MESSAGES),
+                              state) == request
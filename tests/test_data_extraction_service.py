@@ -1,9 +1,18 @@
 import json
+from datetime import date, datetime
+from typing import Optional
 from unittest.mock import patch
 
 import pytest
 
-from src.data_extraction_service import generate_prompt, extract_data
+from src.data_extraction_service import (calculate_repair_budget,
+                                         compile_validation_model,
+                                         extract_data, generate_dynamic_model,
+                                         generate_prompt,
+                                         generate_repair_prompt,
+                                         generate_schema_signature,
+                                         validate_llm_response_fields)
+from src.deadline import Deadline
 from src.models import DataParameter, Message, ExtractRequest
 from tests.test_utilites import VALID_DATA_PARAMETERS, VALID_MESSAGE_LIST
 
@@ -52,6 +61,187 @@ class TestProcessParsing:
         assert result == expected_response
 
 
+    def test_process_parsing_recovers_json_without_retry(
+            self, mock_bedrock_llm):
+        mock_bedrock_llm.return_value.invoke.return_value = (
+            "```json\n{'language': 'ara', 'is_immediate': True,}\n```")
+
+        result = extract_data(parse_request)
+
+        assert result == {"language": "ara", "is_immediate": True}
+        mock_bedrock_llm.return_value.invoke.assert_called_once()
+
+    def test_process_parsing_skips_retry_without_time_left(
+            self, mock_bedrock_llm):
+        mock_bedrock_llm.return_value.invoke.return_value = "{'bad': 'json'"
+        deadline = Deadline.after(30)
+
+        with patch.object(deadline, "can_afford_alternate_model",
+                          return_value=False):
+            result = extract_data(parse_request, deadline=deadline)
+
+        assert "error" in result
+        mock_bedrock_llm.return_value.invoke.assert_called_once()
+
+    def test_process_parsing_hedged(self, mock_bedrock_llm):
+        def invoke(prompt):
+            return '{"language": "ara"}'
+
+        mock_bedrock_llm.return_value.invoke.side_effect = invoke
+
+        with patch('src.data_extraction_service.LLM_HEDGING_ENABLED', True):
+            result = extract_data(parse_request)
+
+        assert result == {"language": "ara"}
+
+
+class TestPartialReprompt:
+    partial_response = {'address': 'Vänortsstråket 80 A',
+                        'customer_id': '234234',
+                        'date': 'next Tuesday',
+                        'duration': 60,
+                        'is_immediate': False,
+                        'language': 'ara',
+                        'time': '14:20:00',
+                        'type': 'physical',
+                        'convey_message': None,
+                        'convey_phone': None,
+                        'video_provider': None}
+
+    @pytest.fixture
+    def mock_bedrock_llm(self):
+        with patch("src.bedrock_wrapper.BedrockLLM") as mock_bedrock_llm:
+            yield mock_bedrock_llm
+
+    @pytest.fixture
+    def reprompt_enabled(self):
+        with patch('src.data_extraction_service.PARTIAL_REPROMPT_ENABLED',
+                   True):
+            yield
+
+    def test_validation_rejects_invalid_and_missing_fields(self):
+        validated, rejected = validate_llm_response_fields(
+                json.dumps(self.partial_response), parse_request)
+
+        assert rejected == {'city': None, 'date': 'next Tuesday'}
+        assert validated['customer_id'] == '234234'
+        assert validated['duration'] == 60
+        assert 'date' not in validated
+        assert 'convey_message' not in validated
+
+    def test_reprompts_only_for_rejected_fields(
+            self, mock_bedrock_llm, reprompt_enabled):
+        mock_bedrock_llm.return_value.invoke.side_effect = [
+            json.dumps(self.partial_response),
+            '{"date": "2024-05-07", "city": "Stockholm"}',
+        ]
+
+        result = extract_data(parse_request)
+
+        assert result['date'] == '2024-05-07'
+        assert result['city'] == 'Stockholm'
+        assert result['customer_id'] == '234234'
+
+        invoke = mock_bedrock_llm.return_value.invoke
+        assert invoke.call_count == 2
+        repair_call = invoke.call_args_list[1]
+        assert repair_call.kwargs == {'max_gen_len': 70}
+        assert '<Rejected Values>\n{"date": "next Tuesday"}' in (
+            repair_call.args[0])
+
+    def test_failed_reprompt_keeps_valid_fields(
+            self, mock_bedrock_llm, reprompt_enabled):
+        mock_bedrock_llm.return_value.invoke.side_effect = [
+            json.dumps(self.partial_response),
+            'Sorry, I cannot find them.',
+        ]
+
+        result = extract_data(parse_request)
+
+        assert 'date' not in result
+        assert result['language'] == 'ara'
+
+    def test_disabled_makes_a_single_call(self, mock_bedrock_llm):
+        mock_bedrock_llm.return_value.invoke.return_value = json.dumps(
+                self.partial_response)
+
+        result = extract_data(parse_request)
+
+        assert 'date' not in result and 'city' not in result
+        mock_bedrock_llm.return_value.invoke.assert_called_once()
+
+    def test_skips_reprompt_without_time_left(
+            self, mock_bedrock_llm, reprompt_enabled):
+        mock_bedrock_llm.return_value.invoke.return_value = json.dumps(
+                self.partial_response)
+        deadline = Deadline.after(30)
+
+        with patch.object(deadline, "can_afford", return_value=False):
+            extract_data(parse_request, deadline=deadline)
+
+        mock_bedrock_llm.return_value.invoke.assert_called_once()
+
+    def test_repair_budget_is_capped(self):
+        assert calculate_repair_budget({'date': None}) == 40
+        assert calculate_repair_budget(
+                {str(key): None for key in range(50)}) == 200
+
+    def test_repair_prompt_lists_only_rejected_parameters(self):
+        prompt = generate_repair_prompt(parse_request, {'date': None})
+
+        assert 'date [date]' in prompt
+        assert 'language [string]' not in prompt
+
+
+class TestPreExtraction:
+    @pytest.fixture
+    def mock_bedrock_llm(self):
+        with patch("src.bedrock_wrapper.BedrockLLM") as mock_bedrock_llm:
+            yield mock_bedrock_llm
+
+    @pytest.fixture(autouse=True)
+    def pre_extraction_enabled(self):
+        with patch('src.data_extraction_service.PRE_EXTRACTION_ENABLED',
+                   True):
+            yield
+
+    def test_pre_extracted_parameters_leave_the_prompt(
+            self, mock_bedrock_llm):
+        mock_bedrock_llm.return_value.invoke.return_value = json.dumps(
+                {'duration': 60, 'type': 'physical'})
+
+        result = extract_data(parse_request)
+
+        prompt = mock_bedrock_llm.return_value.invoke.call_args[0][0]
+        assert 'customer_id [integer]' not in prompt
+        assert 'language [string]' not in prompt
+        assert 'duration [integer]' in prompt
+        assert result == {'duration': 60, 'type': 'physical',
+                          'customer_id': 731264, 'language': 'ara'}
+
+    def test_skips_llm_when_every_parameter_is_pre_extracted(
+            self, mock_bedrock_llm):
+        request = ExtractRequest(
+                messages=parse_request.messages,
+                data_parameters=[
+                    parameter for parameter in parse_request.data_parameters
+                    if parameter.key in ('customer_id', 'language')
+                ])
+
+        result = extract_data(request)
+
+        mock_bedrock_llm.return_value.invoke.assert_not_called()
+        assert result == {'customer_id': 731264, 'language': 'ara'}
+
+    def test_llm_error_is_returned(self, mock_bedrock_llm):
+        mock_bedrock_llm.return_value.invoke.return_value = "no JSON here"
+
+        result = extract_data(parse_request)
+
+        assert 'error' in result
+        assert 'language' not in result
+
+
 class TestGeneratePrompt:
     def test_generate_prompt(self):
         simple_parse_request = ExtractRequest(
@@ -77,3 +267,74 @@ class TestGeneratePrompt:
 
         assert "Test message" in prompt
         assert "Test key" in prompt
+
+    def test_generate_prompt_fits_the_token_budget(self):
+        messages = [
+            Message(sender="customer", recipient="agent", role="customer",
+                    message=text)
+            for text in ("Old message " * 10000, "Latest message")
+        ]
+        parse_request = ExtractRequest(
+                messages=messages, injected_data=[],
+                data_parameters=[DataParameter(
+                        key="Test key", data_type="string",
+                        description="Test description")])
+
+        with patch('src.data_extraction_service.TOKEN_BUDGET_ENABLED', True):
+            prompt = generate_prompt(parse_request)
+
+        assert "Old message" not in prompt
+        assert "Latest message" in prompt
+        assert "Test key" in prompt
+
+
+class TestGenerateDynamicModel:
+    @staticmethod
+    def generate_extract_request(data_parameters):
+        return ExtractRequest(
+                messages=[],
+                data_parameters=[
+                    DataParameter(key=key, data_type=data_type,
+                                  description="")
+                    for key, data_type in data_parameters
+                ]
+        )
+
+    def test_equivalent_schemas_reuse_one_model(self):
+        first_request = self.generate_extract_request(
+                [("customer_id", "integer"), ("date", "date")])
+        second_request = self.generate_extract_request(
+                [("date", " Date "), ("customer_id", "INTEGER")])
+
+        assert generate_dynamic_model(first_request) is (
+            generate_dynamic_model(second_request))
+
+    def test_different_schemas_get_different_models(self):
+        first_request = self.generate_extract_request([("key", "integer")])
+        second_request = self.generate_extract_request([("key", "string")])
+
+        assert generate_dynamic_model(first_request) is not (
+            generate_dynamic_model(second_request))
+
+    def test_schema_signature_is_normalized(self):
+        extract_request = self.generate_extract_request(
+                [("time", " Time"), ("city", "string")])
+
+        assert generate_schema_signature(extract_request) == (
+            ("city", "string"), ("time", "time"))
+
+    @pytest.mark.parametrize("data_type, expected_type", [
+        ("int", int),
+        ("integer", int),
+        ("date", date),
+        ("datetime", datetime),
+        ("boolean", bool),
+        ("string", str),
+        ("points", str),
+        ("appointment_date", str),
+    ])
+    def test_data_types_are_matched_exactly(self, data_type, expected_type):
+        validation_model = compile_validation_model((("key", data_type),))
+
+        assert validation_model.model_fields["key"].annotation == (
+            Optional[expected_type])
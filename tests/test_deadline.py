@@ -0,0 +1,139 @@
+import threading
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from src.deadline import Deadline, DeadlineExceededError, \
+    create_client_config, create_deadline
+
+
+class TestDeadline:
+    @pytest.fixture
+    def clock(self):
+        with patch('src.deadline.time.monotonic', return_value=100.0) as mock:
+            yield mock
+
+    def test_remaining_excludes_reserve(self, clock):
+        deadline = Deadline.after(10, reserve_seconds=3)
+
+        assert deadline.remaining() == 7
+        assert deadline.without_reserve().remaining() == 10
+
+    def test_expired(self, clock):
+        deadline = Deadline.after(10, reserve_seconds=3)
+        clock.return_value = 107.5
+
+        assert deadline.expired()
+        assert deadline.remaining() == 0.0
+        assert not deadline.without_reserve().expired()
+
+    def test_budget_is_capped_by_remaining_time(self, clock):
+        with patch.dict('src.deadline.DEADLINE_STAGE_BUDGET_SECONDS',
+                        {"s3": 5.0, "llm": 30.0}):
+            deadline = Deadline.after(12, reserve_seconds=2)
+
+            assert deadline.budget("s3") == 5.0
+            assert deadline.budget("llm") == 10.0
+
+    def test_invalid_stage(self, clock):
+        with pytest.raises(ValueError) as exc_info:
+            Deadline.after(10).budget("translation")
+
+        assert str(exc_info.value) == "Invalid deadline stage."
+
+    def test_can_afford_alternate_model(self, clock):
+        with patch.dict('src.deadline.ALTERNATE_MODEL_MIN_SECONDS',
+                        {"intent": 3.0, "parsing": 8.0}):
+            deadline = Deadline.after(7, reserve_seconds=2)
+
+            assert deadline.can_afford_alternate_model("intent")
+            assert not deadline.can_afford_alternate_model("parsing")
+
+
+class TestDeadlineRun:
+    def test_run_returns_result(self):
+        assert Deadline.after(10, reserve_seconds=0).run(
+                "llm", lambda value: value * 2, 21) == 42
+
+    def test_run_raises_when_budget_is_exceeded(self):
+        release = threading.Event()
+
+        with patch.dict('src.deadline.DEADLINE_STAGE_BUDGET_SECONDS',
+                        {"llm": 0.01}), \
+                pytest.raises(DeadlineExceededError) as exc_info:
+            Deadline.after(10, reserve_seconds=0).run(
+                    "llm", release.wait, 5)
+
+        release.set()
+        assert "The llm stage exceeded its 0.01s budget." == str(
+                exc_info.value)
+
+    def test_timed_out_stage_keeps_its_slot_until_it_returns(self):
+        release = threading.Event()
+        slots = threading.BoundedSemaphore(1)
+
+        with patch('src.deadline._slots', slots), \
+                patch.dict('src.deadline.DEADLINE_STAGE_BUDGET_SECONDS',
+                           {"llm": 0.01}):
+            with pytest.raises(DeadlineExceededError):
+                Deadline.after(10, reserve_seconds=0).run(
+                        "llm", release.wait, 5)
+
+            assert not slots.acquire(blocking=False)
+            release.set()
+            assert slots.acquire(timeout=5)
+            slots.release()
+
+    def test_runs_in_the_calling_thread_without_a_free_worker(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+
+        with patch('src.deadline._slots', slots), \
+                patch('src.deadline.get_executor') as mock_get_executor:
+            assert Deadline.after(10, reserve_seconds=0).run(
+                    "llm", threading.current_thread) is \
+                threading.current_thread()
+
+        mock_get_executor.assert_not_called()
+
+    def test_run_without_time_left(self):
+        function = MagicMock()
+
+        with pytest.raises(DeadlineExceededError):
+            Deadline.after(1, reserve_seconds=2).run("s3", function)
+
+        function.assert_not_called()
+
+
+class TestCreateClientConfig:
+    def test_timeouts_follow_the_stage_budget(self):
+        with patch.dict('src.deadline.DEADLINE_STAGE_BUDGET_SECONDS',
+                        {"s3": 5.0, "llm": 30.0}), \
+                patch('src.deadline.AWS_CONNECT_TIMEOUT_SECONDS', 2.0):
+            config = create_client_config("llm")
+
+        assert config.connect_timeout == 2.0
+        assert config.read_timeout == 30.0
+        assert config.retries == {"mode": "standard",
+                                  "total_max_attempts": 1}
+
+    def test_invalid_stage(self):
+        with pytest.raises(ValueError) as exc_info:
+            create_client_config("translation")
+
+        assert str(exc_info.value) == "Invalid deadline stage."
+
+
+class TestCreateDeadline:
+    def test_from_lambda_context(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 30000
+
+        with patch('src.deadline.time.monotonic', return_value=100.0):
+            deadline = create_deadline(context)
+
+            assert deadline.without_reserve().remaining() == 30.0
+
+    @pytest.mark.parametrize("context", [None, Mock()])
+    def test_without_remaining_time(self, context):
+        assert create_deadline(context) is None
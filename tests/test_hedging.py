@@ -0,0 +1,104 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from src.hedging import get_hedge_delay, hedged_call
+
+
+@pytest.fixture
+def hedge_delay():
+    def set_delay(operation_type, delay):
+        return patch.dict('src.hedging.LLM_HEDGE_DELAY_SECONDS',
+                          {operation_type: delay})
+    return set_delay
+
+
+def is_valid(result):
+    return result != "invalid"
+
+
+class TestHedgedCall:
+    def test_fast_valid_primary_skips_alternate(self, hedge_delay):
+        calls = []
+
+        def attempt(change_llm):
+            calls.append(change_llm)
+            return "primary"
+
+        with hedge_delay("intent", 5):
+            result = hedged_call(attempt, is_valid, "intent")
+
+        assert result == "primary"
+        assert calls == [False]
+
+    def test_fast_invalid_primary_launches_alternate(self, hedge_delay):
+        def attempt(change_llm):
+            return "alternate" if change_llm else "invalid"
+
+        with hedge_delay("intent", 5):
+            assert hedged_call(attempt, is_valid, "intent") == "alternate"
+
+    def test_slow_primary_is_overtaken_by_alternate(self, hedge_delay):
+        release_primary = threading.Event()
+
+        def attempt(change_llm):
+            if change_llm:
+                return "alternate"
+            release_primary.wait(timeout=5)
+            return "primary"
+
+        with hedge_delay("parsing", 0.01):
+            result = hedged_call(attempt, is_valid, "parsing")
+
+        release_primary.set()
+        assert result == "alternate"
+
+    def test_invalid_alternate_waits_for_primary(self, hedge_delay):
+        alternate_done = threading.Event()
+
+        def attempt(change_llm):
+            if change_llm:
+                alternate_done.set()
+                return "invalid"
+            alternate_done.wait(timeout=5)
+            return "primary"
+
+        with hedge_delay("intent", 0):
+            assert hedged_call(attempt, is_valid, "intent") == "primary"
+
+    def test_both_invalid_returns_alternate_result(self, hedge_delay):
+        with hedge_delay("intent", 0):
+            assert hedged_call(
+                    lambda change_llm: "invalid", is_valid,
+                    "intent") == "invalid"
+
+    def test_failed_primary_falls_back_to_alternate(self, hedge_delay):
+        def attempt(change_llm):
+            if not change_llm:
+                raise RuntimeError("Throttled")
+            return "alternate"
+
+        with hedge_delay("intent", 5):
+            assert hedged_call(attempt, is_valid, "intent") == "alternate"
+
+    def test_both_failing_raises(self, hedge_delay):
+        def attempt(change_llm):
+            raise RuntimeError("Throttled")
+
+        with hedge_delay("intent", 0), pytest.raises(RuntimeError) as exc:
+            hedged_call(attempt, is_valid, "intent")
+
+        assert str(exc.value) == "Throttled"
+
+
+class TestGetHedgeDelay:
+    def test_negative_delay_is_clamped(self, hedge_delay):
+        with hedge_delay("intent", -1):
+            assert get_hedge_delay("intent") == 0.0
+
+    def test_invalid_operation_type(self):
+        with pytest.raises(ValueError) as exc_info:
+            get_hedge_delay("translation")
+
+        assert str(exc_info.value) == "Invalid operation type."
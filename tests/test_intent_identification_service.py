@@ -3,8 +3,9 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from src.config import LLAMA_INTENT_PROMPT_TEMPLATE as PROMPT_TEMPLATE
+from src.config import MISTRAL_INTENT_PROMPT_TEMPLATE, MIXTRAL_8X7B_MODEL_ID
 from src.intent_identification_service import generate_prompt, \
-    identify_intent, validate_llm_response
+    identify_intent, setup_label_model_kwargs, validate_llm_response
 from src.models import Intent
 from tests.test_utilites import generate_validation_error
 
@@ -35,7 +36,8 @@ class TestProcessIntent:
             self, mock_generate_prompt, mock_validate_llm_response,
             mock_prompt_llm):
         validated_llm_response = "valid_intent"
-        operation_type = {'operation_type': 'intent'}
+        operation_type = {'operation_type': 'intent', 'deadline': None,
+                          'model_kwargs': None}
         intent_request = MagicMock()
 
         mock_validate_llm_response.return_value = validated_llm_response
@@ -56,7 +58,8 @@ class TestProcessIntent:
         second_llm_response = "LLM response retry"
         first_validated_llm_response = "invalid_intent"
         second_validated_llm_response = "valid_intent_retry"
-        operation_type = {'operation_type': 'intent'}
+        operation_type = {'operation_type': 'intent', 'deadline': None,
+                          'model_kwargs': None}
         intent_request = MagicMock()
 
         mock_prompt_llm.side_effect = [first_llm_response, second_llm_response]
@@ -65,6 +68,8 @@ class TestProcessIntent:
 
         result = identify_intent(intent_request)
 
+        mock_generate_prompt.assert_any_call(intent_request)
+        mock_generate_prompt.assert_any_call(intent_request, change_llm=True)
         assert mock_prompt_llm.call_count == 2
         mock_prompt_llm.assert_any_call(self.mock_prompt, **operation_type)
         mock_prompt_llm.assert_any_call(
@@ -73,14 +78,15 @@ class TestProcessIntent:
         mock_validate_llm_response.assert_any_call(
                 first_llm_response, intent_request.intents)
         mock_validate_llm_response.assert_any_call(
-                second_llm_response, intent_request.intents)
+                second_llm_response, intent_request.intents, change_llm=True)
         assert result == "valid_intent_retry"
 
     def test_process_intent_invalid_intent_final_failure(
             self, mock_generate_prompt, mock_prompt_llm,
             mock_validate_llm_response):
         validated_llm_response = "invalid_intent"
-        operation_type = {'operation_type': 'intent'}
+        operation_type = {'operation_type': 'intent', 'deadline': None,
+                          'model_kwargs': None}
         intent_request = MagicMock()
 
         mock_prompt_llm.side_effect = [
@@ -95,54 +101,127 @@ class TestProcessIntent:
                 self.mock_prompt, **operation_type, change_llm=True)
         assert mock_validate_llm_response.call_count == 2
         mock_validate_llm_response.assert_called_with(
-                self.mock_llm_response, intent_request.intents)
+                self.mock_llm_response, intent_request.intents,
+                change_llm=True)
         assert result == "invalid_intent"
 
 
+    def test_process_intent_skips_retry_without_time_left(
+            self, mock_generate_prompt, mock_prompt_llm,
+            mock_validate_llm_response):
+        mock_validate_llm_response.return_value = "invalid_intent"
+        deadline = MagicMock()
+        deadline.can_afford_alternate_model.return_value = False
+
+        result = identify_intent(MagicMock(), deadline=deadline)
+
+        assert result == "invalid_intent"
+        mock_prompt_llm.assert_called_once_with(
+                self.mock_prompt, operation_type="intent", deadline=deadline,
+                model_kwargs=None)
+        deadline.can_afford_alternate_model.assert_called_once_with("intent")
+
+    def test_process_intent_hedged(self, mock_generate_prompt):
+        intents = [Intent(id=1, slug="create-booking", description="Book")]
+        intent_request = MagicMock(intents=intents)
+
+        with patch('src.intent_identification_service.LLM_HEDGING_ENABLED',
+                   True), \
+                patch('src.intent_identification_service.prompt_llm',
+                      side_effect=lambda prompt, operation_type, change_llm,
+                      deadline, model_kwargs: "1" if change_llm else "7") \
+                as mock_prompt_llm, \
+                patch.dict('src.hedging.LLM_HEDGE_DELAY_SECONDS',
+                           {"intent": 0}):
+            result = identify_intent(intent_request)
+
+        assert result == "create-booking"
+        mock_prompt_llm.assert_any_call(
+                self.mock_prompt, operation_type="intent", change_llm=True,
+                deadline=None, model_kwargs=None)
+
+    def test_process_intent_answered_by_rule(
+            self, mock_generate_prompt, mock_prompt_llm):
+        intent_request = MagicMock()
+
+        with patch('src.intent_identification_service.INTENT_RULES_ENABLED',
+                   True), \
+                patch('src.intent_identification_service.match_intent_rule',
+                      return_value="other") as mock_match_intent_rule:
+            result = identify_intent(intent_request)
+
+        assert result == "other"
+        mock_match_intent_rule.assert_called_once_with(intent_request)
+        mock_prompt_llm.assert_not_called()
+
+    def test_process_intent_without_matching_rule(
+            self, mock_generate_prompt, mock_prompt_llm,
+            mock_validate_llm_response):
+        mock_validate_llm_response.return_value = "valid_intent"
+
+        with patch('src.intent_identification_service.INTENT_RULES_ENABLED',
+                   True), \
+                patch('src.intent_identification_service.match_intent_rule',
+                      return_value=None):
+            result = identify_intent(MagicMock())
+
+        assert result == "valid_intent"
+        mock_prompt_llm.assert_called_once()
+
+    def test_process_intent_with_shortlist(
+            self, mock_generate_prompt, mock_prompt_llm,
+            mock_validate_llm_response):
+        intent_request = MagicMock()
+        shortlisted_request = MagicMock()
+        mock_validate_llm_response.return_value = "valid_intent"
+
+        with patch('src.intent_identification_service.'
+                   'INTENT_SHORTLIST_ENABLED', True), \
+                patch('src.intent_identification_service.'
+                      'shortlist_intent_request',
+                      return_value=shortlisted_request) as mock_shortlist:
+            result = identify_intent(intent_request)
+
+        assert result == "valid_intent"
+        mock_shortlist.assert_called_once_with(intent_request)
+        mock_generate_prompt.assert_called_once_with(shortlisted_request)
+        mock_validate_llm_response.assert_called_once_with(
+                self.mock_llm_response, shortlisted_request.intents)
+
+
 class TestGeneratePrompt:
     mock_intents = "intents_data"
     mock_messages = "messages_data"
 
-    @pytest.fixture
-    def mock_prompt_template(self):
-        with patch('src.intent_identification_service.PromptTemplate') as mock:
-            yield mock
-
     @pytest.fixture
     def mock_intent_request(self):
         with patch('src.intent_identification_service.IntentRequest') as mock:
+            mock.return_value.output_stringified_intents.return_value = (
+                self.mock_intents)
+            mock.return_value.output_stringified_messages.return_value = (
+                self.mock_messages)
             yield mock
 
-    def test_generate_prompt(self, mock_prompt_template, mock_intent_request):
-        mock_intent_request.return_value.output_stringified_intents \
-            .return_value = self.mock_intents
-        mock_intent_request.return_value.output_stringified_messages \
-            .return_value = self.mock_messages
-
-        mock_prompt_template.return_value.format.return_value = ("Formatted "
-                                                                 "prompt")
-
+    def test_generate_prompt(self, mock_intent_request):
         result = generate_prompt(mock_intent_request.return_value)
 
-        mock_prompt_template.assert_called_once_with(
-                template=PROMPT_TEMPLATE,
-                input_variables=["intent_list", "email_conversation"])
-        mock_prompt_template.return_value.format.assert_called_once_with(
+        assert result == PROMPT_TEMPLATE.format(
                 intent_list=self.mock_intents,
                 email_conversation=self.mock_messages)
 
-        assert result == "Formatted prompt"
+    def test_generate_prompt_for_alternate_model(self, mock_intent_request):
+        with patch('src.bedrock_wrapper.ALTERNATE_LLM_MODEL_ID',
+                   MIXTRAL_8X7B_MODEL_ID):
+            result = generate_prompt(mock_intent_request.return_value,
+                                     change_llm=True)
 
-    def test_generate_prompt_with_error(
-            self, mock_prompt_template, mock_intent_request):
-        mock_intent_output = mock_intent_request.return_value
-        mock_intent_output.output_stringified_intents.return_value = (
-            self.mock_intents)
-        mock_intent_output.output_stringified_messages.return_value = (
-            self.mock_messages)
+        assert result == MISTRAL_INTENT_PROMPT_TEMPLATE.format(
+                intent_list=self.mock_intents,
+                email_conversation=self.mock_messages)
 
-        mock_prompt_template.return_value.format.side_effect = Exception(
-                "Formatting error")
+    def test_generate_prompt_with_error(self, mock_intent_request):
+        mock_intent_request.return_value.output_stringified_intents \
+            .side_effect = Exception("Formatting error")
 
         with pytest.raises(Exception) as exc_info:
             generate_prompt(mock_intent_request.return_value)
@@ -207,3 +286,81 @@ class TestValidateLLMResponse:
         mock_logger.error.assert_called_with(
                 "Failed to validate LLM response: invalid_response")
         assert validated_intent == expected_intent
+
+
+class TestIntentLabelEncoding:
+    intents = [Intent(id=index + 1, slug=f"intent_{index + 1}",
+                      description=f"Intent {index + 1}")
+               for index in range(12)]
+
+    @pytest.fixture(autouse=True)
+    def enable_label_encoding(self):
+        with patch('src.intent_identification_service.'
+                   'INTENT_LABEL_ENCODING_ENABLED', True):
+            yield
+
+    @pytest.fixture
+    def mock_intent_request(self):
+        mock = MagicMock()
+        mock.intents = self.intents
+        mock.output_stringified_messages.return_value = "messages_data"
+        return mock
+
+    def test_generate_prompt_with_mistral_labels(self, mock_intent_request):
+        with patch('src.bedrock_wrapper.ALTERNATE_LLM_MODEL_ID',
+                   MIXTRAL_8X7B_MODEL_ID):
+            result = generate_prompt(mock_intent_request, change_llm=True)
+
+        assert "A = intent_10: Intent 10" in result
+        mock_intent_request.output_stringified_intents.assert_not_called()
+
+    @pytest.fixture
+    def mistral_alternate_model(self):
+        with patch('src.bedrock_wrapper.ALTERNATE_LLM_MODEL_ID',
+                   MIXTRAL_8X7B_MODEL_ID):
+            yield
+
+    def test_validate_llm_response_decodes_label(
+            self, mistral_alternate_model):
+        assert validate_llm_response(" c", self.intents,
+                                     change_llm=True) == "intent_12"
+
+    def test_validate_llm_response_decodes_after_lead_in(
+            self, mistral_alternate_model):
+        assert validate_llm_response("Label: B", self.intents,
+                                     change_llm=True) == "intent_11"
+
+    def test_validate_llm_response_uses_the_answering_family(
+            self, mistral_alternate_model):
+        assert validate_llm_response("12", self.intents) == "intent_12"
+        assert validate_llm_response("12", self.intents,
+                                     change_llm=True) == "invalid_intent"
+
+    def test_validate_llm_response_falls_back_to_a_number(self):
+        assert validate_llm_response("I would say 7.", self.intents) \
+            == "intent_7"
+
+    @patch('src.intent_identification_service.logger')
+    def test_validate_llm_response_invalid_label(self, mock_logger):
+        assert validate_llm_response("z", self.intents) == "invalid_intent"
+        mock_logger.error.assert_called_once_with(
+                "Failed to decode an intent label: z")
+
+    def test_setup_label_model_kwargs_for_small_catalog(
+            self, mock_intent_request):
+        assert setup_label_model_kwargs(mock_intent_request) is None
+
+    def test_setup_label_model_kwargs_for_large_catalog(
+            self, mock_intent_request):
+        mock_intent_request.intents = [
+            Intent(id=index + 1, slug=f"intent_{index + 1}",
+                   description=f"Intent {index + 1}")
+            for index in range(1000)]
+
+        assert setup_label_model_kwargs(mock_intent_request) == {
+            "max_gen_len": 2}
+
+    def test_setup_label_model_kwargs_disabled(self, mock_intent_request):
+        with patch('src.intent_identification_service.'
+                   'INTENT_LABEL_ENCODING_ENABLED', False):
+            assert setup_label_model_kwargs(mock_intent_request) is None
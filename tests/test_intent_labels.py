@@ -0,0 +1,120 @@
+import pytest
+
+from src.intent_labels import IntentLabels, SINGLE_TOKEN_LABELS, \
+    decode_intent_label, generate_two_token_label
+from src.models import Intent
+from src.token_budget import load_tokenizer
+
+
+def create_intents(count: int):
+    return [Intent(id=index + 1, slug=f"intent_{index + 1}",
+                   description=f"Intent {index + 1}")
+            for index in range(count)]
+
+
+class TestIntentLabels:
+    def test_render_llama_labels(self):
+        labels = IntentLabels(create_intents(2), "llama")
+
+        assert labels.max_tokens == 1
+        assert labels.render() == ("1 = intent_1: Intent 1\n"
+                                   "2 = intent_2: Intent 2")
+
+    def test_mistral_labels_continue_with_letters(self):
+        labels = IntentLabels(create_intents(12), "mistral")
+
+        assert labels.max_tokens == 1
+        assert labels.labels[8:] == ["9", "A", "B", "C"]
+
+    def test_labels_are_unique_ignoring_case(self):
+        for family, single_token_labels in SINGLE_TOKEN_LABELS.items():
+            assert len({label.upper() for label in single_token_labels}) \
+                == len(single_token_labels)
+
+    @pytest.mark.parametrize("family", SINGLE_TOKEN_LABELS)
+    def test_labels_are_single_tokens(self, family):
+        # Runs where the tokenizers package and the family's tokenizer
+        # file are available.
+        tokenizer = load_tokenizer(family)
+        if tokenizer is None:
+            pytest.skip(f"The {family} tokenizer is not available.")
+
+        for label in SINGLE_TOKEN_LABELS[family]:
+            assert len(tokenizer.encode(
+                    label, add_special_tokens=False).ids) == 1, label
+
+    def test_decode(self):
+        labels = IntentLabels(create_intents(12), "mistral")
+
+        assert labels.decode(" B") == "intent_11"
+        assert labels.decode("b") == "intent_11"
+        assert labels.decode("3.") == "intent_3"
+        assert labels.decode("Z") is None
+        assert labels.decode("") is None
+
+    @pytest.mark.parametrize("response", [
+        "Label: 5", "Intent 5", "ID = 5", "label: intent 5."])
+    def test_decode_after_lead_in(self, response):
+        labels = IntentLabels(create_intents(12), "llama")
+
+        assert labels.decode(response) == "intent_5"
+
+    def test_large_llama_catalog_uses_two_token_labels(self):
+        labels = IntentLabels(create_intents(1000), "llama")
+
+        assert labels.max_tokens == 2
+        assert labels.labels[-1] == "1000"
+        assert labels.decode("1000") == "intent_1000"
+
+    def test_large_mistral_catalog_uses_two_token_labels(self):
+        count = len(SINGLE_TOKEN_LABELS["mistral"]) + 1
+        labels = IntentLabels(create_intents(count), "mistral")
+
+        assert labels.max_tokens == 2
+        assert len(set(labels.labels)) == count
+        assert all(len(label) == 2 for label in labels.labels)
+        assert labels.decode(labels.labels[-1]) == f"intent_{count}"
+        assert labels.decode(labels.labels[-1].lower()) == f"intent_{count}"
+
+    def test_largest_mistral_catalog_uses_number_labels(self):
+        labels = IntentLabels(create_intents(1000), "mistral")
+
+        assert labels.max_tokens == 4
+        assert labels.labels[-1] == "1000"
+        assert labels.decode("1000") == "intent_1000"
+
+    def test_invalid_family(self):
+        with pytest.raises(ValueError) as exc_info:
+            IntentLabels(create_intents(1), "gpt")
+
+        assert str(exc_info.value) == "Invalid model family."
+
+
+class TestGenerateTwoTokenLabel:
+    def test_letter_pairs(self):
+        assert generate_two_token_label(0) == "AA"
+        assert generate_two_token_label(27) == "BB"
+        assert generate_two_token_label(675) == "ZZ"
+
+
+class TestDecodeIntentLabel:
+    intents = create_intents(12)
+
+    def test_decode_digit_label(self):
+        assert decode_intent_label("7", self.intents, "mistral") == "intent_7"
+
+    def test_decode_mistral_letter_label(self):
+        assert decode_intent_label("A", self.intents, "mistral") \
+            == "intent_10"
+
+    def test_decode_llama_number_label(self):
+        assert decode_intent_label("12", self.intents, "llama") \
+            == "intent_12"
+
+    def test_decode_with_the_answering_family(self):
+        assert decode_intent_label("12", self.intents, "mistral") is None
+        assert decode_intent_label("A", self.intents, "llama") is None
+
+    def test_decode_invalid_label(self):
+        assert decode_intent_label("no intent", self.intents,
+                                   "mistral") is None
@@ -0,0 +1,219 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.intent_rules import IntentRuleEngine, clear_intent_rule_engine, \
+    load_intent_rules, match_intent_rule
+from src.models import Intent, IntentRequest, IntentRuleSet, Message
+
+SLUGS = {"other", "confirm_booking", "cancel_interpreter_booking"}
+
+
+def create_message(subject="Hello", message="Hi there",
+                   sender="customer@example.com", role="customer"):
+    return Message(sender=sender, recipient="support@example.com",
+                   subject=subject, role=role, message=message)
+
+
+def create_engine(rules, min_confidence=0.9):
+    return IntentRuleEngine(IntentRuleSet(version="test", rules=rules),
+                            min_confidence=min_confidence)
+
+
+class TestIntentRuleEngine:
+    def test_pattern_rule_matches(self):
+        engine = create_engine([{
+            "name": "automatic_reply", "intent": "other",
+            "subject": {"patterns": ["^automatic reply"]},
+        }])
+
+        rule = engine.match(create_message(subject="Automatic reply: Hi"),
+                            SLUGS)
+
+        assert rule.name == "automatic_reply"
+
+    def test_keyword_matches_whole_words_only(self):
+        engine = create_engine([{
+            "name": "cancelled", "intent": "cancel_interpreter_booking",
+            "message": {"keywords": ["booking cancelled"]},
+        }])
+
+        assert engine.match(create_message(
+                message="Your booking\ncancelled today."), SLUGS)
+        assert engine.match(create_message(
+                message="Your rebooking cancelledx."), SLUGS) is None
+
+    def test_rule_needs_every_field(self):
+        engine = create_engine([{
+            "name": "system_confirmation", "intent": "confirm_booking",
+            "subject": {"keywords": ["booking confirmation"]},
+            "sender": {"patterns": ["^no-?reply@"]},
+        }])
+
+        assert engine.match(create_message(
+                subject="Booking confirmation"), SLUGS) is None
+        assert engine.match(create_message(
+                subject="Booking confirmation",
+                sender="noreply@example.com"), SLUGS)
+
+    def test_first_rule_in_file_order_wins(self):
+        engine = create_engine([
+            {"name": "first", "intent": "other",
+             "message": {"keywords": ["booking"]}},
+            {"name": "second", "intent": "confirm_booking",
+             "subject": {"keywords": ["confirmation"]}},
+        ])
+
+        rule = engine.match(create_message(subject="Confirmation",
+                                           message="Your booking"), SLUGS)
+
+        assert rule.name == "first"
+
+    def test_later_rule_matches_when_earlier_rule_does_not(self):
+        engine = create_engine([
+            {"name": "first", "intent": "other",
+             "subject": {"keywords": ["refund"]}},
+            {"name": "second", "intent": "confirm_booking",
+             "subject": {"keywords": ["confirmation"]}},
+        ])
+
+        rule = engine.match(create_message(subject="Confirmation"), SLUGS)
+
+        assert rule.name == "second"
+
+    def test_rules_sharing_a_condition_all_match(self):
+        engine = create_engine([
+            {"name": "confirmation", "intent": "confirm_booking",
+             "subject": {"keywords": ["booking confirmation"]},
+             "sender": {"patterns": ["^no-?reply@"]}},
+            {"name": "cancellation", "intent": "cancel_interpreter_booking",
+             "subject": {"keywords": ["booking cancelled"]},
+             "sender": {"patterns": ["^no-?reply@"]}},
+        ])
+
+        rule = engine.match(create_message(subject="Booking cancelled",
+                                           sender="noreply@example.com"),
+                            SLUGS)
+
+        assert rule.name == "cancellation"
+
+    def test_overlapping_conditions_all_match(self):
+        engine = create_engine([
+            {"name": "booking", "intent": "confirm_booking",
+             "subject": {"keywords": ["booking"]},
+             "sender": {"patterns": ["^no-?reply@"]}},
+            {"name": "cancellation", "intent": "cancel_interpreter_booking",
+             "subject": {"keywords": ["booking cancelled"]}},
+        ])
+
+        rule = engine.match(create_message(subject="Booking cancelled"),
+                            SLUGS)
+
+        assert rule.name == "cancellation"
+
+    def test_role_restricts_rule(self):
+        engine = create_engine([{
+            "name": "interpreter_mail", "intent": "other", "roles": ["Agent"],
+            "message": {"keywords": ["hello"]},
+        }])
+
+        assert engine.match(create_message(message="Hello"), SLUGS) is None
+        assert engine.match(create_message(message="Hello", role="agent"),
+                            SLUGS)
+
+    def test_rule_for_intent_outside_catalog_is_skipped(self):
+        engine = create_engine([{
+            "name": "refund", "intent": "refund_request",
+            "subject": {"keywords": ["refund"]},
+        }])
+
+        assert engine.match(create_message(subject="Refund"), SLUGS) is None
+
+    def test_low_confidence_rule_is_not_loaded(self):
+        engine = create_engine([{
+            "name": "newsletter", "intent": "other", "confidence": 0.5,
+            "message": {"keywords": ["unsubscribe"]},
+        }])
+
+        assert engine.rules == []
+        assert engine.match(create_message(message="Unsubscribe"),
+                            SLUGS) is None
+
+    def test_rule_without_conditions(self):
+        with pytest.raises(ValueError) as exc_info:
+            create_engine([{"name": "empty", "intent": "other"}])
+
+        assert str(exc_info.value) == "Invalid intent rule."
+
+    @pytest.mark.parametrize("pattern", ["(unclosed", "(?P<name>x)"])
+    def test_invalid_pattern(self, pattern):
+        with pytest.raises(ValueError) as exc_info:
+            create_engine([{"name": "invalid", "intent": "other",
+                            "subject": {"patterns": [pattern]}}])
+
+        assert str(exc_info.value) == "Invalid intent rule pattern."
+
+
+class TestLoadIntentRules:
+    def test_load_intent_rules(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({
+            "version": "2024.2",
+            "rules": [{"name": "auto", "intent": "other",
+                       "subject": {"patterns": ["^auto"]}}],
+        }))
+
+        engine = load_intent_rules(str(path))
+
+        assert engine.version == "2024.2"
+        assert [rule.name for rule in engine.rules] == ["auto"]
+
+    def test_default_rules_file_loads(self):
+        engine = load_intent_rules()
+
+        assert engine.rules
+        assert engine.match(create_message(
+                subject="Out of office: back on Monday"), SLUGS).intent == (
+            "other")
+
+    @pytest.mark.parametrize("subject, rule_name", [
+        ("Booking confirmation", "system_booking_confirmation"),
+        ("Booking cancelled", "system_booking_cancellation"),
+    ])
+    def test_default_system_booking_rules(self, subject, rule_name):
+        engine = load_intent_rules()
+
+        rule = engine.match(create_message(
+                subject=subject, sender="noreply@bookings.example.com"),
+                SLUGS)
+
+        assert rule.name == rule_name
+
+
+class TestMatchIntentRule:
+    @pytest.fixture(autouse=True)
+    def reset_engine(self):
+        clear_intent_rule_engine()
+        yield
+        clear_intent_rule_engine()
+
+    def create_intent_request(self, subject):
+        return IntentRequest(
+                messages=[create_message(subject="Question"),
+                          create_message(subject=subject)],
+                intents=[Intent(id=1, slug="other", description="Other")])
+
+    @patch('src.intent_rules.set_property')
+    def test_match_intent_rule_records_rule(self, mock_set_property):
+        result = match_intent_rule(self.create_intent_request(
+                "Automatic reply: Question"))
+
+        assert result == "other"
+        mock_set_property.assert_any_call("intent_rule", "automatic_reply")
+
+    def test_match_intent_rule_uses_latest_message(self):
+        intent_request = self.create_intent_request("Question")
+        intent_request.messages[0].subject = "Automatic reply"
+
+        assert match_intent_rule(intent_request) is None
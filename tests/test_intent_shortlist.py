@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.intent_shortlist import IntentIndex, build_intent_index, \
+    generate_catalog_signature, rank_intents, shortlist_intent_request, \
+    shortlist_intents, stem, tokenize
+from src.models import Intent, IntentRequest
+
+INTENTS = [
+    Intent(id=1, slug="request_translation",
+           description="The customer wants a document translated."),
+    Intent(id=2, slug="interpreter_booking",
+           description="The customer wants to book an interpreter."),
+    Intent(id=3, slug="cancel_interpreter_booking",
+           description="The customer cancels a booked interpreter."),
+    Intent(id=4, slug="invoice_question",
+           description="The customer asks about an invoice or payment."),
+    Intent(id=5, slug="password_reset",
+           description="The customer cannot log in to the portal."),
+    Intent(id=6, slug="other",
+           description="Anything that does not match the other intents."),
+]
+
+
+def create_intent_request(message: str,
+                          intents=None) -> IntentRequest:
+    return IntentRequest(
+            messages=[{"sender": "customer@example.com",
+                       "recipient": "support@example.com",
+                       "subject": "Hello", "role": "customer",
+                       "message": message}],
+            intents=INTENTS if intents is None else intents)
+
+
+class TestTokenize:
+    def test_tokenize_drops_stop_words_and_numbers(self):
+        assert tokenize("Please book an interpreter for 10:00") == [
+            "book", "interp"]
+
+    @pytest.mark.parametrize("word", ["translation", "translated",
+                                      "translations", "translator"])
+    def test_stem_shares_prefix(self, word):
+        assert stem(word) == "transl"
+
+    def test_stem_keeps_short_words(self):
+        assert stem("bus") == "bus"
+
+
+class TestIntentIndex:
+    def test_rank_orders_by_score(self):
+        index = IntentIndex([["book", "interp"], ["invoic"], ["book"]])
+
+        assert index.rank(["book", "interp"], 3) == [0, 2]
+
+    def test_rank_leaves_out_unmatched_intents(self):
+        index = IntentIndex([["book"], ["invoic"]])
+
+        assert index.rank(["weather"], 2) == []
+
+    def test_rank_limits_to_top_k(self):
+        index = IntentIndex([["book"], ["book"], ["book"]])
+
+        assert index.rank(["book"], 2) == [0, 1]
+
+    def test_index_is_cached_by_catalog(self):
+        signature = generate_catalog_signature(INTENTS)
+
+        assert build_intent_index(signature) is build_intent_index(
+                generate_catalog_signature(list(INTENTS)))
+
+
+class TestRankIntents:
+    def test_rank_intents_with_scores(self):
+        intent_request = create_intent_request(
+                "Can we book an interpreter or cancel the booked one?")
+
+        ranking = rank_intents(intent_request, top_k=2)
+
+        assert [intent.slug for intent, _ in ranking] == [
+            "cancel_interpreter_booking", "interpreter_booking"]
+        assert ranking[0][1] >= ranking[1][1] > 0
+
+
+class TestShortlistIntents:
+    def test_shortlist_keeps_top_k_and_fallback_in_catalog_order(self):
+        intent_request = create_intent_request(
+                "We were charged twice on the last invoice.")
+
+        result = shortlist_intents(intent_request, top_k=2)
+
+        assert [intent.slug for intent in result] == [
+            "invoice_question", "other"]
+
+    def test_shortlist_keeps_small_catalog(self):
+        intent_request = create_intent_request("Invoice", INTENTS[:3])
+
+        assert shortlist_intents(intent_request, top_k=2) == INTENTS[:3]
+
+    def test_shortlist_keeps_catalog_without_matches(self):
+        intent_request = create_intent_request("Lovely weather today.")
+
+        assert shortlist_intents(intent_request, top_k=2) == INTENTS
+
+
+class TestShortlistIntentRequest:
+    @patch('src.intent_shortlist.INTENT_SHORTLIST_TOP_K', 2)
+    def test_shortlist_intent_request(self):
+        intent_request = create_intent_request(
+                "Please cancel the interpreter booking for tomorrow.")
+
+        result = shortlist_intent_request(intent_request)
+
+        assert [intent.slug for intent in result.intents] == [
+            "interpreter_booking", "cancel_interpreter_booking", "other"]
+        assert result.messages == intent_request.messages
+        assert len(intent_request.intents) == len(INTENTS)
+
+    @patch('src.intent_shortlist.INTENT_SHORTLIST_TOP_K', 10)
+    def test_shortlist_intent_request_unchanged(self):
+        intent_request = create_intent_request("Invoice")
+
+        assert shortlist_intent_request(intent_request) is intent_request
@@ -0,0 +1,128 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.config import LLM_MODEL_ID, MAX_TOKEN_OUTPUT_FOR_JOINT
+from src.bedrock_wrapper import setup_max_tokens_kwargs
+from src.joint_extraction_service import (generate_prompt,
+                                          identify_intent_and_extract_data,
+                                          stringify_intents,
+                                          supports_joint_prompt,
+                                          validate_llm_response)
+from src.models import DataParameter, Intent, IntentRequest, Message
+
+BOOKING = Intent(
+        id=1, slug="booking", description="Book an interpreter.",
+        data_parameters=[
+            DataParameter(key="language", data_type="string",
+                          description="The language to interpret."),
+            DataParameter(key="duration", data_type="int",
+                          description="The length in minutes."),
+        ])
+OTHER = Intent(id=2, slug="other", description="Anything else.",
+               data_parameters=[])
+INTENT_REQUEST = IntentRequest(
+        messages=[Message(sender="customer@example.com",
+                          recipient="support@example.com",
+                          subject="Booking", role="customer",
+                          message="An Arabic interpreter for an hour.")],
+        intents=[BOOKING, OTHER])
+
+
+class TestSupportsJointPrompt:
+    def test_every_intent_carries_parameters(self):
+        assert supports_joint_prompt(INTENT_REQUEST)
+
+    def test_intent_without_parameters(self):
+        request = INTENT_REQUEST.model_copy(update={"intents": [
+            BOOKING, OTHER.model_copy(update={"data_parameters": None})]})
+
+        assert not supports_joint_prompt(request)
+
+    @pytest.mark.parametrize("max_parameters, expected", [(1, False),
+                                                          (2, True)])
+    def test_parameter_limit(self, max_parameters, expected):
+        with patch('src.joint_extraction_service.JOINT_PROMPT_MAX_PARAMETERS',
+                   max_parameters):
+            assert supports_joint_prompt(INTENT_REQUEST) == expected
+
+
+class TestGeneratePrompt:
+    def test_intents_list_their_parameters(self):
+        assert stringify_intents([BOOKING, OTHER]) == (
+            "1 = booking: Book an interpreter.\n"
+            "    - language [string]: The language to interpret.\n"
+            "    - duration [int]: The length in minutes.\n"
+            "2 = other: Anything else.")
+
+    def test_generate_prompt(self):
+        prompt = generate_prompt(INTENT_REQUEST)
+
+        assert stringify_intents(INTENT_REQUEST.intents) in prompt
+        assert "An Arabic interpreter for an hour." in prompt
+        assert '{"intent_id": identified_intent_id,' in prompt
+
+
+class TestValidateLLMResponse:
+    def test_valid_answer(self):
+        validated_answer = validate_llm_response(
+                '{"intent_id": 1, "language": "Arabic",\n'
+                '"duration": "an hour"}', INTENT_REQUEST)
+
+        extract_request, slug, validated, rejected = validated_answer
+        assert slug == "booking"
+        assert extract_request.data_parameters == BOOKING.data_parameters
+        assert validated == {"language": "Arabic"}
+        assert rejected == {"duration": "an hour"}
+
+    @pytest.mark.parametrize("response", [
+        "I think it is a booking.",
+        '{"intent_id": 3}',
+        '{"intent_id": "booking"}',
+        '{"language": "Arabic"}',
+        '{"intent_id": 1, "language": ',
+    ])
+    def test_invalid_answer(self, response):
+        assert validate_llm_response(response, INTENT_REQUEST) is None
+
+    @patch('src.joint_extraction_service.parse_json_response',
+           side_effect=IndexError("string index out of range"))
+    def test_parsing_failure_is_an_invalid_answer(
+            self, mock_parse_json_response):
+        assert validate_llm_response('{"intent_id": 1}',
+                                     INTENT_REQUEST) is None
+
+
+class TestIdentifyIntentAndExtractData:
+    @patch('src.joint_extraction_service.prompt_llm',
+           return_value='{"intent_id": 1, "language": "Arabic", '
+                        '"duration": 60}')
+    def test_single_call_answers_both(self, mock_prompt_llm):
+        assert identify_intent_and_extract_data(INTENT_REQUEST) == (
+            "booking", {"language": "Arabic", "duration": 60})
+
+        mock_prompt_llm.assert_called_once_with(
+                generate_prompt(INTENT_REQUEST), operation_type="parsing",
+                deadline=None,
+                model_kwargs=setup_max_tokens_kwargs(
+                        LLM_MODEL_ID, MAX_TOKEN_OUTPUT_FOR_JOINT))
+
+    @patch('src.joint_extraction_service.prompt_llm',
+           return_value='{"intent_id": 7}')
+    def test_invalid_answer_falls_back(self, mock_prompt_llm):
+        assert identify_intent_and_extract_data(INTENT_REQUEST) is None
+
+    @patch('src.joint_extraction_service.prompt_llm',
+           return_value='{"intent_id": 1, "language": ')
+    def test_truncated_answer_falls_back(self, mock_prompt_llm):
+        assert identify_intent_and_extract_data(INTENT_REQUEST) is None
+
+    @patch('src.joint_extraction_service.INTENT_RULES_ENABLED', True)
+    @patch('src.joint_extraction_service.match_intent_rule',
+           return_value="other")
+    @patch('src.joint_extraction_service.prompt_llm')
+    def test_intent_rule_skips_the_joint_prompt(
+            self, mock_prompt_llm, mock_match_intent_rule):
+        assert identify_intent_and_extract_data(INTENT_REQUEST) is None
+
+        mock_prompt_llm.assert_not_called()
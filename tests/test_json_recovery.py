@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+
+from src.json_recovery import JsonRecoveryError, recover_json_object
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data",
+                           "json_recovery_corpus.json")
+
+with open(CORPUS_PATH, encoding="utf-8") as corpus_file:
+    CORPUS = json.load(corpus_file)
+
+
+class TestRecoverJsonObject:
+    @pytest.mark.parametrize("entry", CORPUS)
+    def test_corpus_responses(self, entry):
+        # Responses are validated with their newlines removed.
+        response = entry["response"].replace("\n", "")
+
+        if entry["expected"] is None:
+            with pytest.raises(JsonRecoveryError):
+                recover_json_object(response)
+        else:
+            assert recover_json_object(response) == (
+                entry["expected"], entry["repairs"])
+
+    def test_recovery_error_is_a_decode_error(self):
+        with pytest.raises(json.JSONDecodeError) as exc_info:
+            recover_json_object('{"city": "Stockholm')
+
+        assert exc_info.value.msg == "Unterminated string"
+
+    def test_unicode_escapes(self):
+        assert recover_json_object(r"{'city': 'G\u00f6teborg'}") == (
+            {"city": "Göteborg"}, ["single_quotes"])
+
+    def test_large_response_is_parsed(self):
+        value = "x" * 100000
+        response = "Result: {'note': '" + value + "', 'flag': True,}"
+
+        assert recover_json_object(response) == (
+            {"note": value, "flag": True},
+            ["single_quotes", "python_literal", "trailing_comma"])
@@ -4,8 +4,10 @@ from unittest.mock import MagicMock, Mock, patch
 import pytest
 from pydantic import ValidationError  # type: ignore
 
+from src.conversation_state import SQLiteConversationStateStore
+from src.deadline import Deadline, DeadlineExceededError
 from src.lambda_handler import handle_intent_request, \
-    handle_extraction_request, lambda_handler, retrieve_data
+    handle_extraction_request, lambda_handler, process_batch, retrieve_data
 from tests.test_utilites import generate_validation_error
 
 
@@ -67,10 +69,10 @@ class TestLambdaHandler:
     @pytest.mark.parametrize(
             "event, mock_handle_request, request_args", [
                 ("intent_event", "mock_handle_intent_request",
-                 (1, {"message": "test"})),
+                 (1, {"message": "test"}, None)),
                 ("extract_event", "mock_handle_extraction_request",
                  ({"message": "test"},
-                  {"conversation_id": 1, "intent": "test"}, 1))
+                  {"conversation_id": 1, "intent": "test"}, 1, None))
             ])
     def test_lambda_handler_success(
             self, request, mock_retrieve_data, event,
@@ -107,10 +109,8 @@ class TestLambdaHandler:
         lambda_handler(intent_event, self.context)
 
         mock_handle_intent_request.assert_called_once_with(
-                conversation_id, s3_payload)
+                conversation_id, s3_payload, None)
         mock_retrieve_data.assert_called_once()
-        mock_handle_intent_request.assert_called_once_with(
-                conversation_id, s3_payload)
         assert "IntentRequest" in str(mock_send_intent_response.call_args_list)
         assert "json_type" in str(mock_send_intent_response.call_args_list)
 
@@ -129,7 +129,7 @@ class TestLambdaHandler:
         lambda_handler(extract_event, self.context)
 
         mock_handle_extraction_request.assert_called_once_with(
-                s3_payload, sqs_body, conversation_id)
+                s3_payload, sqs_body, conversation_id, None)
         mock_retrieve_data.assert_called_once()
         assert "ExtractRequest" in str(
                 mock_send_validation_response.call_args_list)
@@ -144,9 +144,9 @@ class TestLambdaHandler:
 
         lambda_handler(intent_event, self.context)
 
-        mock_retrieve_data.assert_called_once_with(sqs_body)
+        mock_retrieve_data.assert_called_once_with(sqs_body, None)
         mock_send_intent_response.assert_called_once_with(
-                conversation_id, "Test Exception")
+                conversation_id, "Test Exception", deadline=None)
 
     def test_lambda_handler_extract_exception_in_retrieve_data(
             self, mock_retrieve_data, mock_send_validation_response,
@@ -160,9 +160,113 @@ class TestLambdaHandler:
 
         lambda_handler(extract_event, self.context)
 
-        mock_retrieve_data.assert_called_once_with(sqs_body)
+        mock_retrieve_data.assert_called_once_with(sqs_body, None)
         mock_send_validation_response.assert_called_once_with(
-                intent, {"error": exception_message}, conversation_id)
+                intent, {"error": exception_message}, conversation_id,
+                deadline=None)
+
+
+class TestLambdaHandlerDeadline:
+    @pytest.fixture
+    def context(self):
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+        return context
+
+    def test_deadline_is_passed_to_every_stage(
+            self, context, mock_send_intent_response):
+        event = {"Records": [{
+            "body": json.dumps({"conversation_id": 1}),
+            "eventSourceARN": "blabla.s1233-intent.hello"}]}
+
+        with patch('src.lambda_handler.retrieve_data',
+                   return_value={"message": "test"}) as mock_retrieve_data, \
+                patch('src.lambda_handler.handle_intent_request') as \
+                mock_handle_intent_request:
+            lambda_handler(event, context)
+
+        deadline = mock_retrieve_data.call_args.args[1]
+        assert isinstance(deadline, Deadline)
+        assert 0 < deadline.remaining() <= 60
+        mock_handle_intent_request.assert_called_once_with(
+                1, {"message": "test"}, deadline)
+
+    def test_error_response_uses_the_reserved_time(
+            self, context, mock_send_intent_response):
+        event = {"Records": [{
+            "body": json.dumps({"conversation_id": 1}),
+            "eventSourceARN": "blabla.s1233-intent.hello"}]}
+
+        with patch('src.lambda_handler.retrieve_data',
+                   side_effect=DeadlineExceededError("No time left")):
+            lambda_handler(event, context)
+
+        error_deadline = mock_send_intent_response.call_args.kwargs[
+            "deadline"]
+        assert error_deadline.reserve_seconds == 0.0
+        mock_send_intent_response.assert_called_once_with(
+                1, "No time left", deadline=error_deadline)
+
+
+class TestProcessBatch:
+    context = Mock()
+
+    @pytest.fixture
+    def records(self):
+        return [
+            {
+                "messageId": f"message-{index}",
+                "body": json.dumps({"conversation_id": index}),
+                "eventSourceARN": "blabla.s1233-intent.hello"
+            } for index in range(4)
+        ]
+
+    @pytest.fixture
+    def mock_process_record(self):
+        with patch('src.lambda_handler.process_record') as mock:
+            yield mock
+
+    def test_process_batch_processes_every_record(
+            self, records, mock_process_record):
+        failed_message_ids = process_batch(records, self.context)
+
+        assert failed_message_ids == []
+        assert mock_process_record.call_count == len(records)
+        for record in records:
+            mock_process_record.assert_any_call(record, self.context)
+
+    def test_process_batch_isolates_failed_records(
+            self, records, mock_process_record):
+        def fail_odd_conversations(record, context):
+            if json.loads(record["body"])["conversation_id"] % 2:
+                raise RuntimeError("Failed to send intent response")
+
+        mock_process_record.side_effect = fail_odd_conversations
+
+        failed_message_ids = process_batch(records, self.context)
+
+        assert failed_message_ids == ["message-1", "message-3"]
+        assert mock_process_record.call_count == len(records)
+
+    def test_lambda_handler_reports_batch_item_failures(
+            self, records, mock_process_record):
+        mock_process_record.side_effect = [
+            None, RuntimeError("Failure"), None, None]
+
+        with patch('src.lambda_handler.SQS_BATCH_MAX_WORKERS', 1):
+            response = lambda_handler({"Records": records}, self.context)
+
+        assert response == {
+            "batchItemFailures": [{"itemIdentifier": "message-1"}]}
+
+    def test_lambda_handler_malformed_record_is_reported(self):
+        records = [{"messageId": "message-0", "body": "{not-json",
+                    "eventSourceARN": "blabla.s1233-intent.hello"}]
+
+        response = lambda_handler({"Records": records}, self.context)
+
+        assert response == {
+            "batchItemFailures": [{"itemIdentifier": "message-0"}]}
 
 
 class TestRetrieveData:
@@ -189,7 +293,7 @@ class TestRetrieveData:
 
         mock_sqs_message.assert_called_once_with(**sqs_payload)
         mock_retrieve_s3_payload.assert_called_once_with(
-                sqs_payload['payload_path'])
+                sqs_payload['payload_path'], deadline=None)
         assert result_payload == s3_payload
 
     def test_retrieve_data_validation_error(
@@ -213,7 +317,7 @@ class TestRetrieveData:
 
         mock_sqs_message.assert_called_once_with(**sqs_payload)
         mock_retrieve_s3_payload.assert_called_once_with(
-                sqs_payload['payload_path'])
+                sqs_payload['payload_path'], deadline=None)
         assert error_title in str(exc_info.value)
         assert error_type in str(exc_info.value)
         assert str(error_input) in str(exc_info.value)
@@ -234,9 +338,21 @@ class TestHandleIntentDetectionRequest:
 
         mock_intent_request.assert_called_once_with(**s3_payload)
         mock_identify_intent.assert_called_once_with(
-                mock_intent_request.return_value)
+                mock_intent_request.return_value, deadline=None)
         mock_send_intent_response.assert_called_once_with(
-                conversation_id, identified_intent)
+                conversation_id, identified_intent, deadline=None)
+
+    @patch('src.lambda_handler.THREAD_COMPACTION_ENABLED', True)
+    @patch('src.lambda_handler.IntentRequest')
+    @patch('src.lambda_handler.identify_intent', return_value="1")
+    def test_handle_intent_detection_request_compacts_thread(
+            self, mock_identify_intent, mock_intent_request,
+            mock_send_intent_response):
+        handle_intent_request(123, {"data": "value"})
+
+        mock_identify_intent.assert_called_once_with(
+                mock_intent_request.return_value.compact.return_value,
+                deadline=None)
 
 
 class TestHandleExtractionRequest:
@@ -255,6 +371,364 @@ class TestHandleExtractionRequest:
 
         mock_extract_request.assert_called_once_with(**s3_payload)
         mock_extract_data.assert_called_once_with(
-                mock_extract_request.return_value)
+                mock_extract_request.return_value, deadline=None)
+        mock_send_validation_response.assert_called_once_with(
+                sqs_payload["intent"], s3_payload, conversation_id,
+                deadline=None)
+
+
+class TestConversationState:
+    @pytest.fixture(autouse=True)
+    def state_store(self, tmp_path):
+        store = SQLiteConversationStateStore(str(tmp_path / "state.sqlite3"))
+        with patch('src.conversation_state.get_conversation_state_store',
+                   return_value=store):
+            yield store
+
+    @staticmethod
+    def create_payload(*texts, **fields):
+        return {
+            "messages": [
+                {"sender": "customer@example.com",
+                 "recipient": "support@example.com", "subject": "Booking",
+                 "role": "customer", "message": text}
+                for text in texts
+            ],
+            **fields,
+        }
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    def test_intent_is_resumed_after_the_processed_messages(
+            self, mock_identify_intent, mock_send_intent_response):
+        handle_intent_request(1, self.create_payload("First", intents=[]))
+        handle_intent_request(1, self.create_payload("First", intents=[]))
+
+        mock_identify_intent.assert_called_once()
+        mock_send_intent_response.assert_called_with(1, "booking",
+                                                     deadline=None)
+
+        handle_intent_request(
+                1, self.create_payload("First", "Second", intents=[]))
+
+        resumed_request = mock_identify_intent.call_args.args[0]
+        assert [message.message for message in resumed_request.messages] \
+            == ["Second"]
+        assert "their intent was booking" in resumed_request.summary
+
+    @patch('src.lambda_handler.extract_data')
+    def test_extracted_values_carry_over(
+            self, mock_extract_data, mock_send_validation_response):
+        parameters = [{"key": key, "data_type": "string", "description": key}
+                      for key in ("language", "date")]
+        mock_extract_data.side_effect = [{"language": "ar"},
+                                         {"date": "2024-06-03"}]
+
+        handle_extraction_request(
+                self.create_payload("First", data_parameters=parameters),
+                {"intent": "booking"}, 1)
+        handle_extraction_request(
+                self.create_payload("First", "Second",
+                                    data_parameters=parameters),
+                {"intent": "booking"}, 1)
+
+        assert '"language": "ar"' in mock_extract_data.call_args.args[
+                0].summary
+        mock_send_validation_response.assert_called_with(
+                "booking", {"language": "ar", "date": "2024-06-03"}, 1,
+                deadline=None)
+
+    @patch('src.lambda_handler.extract_data', return_value={"date": "today"})
+    def test_values_for_another_intent_do_not_carry_over(
+            self, mock_extract_data, mock_send_validation_response):
+        payload = self.create_payload("First", data_parameters=[])
+
+        handle_extraction_request(payload, {"intent": "booking"}, 1)
+        handle_extraction_request(payload, {"intent": "cancellation"}, 1)
+
+        assert mock_extract_data.call_count == 2
+        assert mock_extract_data.call_args.args[0].summary is None
+
+
+class TestFusedPipeline:
+    @pytest.fixture(autouse=True)
+    def fused_pipeline(self):
+        with patch('src.lambda_handler.FUSED_PIPELINE_ENABLED', True):
+            yield
+
+    @staticmethod
+    def create_payload(data_parameters):
+        return {
+            "messages": [{"sender": "customer@example.com",
+                          "recipient": "support@example.com",
+                          "subject": "Booking", "role": "customer",
+                          "message": "Arabic interpreter on Monday."}],
+            "intents": [{"id": 1, "slug": "booking",
+                         "description": "Book an interpreter.",
+                         "data_parameters": data_parameters}],
+        }
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.lambda_handler.extract_data',
+           return_value={"language": "Arabic"})
+    def test_extracts_parameters_of_the_detected_intent(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        parameters = [{"key": "language", "data_type": "string",
+                       "description": "The language."}]
+
+        handle_intent_request(123, self.create_payload(parameters))
+
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
+        extraction_request = mock_extract_data.call_args.args[0]
+        assert extraction_request.messages == \
+            mock_identify_intent.call_args.args[0].messages
+        assert [parameter.key for parameter in
+                extraction_request.data_parameters] == ["language"]
         mock_send_validation_response.assert_called_once_with(
-                sqs_payload["intent"], s3_payload, conversation_id)
+                "booking", {"language": "Arabic"}, 123, deadline=None)
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.lambda_handler.extract_data')
+    def test_skipped_without_parameters_in_the_payload(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        handle_intent_request(123, self.create_payload(None))
+
+        mock_send_intent_response.assert_called_once()
+        mock_extract_data.assert_not_called()
+        mock_send_validation_response.assert_not_called()
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.lambda_handler.extract_data')
+    def test_skipped_with_empty_parameters_in_the_payload(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        handle_intent_request(123, self.create_payload([]))
+
+        mock_send_intent_response.assert_called_once()
+        mock_extract_data.assert_not_called()
+        mock_send_validation_response.assert_not_called()
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.lambda_handler.extract_data',
+           side_effect=RuntimeError("Bedrock failed"))
+    def test_extraction_error_is_sent_as_validation_error(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        parameters = [{"key": "language", "data_type": "string",
+                       "description": "The language."}]
+
+        handle_intent_request(123, self.create_payload(parameters))
+
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
+        mock_send_validation_response.assert_called_once_with(
+                "booking", {"error": "Bedrock failed"}, 123, deadline=None)
+
+
+class TestSpeculativeExtraction:
+    @pytest.fixture(autouse=True)
+    def speculative_extraction(self, tmp_path):
+        store = SQLiteConversationStateStore(str(tmp_path / "state.sqlite3"))
+        with patch('src.lambda_handler.FUSED_PIPELINE_ENABLED', True), \
+                patch('src.lambda_handler.SPECULATIVE_EXTRACTION_ENABLED',
+                      True), \
+                patch('src.conversation_state.get_conversation_state_store',
+                      return_value=store):
+            yield store
+
+    @staticmethod
+    def create_payload():
+        parameters = [{"key": "language", "data_type": "string",
+                       "description": "The language."}]
+        return {
+            "messages": [{"sender": "customer@example.com",
+                          "recipient": "support@example.com",
+                          "subject": "Booking", "role": "customer",
+                          "message": "Please book an Arabic interpreter."}],
+            "intents": [
+                {"id": 1, "slug": "interpreter_booking",
+                 "description": "The customer wants to book an interpreter.",
+                 "data_parameters": parameters},
+                {"id": 2, "slug": "invoice_question",
+                 "description": "The customer asks about an invoice.",
+                 "data_parameters": parameters},
+            ],
+        }
+
+    @patch('src.lambda_handler.identify_intent',
+           return_value="interpreter_booking")
+    @patch('src.lambda_handler.extract_data',
+           return_value={"language": "Arabic"})
+    def test_hit_reuses_the_speculative_extraction(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response,
+            speculative_extraction):
+        handle_intent_request(123, self.create_payload())
+
+        mock_extract_data.assert_called_once()
+        mock_send_validation_response.assert_called_once_with(
+                "interpreter_booking", {"language": "Arabic"}, 123,
+                deadline=None)
+        assert speculative_extraction.get(
+                123, "parsing").intent == "interpreter_booking"
+
+    @patch('src.lambda_handler.identify_intent',
+           return_value="invoice_question")
+    @patch('src.lambda_handler.extract_data',
+           return_value={"language": "Arabic"})
+    def test_miss_runs_the_extraction_for_the_detected_intent(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response,
+            speculative_extraction):
+        handle_intent_request(123, self.create_payload())
+
+        assert mock_extract_data.call_count == 2
+        mock_send_validation_response.assert_called_once_with(
+                "invoice_question", {"language": "Arabic"}, 123,
+                deadline=None)
+        assert speculative_extraction.get(
+                123, "parsing").intent == "invoice_question"
+
+    @patch('src.lambda_handler.identify_intent',
+           return_value="invoice_question")
+    @patch('src.lambda_handler.extract_data',
+           return_value={"language": "Arabic"})
+    def test_speculation_is_skipped_without_time_left(
+            self, mock_extract_data, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        deadline = Deadline.after(60, 0)
+
+        with patch.object(deadline, 'can_afford_alternate_model',
+                          return_value=False) as mock_can_afford:
+            handle_intent_request(123, self.create_payload(), deadline)
+
+        mock_can_afford.assert_any_call("parsing")
+        mock_extract_data.assert_called_once()
+        mock_send_validation_response.assert_called_once_with(
+                "invoice_question", {"language": "Arabic"}, 123,
+                deadline=deadline)
+
+
+class TestJointPrompt:
+    @pytest.fixture(autouse=True)
+    def joint_prompt(self, tmp_path):
+        store = SQLiteConversationStateStore(str(tmp_path / "state.sqlite3"))
+        with patch('src.lambda_handler.JOINT_PROMPT_ENABLED', True), \
+                patch('src.lambda_handler.supports_joint_prompt',
+                      return_value=True), \
+                patch('src.conversation_state.get_conversation_state_store',
+                      return_value=store):
+            yield store
+
+    @staticmethod
+    def create_payload(data_parameters):
+        return {
+            "messages": [{"sender": "customer@example.com",
+                          "recipient": "support@example.com",
+                          "subject": "Booking", "role": "customer",
+                          "message": "Arabic interpreter on Monday."}],
+            "intents": [{"id": 1, "slug": "booking",
+                         "description": "Book an interpreter.",
+                         "data_parameters": data_parameters}],
+        }
+
+    parameters = [{"key": "language", "data_type": "string",
+                   "description": "The language."}]
+
+    @patch('src.lambda_handler.identify_intent')
+    @patch('src.lambda_handler.identify_intent_and_extract_data',
+           return_value=("booking", {"language": "Arabic"}))
+    def test_joint_answer_sends_both_results(
+            self, mock_joint, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        handle_intent_request(123, self.create_payload(self.parameters))
+
+        assert mock_joint.call_args.args[0].intents[0].slug == "booking"
+        mock_identify_intent.assert_not_called()
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
+        mock_send_validation_response.assert_called_once_with(
+                "booking", {"language": "Arabic"}, 123, deadline=None)
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.lambda_handler.identify_intent_and_extract_data',
+           return_value=None)
+    def test_invalid_joint_answer_falls_back_to_two_steps(
+            self, mock_joint, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        handle_intent_request(123, self.create_payload(self.parameters))
+
+        mock_identify_intent.assert_called_once()
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
+        mock_send_validation_response.assert_not_called()
+
+    @pytest.mark.parametrize("data_parameters", [None, []])
+    @patch('src.lambda_handler.identify_intent_and_extract_data',
+           return_value=("booking", {}))
+    def test_no_validation_post_without_parameters(
+            self, mock_joint, data_parameters, mock_send_intent_response,
+            mock_send_validation_response):
+        handle_intent_request(123, self.create_payload(data_parameters))
+
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
+        mock_send_validation_response.assert_not_called()
+
+    @patch('src.lambda_handler.identify_intent_and_extract_data',
+           return_value=("booking", {"language": "Arabic"}))
+    def test_validation_post_error_is_sent_as_validation_error(
+            self, mock_joint, mock_send_intent_response,
+            mock_send_validation_response):
+        deadline = MagicMock()
+        mock_send_validation_response.side_effect = [
+            RuntimeError("Post failed"), None]
+
+        handle_intent_request(123, self.create_payload(self.parameters),
+                              deadline)
+
+        mock_send_validation_response.assert_called_with(
+                "booking", {"error": "Post failed"}, 123,
+                deadline=deadline.without_reserve.return_value)
+
+    @patch('src.lambda_handler.identify_intent')
+    @patch('src.lambda_handler.identify_intent_and_extract_data',
+           return_value=("booking", {"language": "Arabic"}))
+    def test_state_is_saved_and_reused(
+            self, mock_joint, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response,
+            joint_prompt):
+        handle_intent_request(123, self.create_payload(self.parameters))
+        handle_intent_request(123, self.create_payload(self.parameters))
+
+        mock_joint.assert_called_once()
+        mock_identify_intent.assert_not_called()
+        mock_send_intent_response.assert_called_with(123, "booking",
+                                                     deadline=None)
+        assert joint_prompt.get(123, "intent").intent == "booking"
+        assert joint_prompt.get(123, "parsing").parameters == {
+            "language": "Arabic"}
+
+    @patch('src.lambda_handler.identify_intent', return_value="booking")
+    @patch('src.joint_extraction_service.prompt_llm',
+           return_value='{"intent_id": 1, "date": ')
+    def test_truncated_joint_answer_falls_back_to_two_steps(
+            self, mock_prompt_llm, mock_identify_intent,
+            mock_send_intent_response, mock_send_validation_response):
+        handle_intent_request(123, {
+            "messages": [{"sender": "customer@example.com",
+                          "recipient": "support@example.com",
+                          "subject": "Booking", "role": "customer",
+                          "message": "An interpreter on Monday."}],
+            "intents": [{"id": 1, "slug": "booking",
+                         "description": "Book an interpreter.",
+                         "data_parameters": [
+                             {"key": "date", "data_type": "date",
+                              "description": "The date."}]}],
+        })
+
+        mock_identify_intent.assert_called_once()
+        mock_send_intent_response.assert_called_once_with(
+                123, "booking", deadline=None)
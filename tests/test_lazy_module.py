@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from src.lazy_module import LazyModule
+
+
+class TestLazyModule:
+    def test_loads_on_first_attribute_access(self):
+        lazy_json = LazyModule("json")
+
+        assert not lazy_json.loaded
+        assert lazy_json.dumps({"a": 1}) == '{"a": 1}'
+        assert lazy_json.loaded
+
+    def test_attributes_can_be_patched(self):
+        lazy_json = LazyModule("json")
+
+        with patch.object(lazy_json, "dumps", return_value="patched"):
+            assert lazy_json.dumps({}) == "patched"
+
+        assert lazy_json.dumps({}) == "{}"
+
+    def test_handler_import_keeps_heavy_modules_lazy(self):
+        completed = subprocess.run(
+                [sys.executable, "-c",
+                 "import sys, src.lambda_handler; "
+                 "print(','.join(m for m in ('boto3', 'botocore', "
+                 "'langchain_aws', 'langchain_core', 'requests') "
+                 "if m in sys.modules))"],
+                cwd=os.path.dirname(os.path.dirname(__file__)),
+                capture_output=True, text=True, check=True)
+
+        assert completed.stdout.strip() == ""
@@ -0,0 +1,138 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.llm_cache import (InMemoryCacheBackend, LLMResponseCache,
+                           LocalSharedStore, SQLiteCacheBackend,
+                           generate_cache_key, get_response_cache,
+                           setup_cache_backend)
+
+
+@pytest.fixture(params=["memory", "sqlite", "shared"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        cache_backend = InMemoryCacheBackend(max_entries=2)
+    elif request.param == "sqlite":
+        cache_backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"),
+                                           max_entries=2)
+    else:
+        cache_backend = LocalSharedStore(namespace=str(tmp_path))
+
+    yield cache_backend
+    cache_backend.clear()
+
+
+class TestCacheBackends:
+    def test_get_missing_key(self, backend):
+        assert backend.get("missing") is None
+
+    def test_set_and_get(self, backend):
+        backend.set("key", "response", ttl_seconds=60)
+
+        assert backend.get("key") == "response"
+
+    def test_expired_entry_is_not_returned(self, backend):
+        with patch('src.llm_cache.time.time', return_value=1000.0):
+            backend.set("key", "response", ttl_seconds=60)
+
+        with patch('src.llm_cache.time.time', return_value=1060.0):
+            assert backend.get("key") is None
+
+    def test_clear(self, backend):
+        backend.set("key", "response", ttl_seconds=60)
+        backend.clear()
+
+        assert backend.get("key") is None
+
+
+class TestLRUEviction:
+    @pytest.fixture(params=["memory", "sqlite"])
+    def bounded_backend(self, request, tmp_path):
+        if request.param == "memory":
+            return InMemoryCacheBackend(max_entries=2)
+        return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"),
+                                  max_entries=2)
+
+    def test_least_recently_used_entry_is_evicted(self, bounded_backend):
+        with patch('src.llm_cache.time.time', side_effect=range(1, 10)):
+            bounded_backend.set("first", "1", ttl_seconds=60)
+            bounded_backend.set("second", "2", ttl_seconds=60)
+            bounded_backend.get("first")
+            bounded_backend.set("third", "3", ttl_seconds=60)
+
+            assert bounded_backend.get("second") is None
+            assert bounded_backend.get("first") == "1"
+            assert bounded_backend.get("third") == "3"
+
+
+class TestLocalSharedStore:
+    def test_namespace_is_shared_between_instances(self):
+        first_store = LocalSharedStore(namespace="test-shared")
+        second_store = LocalSharedStore(namespace="test-shared")
+
+        first_store.set("key", "response", ttl_seconds=60)
+
+        assert second_store.get("key") == "response"
+        first_store.clear()
+
+
+class TestLLMResponseCache:
+    def test_stats_per_operation_type(self):
+        response_cache = LLMResponseCache(InMemoryCacheBackend())
+
+        response_cache.get("intent-key", "intent")
+        response_cache.set("intent-key", "2")
+        response_cache.get("intent-key", "intent")
+        response_cache.get("parsing-key", "parsing")
+
+        assert response_cache.get_stats() == {
+            "intent": {"hits": 1, "misses": 1},
+            "parsing": {"hits": 0, "misses": 1},
+        }
+
+    def test_backend_failure_is_a_miss(self):
+        backend = MagicMock()
+        backend.get.side_effect = Exception("Connection refused")
+        backend.set.side_effect = Exception("Connection refused")
+        response_cache = LLMResponseCache(backend)
+
+        assert response_cache.get("key", "intent") is None
+        response_cache.set("key", "response")
+        assert response_cache.get_stats() == {
+            "intent": {"hits": 0, "misses": 1}}
+
+
+class TestGenerateCacheKey:
+    def test_key_ignores_kwarg_order(self):
+        assert generate_cache_key(
+                "model", {"a": 1, "b": 2}, "prompt") == generate_cache_key(
+                "model", {"b": 2, "a": 1}, "prompt")
+
+    @pytest.mark.parametrize("model_id, model_kwargs, prompt", [
+        ("other-model", {"a": 1}, "prompt"),
+        ("model", {"a": 2}, "prompt"),
+        ("model", {"a": 1}, "other prompt"),
+    ])
+    def test_key_depends_on_every_input(self, model_id, model_kwargs, prompt):
+        assert generate_cache_key(model_id, model_kwargs, prompt) != (
+            generate_cache_key("model", {"a": 1}, "prompt"))
+
+
+class TestGetResponseCache:
+    def test_disabled(self):
+        with patch('src.llm_cache.LLM_CACHE_BACKEND', "none"):
+            assert get_response_cache() is None
+
+    def test_enabled_cache_is_reused(self):
+        with patch('src.llm_cache.LLM_CACHE_BACKEND', "memory"), \
+                patch('src.llm_cache._response_cache', None):
+            response_cache = get_response_cache()
+
+            assert isinstance(response_cache.backend, InMemoryCacheBackend)
+            assert get_response_cache() is response_cache
+
+    def test_invalid_backend(self):
+        with pytest.raises(ValueError) as exc_info:
+            setup_cache_backend("unicorn")
+
+        assert str(exc_info.value) == "Invalid LLM cache backend."
@@ -0,0 +1,142 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.bedrock_wrapper import prompt_llm
+from src.lambda_handler import process_record
+from src.metrics import (bind_context, increment, record_invocation,
+                         set_dimension, set_property, span, timed)
+
+
+def read_records(capsys):
+    return [json.loads(line)
+            for line in capsys.readouterr().out.splitlines() if line]
+
+
+class TestRecordInvocation:
+    @pytest.fixture
+    def metrics_enabled(self):
+        with patch('src.metrics.METRICS_ENABLED', True):
+            yield
+
+    def test_disabled_emits_nothing(self, capsys):
+        with record_invocation() as metrics:
+            with span("s3_fetch"):
+                set_dimension("operation_type", "intent")
+
+        assert metrics is None
+        assert capsys.readouterr().out == ""
+
+    def test_emits_emf_record(self, capsys, metrics_enabled):
+        with record_invocation():
+            with span("s3_fetch"):
+                pass
+            with span("llm_primary"):
+                pass
+            set_dimension("operation_type", "intent")
+            set_dimension("model_id", "mistral.mistral-large-2402-v1:0")
+            set_dimension("cache_hit", True)
+            set_property("conversation_id", 1)
+            increment("retries")
+
+        records = read_records(capsys)
+        assert len(records) == 1
+        record = records[0]
+
+        directive = record["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Dimensions"] == [
+            ["operation_type", "model_id", "retry_used", "cache_hit"]]
+        assert {"Name": "s3_fetch", "Unit": "Milliseconds"} in (
+            directive["Metrics"])
+        assert {"Name": "retries", "Unit": "Count"} in directive["Metrics"]
+
+        assert record["operation_type"] == "intent"
+        assert record["model_id"] == "mistral.mistral-large-2402-v1:0"
+        assert record["retry_used"] == "false"
+        assert record["cache_hit"] == "true"
+        assert record["conversation_id"] == 1
+        assert record["retries"] == 1
+        assert record["total"] >= record["s3_fetch"] >= 0
+
+    def test_repeated_spans_accumulate(self, capsys, metrics_enabled):
+        with patch('src.metrics.time.perf_counter',
+                   side_effect=[0.0, 0.0, 0.5, 1.0, 1.25, 2.0]):
+            with record_invocation():
+                with span("validation"):
+                    pass
+                with span("validation"):
+                    pass
+
+        assert read_records(capsys)[0]["validation"] == 750.0
+
+    def test_emits_on_error(self, capsys, metrics_enabled):
+        with pytest.raises(RuntimeError):
+            with record_invocation():
+                raise RuntimeError("Failed")
+
+        assert len(read_records(capsys)) == 1
+
+    def test_invalid_dimension(self, metrics_enabled):
+        with pytest.raises(ValueError) as exc_info:
+            with record_invocation():
+                set_dimension("region", "eu-central-1")
+
+        assert str(exc_info.value) == "Invalid metrics dimension: region."
+
+    def test_bind_context_carries_metrics_to_threads(
+            self, capsys, metrics_enabled):
+        @timed("llm_primary")
+        def attempt():
+            set_dimension("retry_used", True)
+
+        with record_invocation():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(bind_context(attempt)).result()
+
+        record = read_records(capsys)[0]
+        assert record["retry_used"] == "true"
+        assert "llm_primary" in record
+
+    def test_bind_context_disabled_returns_function(self):
+        def attempt():
+            pass
+
+        assert bind_context(attempt) is attempt
+
+    def test_process_record_emits_one_record(self, capsys, metrics_enabled):
+        record = {
+            "messageId": "message-1",
+            "body": json.dumps({"conversation_id": 1}),
+            "eventSourceARN": "blabla.s1233-intent.hello"
+        }
+
+        with patch('src.lambda_handler.retrieve_data', return_value={}), \
+                patch('src.lambda_handler.handle_intent_request'):
+            process_record(record, Mock())
+
+        records = read_records(capsys)
+        assert len(records) == 1
+        assert records[0]["operation_type"] == "intent"
+        assert records[0]["message_id"] == "message-1"
+        assert records[0]["conversation_id"] == 1
+
+    def test_prompt_llm_sets_dimensions(self, capsys, metrics_enabled):
+        llm = Mock()
+        llm.invoke.return_value = "1"
+
+        with patch('src.bedrock_wrapper.get_llm', return_value=llm), \
+                patch('src.bedrock_wrapper.get_response_cache',
+                      return_value=None), \
+                patch('src.bedrock_wrapper.ALTERNATE_LLM_MODEL_ID',
+                      'meta.llama3-70b-instruct-v1:0'):
+            with record_invocation():
+                prompt_llm("prompt", operation_type="intent", change_llm=True)
+
+        record = read_records(capsys)[0]
+        assert record["operation_type"] == "intent"
+        assert record["model_id"] == "meta.llama3-70b-instruct-v1:0"
+        assert record["retry_used"] == "true"
+        assert record["cache_hit"] == "false"
+        assert "llm_retry" in record
@@ -1,4 +1,6 @@
-from src.models import Intent, IntentRequest, Message
+from unittest.mock import patch
+
+from src.models import ExtractRequest, Intent, IntentRequest, Message
 
 
 def test_message_str():
@@ -66,3 +68,43 @@ def test_output_stringified_intents():
         "2 = reduce-costs: Plan to reduce operational costs by 10%."
     )
     assert request.output_stringified_intents() == expected_output
+
+
+def test_compact_removes_quoted_history():
+    request_body = "Can we book an interpreter in Arabic on Monday at 10?"
+    messages = [
+        Message(sender='alice@example.com', recipient='bob@example.com',
+                subject='Booking', role='customer', message=request_body),
+        Message(sender='bob@example.com', recipient='alice@example.com',
+                subject='Re: Booking', role='coordinator',
+                message=f"Which address?\n\nOn Monday, Alice wrote:\n"
+                        f"> {request_body}")
+    ]
+    request = ExtractRequest(messages=messages, data_parameters=[])
+
+    with patch('src.models.set_property') as mock_set_property:
+        compacted = request.compact()
+
+    assert [message.message for message in compacted.messages] == [
+        request_body, "Which address?"]
+    assert compacted.messages[1].subject == 'Re: Booking'
+    assert request.messages[1].message.endswith(request_body)
+    saved = sum(map(len, map(str, messages))) - sum(
+            map(len, map(str, compacted.messages)))
+    mock_set_property.assert_any_call("compaction_saved_characters", saved)
+
+
+def test_compact_keeps_signatures_for_extraction():
+    body = "Please call me back.\n\nBest regards,\nAnna\n070-123 45 67"
+    messages = [Message(sender='alice@example.com',
+                        recipient='bob@example.com', subject='Booking',
+                        role='customer', message=body)]
+
+    with patch('src.models.set_property'):
+        extract_request = ExtractRequest(
+                messages=messages, data_parameters=[]).compact()
+        intent_request = IntentRequest(messages=messages,
+                                       intents=[]).compact()
+
+    assert extract_request.messages[0].message == body
+    assert intent_request.messages[0].message == "Please call me back."
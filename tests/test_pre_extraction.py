@@ -0,0 +1,149 @@
+from datetime import date, datetime
+
+import pytest
+
+from src.models import DataParameter, ExtractRequest, Message
+from src.pre_extraction import extract_dates, extract_emails, \
+    extract_languages, extract_phone_numbers, extract_times, \
+    pre_extract_parameters, remove_parameters, select_unique_value
+
+TODAY = date(2024, 5, 20)
+
+
+def create_extract_request(message, parameters, subject="Booking"):
+    return ExtractRequest(
+            messages=[Message(sender="customer@example.com",
+                              recipient="support@example.com",
+                              subject=subject, role="customer",
+                              message=message)],
+            data_parameters=[
+                DataParameter(key=key, data_type=data_type,
+                              description=description)
+                for key, data_type, description in parameters
+            ])
+
+
+class TestExtractDates:
+    @pytest.mark.parametrize("text, expected", [
+        ("on 2024-06-03", "2024-06-03"),
+        ("den 3.6.2024", "2024-06-03"),
+        ("den 3/6", "2024-06-03"),
+        ("den 3:e juni", "2024-06-03"),
+        ("3 June 2025", "2025-06-03"),
+        ("June 3rd, 2025", "2025-06-03"),
+        ("15 maj", "2025-05-15"),
+        ("idag", "2024-05-20"),
+        ("i morgon", "2024-05-21"),
+        ("the day after tomorrow", "2024-05-22"),
+        ("om 3 dagar", "2024-05-23"),
+        ("på fredag", "2024-05-24"),
+        ("next Monday", "2024-05-27"),
+    ])
+    def test_formats(self, text, expected):
+        assert extract_dates(text, TODAY) == [expected]
+
+    @pytest.mark.parametrize("text", [
+        "3/6", "24/7 support", "i dagarna", "may 2 people attend"])
+    def test_non_dates(self, text):
+        assert extract_dates(text, TODAY) == []
+
+    def test_specific_format_is_read_once(self):
+        assert extract_dates("3 juni 2024", TODAY) == ["2024-06-03"]
+
+    def test_invalid_date(self):
+        assert extract_dates("2024-02-30", TODAY) == [None]
+
+
+class TestExtractTimes:
+    @pytest.mark.parametrize("text, expected", [
+        ("kl 14", "14:00"),
+        ("klockan 9.30", "09:30"),
+        ("at 14:30", "14:30"),
+        ("at 2 pm", "14:00"),
+        ("at 12:15 a.m.", "00:15"),
+    ])
+    def test_formats(self, text, expected):
+        assert extract_times(text, TODAY) == [expected]
+
+    def test_invalid_time(self):
+        assert extract_times("kl 25", TODAY) == [None]
+
+
+class TestExtractOthers:
+    def test_emails(self):
+        assert extract_emails("Write to Anna.Berg@Example.se.",
+                              TODAY) == ["anna.berg@example.se"]
+
+    def test_phone_numbers(self):
+        assert extract_phone_numbers(
+                "Ring 070-123 45 67 or +46 (0)8 123 456 78 on 2024-06-03",
+                TODAY) == ["0701234567", "+46812345678"]
+
+    def test_languages_leave_out_swedish(self):
+        assert extract_languages(
+                "Översättning från svenska till Arabiska", TODAY) == ["ara"]
+
+    def test_select_unique_value(self):
+        assert select_unique_value(["a", "a"]) == "a"
+        assert select_unique_value(["a", "b"]) is None
+        assert select_unique_value([]) is None
+        assert select_unique_value(["a", None]) is None
+
+
+class TestPreExtractParameters:
+    now = datetime(2024, 5, 20, 9, 0)
+
+    def test_fills_unique_values(self):
+        request = create_extract_request(
+                "Vi behöver en tolk i somaliska i morgon kl 10:00. "
+                "Bokningsnummer: 4821.",
+                [("date", "date", "The date."),
+                 ("time", "time", "The time."),
+                 ("booking_number", "integer", "The booking number."),
+                 ("language", "string", "The ISO 639-2 code."),
+                 ("duration", "integer", "The duration in minutes.")])
+
+        assert pre_extract_parameters(request, now=self.now) == {
+            "date": "2024-05-21", "time": "10:00", "booking_number": 4821,
+            "language": "som"}
+
+    def test_leaves_ambiguous_values_to_the_model(self):
+        request = create_extract_request(
+                "Move the booking from 3 June to 5 June.",
+                [("date", "date", "The date.")])
+
+        assert pre_extract_parameters(request, now=self.now) == {}
+
+    def test_leaves_parameters_of_the_same_kind_to_the_model(self):
+        request = create_extract_request(
+                "From 3 June.",
+                [("start_date", "date", "The start."),
+                 ("end_date", "date", "The end.")])
+
+        assert pre_extract_parameters(request, now=self.now) == {}
+
+    def test_ignores_signature_details(self):
+        request = create_extract_request(
+                "Please convey the message.\n\nBest regards\nAnna\n"
+                "070-123 45 67",
+                [("convey_phone", "string", "The phone number.")])
+
+        assert pre_extract_parameters(request, now=self.now) == {}
+
+    def test_language_needs_iso_description(self):
+        request = create_extract_request(
+                "An interpreter in Arabic.",
+                [("language", "string", "The language name.")])
+
+        assert pre_extract_parameters(request, now=self.now) == {}
+
+    def test_remove_parameters(self):
+        request = create_extract_request(
+                "", [("date", "date", "The date."),
+                     ("time", "time", "The time.")])
+
+        result = remove_parameters(request, {"date": "2024-05-21"})
+
+        assert [parameter.key for parameter in result.data_parameters] == [
+            "time"]
+        assert len(request.data_parameters) == 2
@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.config import (LLAMA_3_70B_MODEL_ID, LLAMA_INTENT_PROMPT_TEMPLATE,
+                        LLAMA_PARSING_PROMPT_TEMPLATE,
+                        MISTRAL_PARSING_PROMPT_TEMPLATE,
+                        MIXTRAL_8X7B_MODEL_ID)
+from src.prompt_renderer import (CompiledTemplate, get_compiled_template,
+                                 get_model_family, get_static_prefix_bytes,
+                                 render_prompt)
+
+
+class TestCompiledTemplate:
+    def test_render_matches_str_format(self):
+        compiled_template = CompiledTemplate(LLAMA_PARSING_PROMPT_TEMPLATE)
+        slot_values = {"current_date_time": "2024-05-01 10:00",
+                       "intent_parameters": "key [string]: {braces}",
+                       "email_conversation": "Message: Hej {name}"}
+
+        assert compiled_template.render(**slot_values) == (
+            LLAMA_PARSING_PROMPT_TEMPLATE.format(**slot_values))
+
+    def test_slots_and_static_prefix(self):
+        compiled_template = CompiledTemplate("static {{x}} {first} {second}")
+
+        assert compiled_template.slots == ("first", "second")
+        assert compiled_template.static_prefix == "static {x} "
+        assert compiled_template.static_prefix_bytes == b"static {x} "
+
+    def test_missing_slot(self):
+        with pytest.raises(ValueError) as exc_info:
+            CompiledTemplate("{first} {second}").render(first="value")
+
+        assert str(exc_info.value) == "Missing prompt slot: second."
+
+    def test_format_spec_is_rejected(self):
+        with pytest.raises(ValueError):
+            CompiledTemplate("{value:>10}")
+
+
+class TestRenderPrompt:
+    def test_template_follows_model_family(self):
+        slot_values = {"intent_parameters": "params",
+                       "email_conversation": "conversation",
+                       "current_date_time": "2024-05-01 10:00"}
+
+        assert render_prompt(MIXTRAL_8X7B_MODEL_ID, "parsing",
+                             **slot_values) == (
+            MISTRAL_PARSING_PROMPT_TEMPLATE.format(**slot_values))
+        assert render_prompt(LLAMA_3_70B_MODEL_ID, "parsing",
+                             **slot_values) == (
+            LLAMA_PARSING_PROMPT_TEMPLATE.format(**slot_values))
+
+    def test_current_date_time_is_filled_per_request(self):
+        with patch('src.prompt_renderer.get_current_date_time',
+                   side_effect=["2024-05-01 10:00", "2024-05-02 11:30"]):
+            first_prompt = render_prompt(
+                    LLAMA_3_70B_MODEL_ID, "parsing",
+                    intent_parameters="", email_conversation="")
+            second_prompt = render_prompt(
+                    LLAMA_3_70B_MODEL_ID, "parsing",
+                    intent_parameters="", email_conversation="")
+
+        assert "Today's date and time is\n2024-05-01 10:00." in first_prompt
+        assert "Today's date and time is\n2024-05-02 11:30." in second_prompt
+
+    def test_intent_prompt(self):
+        assert render_prompt(
+                LLAMA_3_70B_MODEL_ID, "intent", intent_list="intents",
+                email_conversation="conversation") == (
+            LLAMA_INTENT_PROMPT_TEMPLATE.format(
+                    intent_list="intents", email_conversation="conversation"))
+
+    def test_invalid_operation_type(self):
+        with pytest.raises(ValueError) as exc_info:
+            get_compiled_template(LLAMA_3_70B_MODEL_ID, "translation")
+
+        assert str(exc_info.value) == "Invalid operation type."
+
+
+def test_static_prefix_bytes_is_compiled_once():
+    assert get_static_prefix_bytes(LLAMA_3_70B_MODEL_ID, "intent") is (
+        get_static_prefix_bytes(LLAMA_3_70B_MODEL_ID, "intent"))
+    assert get_static_prefix_bytes(LLAMA_3_70B_MODEL_ID, "intent") \
+        .startswith(b"\n<|begin_of_text|>")
+
+
+@pytest.mark.parametrize("model_id, expected", [
+    (MIXTRAL_8X7B_MODEL_ID, "mistral"),
+    (LLAMA_3_70B_MODEL_ID, "llama"),
+])
+def test_get_model_family(model_id, expected):
+    assert get_model_family(model_id) == expected
@@ -1,9 +1,20 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
+from botocore.exceptions import ClientError  # type: ignore
 
-from src.s3_wrapper import retrieve_s3_payload
+from src.config import DEADLINE_STAGE_BUDGET_SECONDS
+from src.s3_wrapper import PayloadCache, retrieve_s3_payload
+
+
+@pytest.fixture(autouse=True)
+def payload_cache(tmp_path):
+    cache = PayloadCache(str(tmp_path / "s3-payload-cache"), max_bytes=1024)
+    with patch('src.s3_wrapper._s3_client', None), \
+            patch('src.s3_wrapper.S3_PAYLOAD_CACHE_ENABLED', True), \
+            patch('src.s3_wrapper._payload_cache', cache):
+        yield cache
 
 
 @patch('src.s3_wrapper.boto3.client')
@@ -82,3 +93,134 @@ def test_retrieve_s3_payload_json_loads_failure(mock_boto_client):
         retrieve_s3_payload("/bucket_name/path/to/file.json")
 
     assert str(exc_info.value) == "Failed to decode S3 payload."
+
+
+def generate_s3_object(payload: dict, etag: str) -> dict:
+    mock_body = MagicMock()
+    mock_body.read.return_value = json.dumps(payload).encode()
+    return {"Body": mock_body, "ETag": etag}
+
+
+def generate_not_modified_error() -> ClientError:
+    return ClientError(
+            {"Error": {"Code": "304", "Message": "Not Modified"},
+             "ResponseMetadata": {"HTTPStatusCode": 304}},
+            "GetObject")
+
+
+@patch('src.s3_wrapper.boto3.client')
+def test_retrieve_s3_payload_reuses_client(mock_boto_client):
+    mock_client = mock_boto_client.return_value
+    mock_client.get_object.side_effect = [
+        generate_s3_object({"n": 1}, '"etag-1"'),
+        generate_s3_object({"n": 2}, '"etag-2"')]
+
+    retrieve_s3_payload("/bucket/first.json")
+    retrieve_s3_payload("/bucket/second.json")
+
+    mock_boto_client.assert_called_once_with("s3", config=ANY)
+    assert mock_boto_client.call_args.kwargs["config"].read_timeout == (
+        DEADLINE_STAGE_BUDGET_SECONDS["s3"])
+
+
+@patch('src.s3_wrapper.boto3.client')
+def test_retrieve_s3_payload_not_modified_served_from_cache(
+        mock_boto_client):
+    payload = {"messages": [], "intents": []}
+    mock_client = mock_boto_client.return_value
+    mock_client.get_object.side_effect = [
+        generate_s3_object(payload, '"etag-1"'),
+        generate_not_modified_error()]
+
+    first_result = retrieve_s3_payload("/bucket/conversation/1.json")
+    second_result = retrieve_s3_payload("/bucket/conversation/1.json")
+
+    assert first_result == second_result == payload
+    mock_client.get_object.assert_called_with(
+            Bucket="bucket", Key="conversation/1.json",
+            IfNoneMatch='"etag-1"')
+
+
+@patch('src.s3_wrapper.boto3.client')
+def test_retrieve_s3_payload_modified_object_is_downloaded(mock_boto_client):
+    mock_client = mock_boto_client.return_value
+    mock_client.get_object.side_effect = [
+        generate_s3_object({"version": 1}, '"etag-1"'),
+        generate_s3_object({"version": 2}, '"etag-2"'),
+        generate_not_modified_error()]
+
+    retrieve_s3_payload("/bucket/conversation.json")
+    assert retrieve_s3_payload("/bucket/conversation.json") == {"version": 2}
+    assert retrieve_s3_payload("/bucket/conversation.json") == {"version": 2}
+
+    mock_client.get_object.assert_called_with(
+            Bucket="bucket", Key="conversation.json", IfNoneMatch='"etag-2"')
+
+
+@patch('src.s3_wrapper.boto3.client')
+def test_retrieve_s3_payload_other_client_error(mock_boto_client):
+    mock_client = mock_boto_client.return_value
+    mock_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "Access Denied"},
+             "ResponseMetadata": {"HTTPStatusCode": 403}},
+            "GetObject")
+
+    with pytest.raises(RuntimeError) as exc_info:
+        retrieve_s3_payload("/bucket/conversation.json")
+
+    assert "AccessDenied" in str(exc_info.value)
+
+
+class TestPayloadCache:
+    def test_get_missing_entry(self, payload_cache):
+        assert payload_cache.get("bucket", "missing.json") is None
+
+    def test_put_and_get(self, payload_cache):
+        payload_cache.put("bucket", "key.json", '"etag"', b'{"a": 1}',
+                          {"a": 1})
+
+        assert payload_cache.get("bucket", "key.json") == ('"etag"', {"a": 1})
+
+    def test_hits_do_not_share_the_payload(self, payload_cache):
+        payload = {"messages": [{"message": "Hello"}]}
+        payload_cache.put("bucket", "key.json", '"etag"', b'{}', payload)
+        payload["messages"].clear()
+
+        _, first_hit = payload_cache.get("bucket", "key.json")
+        first_hit["messages"][0]["message"] = "Changed"
+
+        assert payload_cache.get("bucket", "key.json") == (
+            '"etag"', {"messages": [{"message": "Hello"}]})
+
+    def test_least_recently_used_entry_is_evicted(self, payload_cache):
+        body = b"x" * 400
+        payload_cache.put("bucket", "first", '"1"', body, {"n": 1})
+        payload_cache.put("bucket", "second", '"2"', body, {"n": 2})
+        payload_cache.get("bucket", "first")
+        payload_cache.put("bucket", "third", '"3"', body, {"n": 3})
+
+        assert payload_cache.get("bucket", "second") is None
+        assert payload_cache.get("bucket", "first") == ('"1"', {"n": 1})
+        assert payload_cache.get("bucket", "third") == ('"3"', {"n": 3})
+
+    def test_oversized_payload_is_not_cached(self, payload_cache):
+        payload_cache.put("bucket", "key", '"etag"', b"x" * 2048, {})
+
+        assert payload_cache.get("bucket", "key") is None
+
+    def test_index_is_reloaded_from_disk(self, payload_cache):
+        payload_cache.put("bucket", "key.json", '"etag"', b'{"a": 1}',
+                          {"a": 1})
+
+        reloaded_cache = PayloadCache(payload_cache.directory, max_bytes=1024)
+
+        assert reloaded_cache.get("bucket", "key.json") == (
+            '"etag"', {"a": 1})
+
+    def test_clear(self, payload_cache):
+        payload_cache.put("bucket", "key.json", '"etag"', b'{}', {})
+        payload_cache.clear()
+
+        reloaded_cache = PayloadCache(payload_cache.directory, max_bytes=1024)
+        assert payload_cache.get("bucket", "key.json") is None
+        assert reloaded_cache.get("bucket", "key.json") is None
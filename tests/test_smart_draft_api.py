@@ -1,23 +1,37 @@
 from unittest.mock import MagicMock, patch
 
+import asyncio
+import json
+
 import pytest
 from requests import RequestException  # type: ignore
 
-from src.config import SMART_DRAFT_BASE_URL
-from src.smart_draft_api import (generate_api_endpoint, send_intent_response,
-                                 send_validation_response)
+from src.config import (SMART_DRAFT_BASE_URL, SMART_DRAFT_CONNECT_TIMEOUT,
+                        SMART_DRAFT_POOL_SIZE, SMART_DRAFT_READ_TIMEOUTS)
+from src.smart_draft_api import (AsyncSmartDraftClient, close_session,
+                                 generate_api_endpoint, get_session,
+                                 get_timeout, send_intent_response,
+                                 send_validation_response, setup_session)
+
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None
 
 
 class TestSendIntentResponse:
     @pytest.fixture
-    def mock_requests_put(self):
-        with patch('requests.put') as mock:
-            yield mock
+    def mock_session(self):
+        with patch('src.smart_draft_api.get_session') as mock:
+            yield mock.return_value
 
     @pytest.fixture
-    def mock_requests_post(self):
-        with patch('requests.post') as mock:
-            yield mock
+    def mock_requests_put(self, mock_session):
+        return mock_session.put
+
+    @pytest.fixture
+    def mock_requests_post(self, mock_session):
+        return mock_session.post
 
     @pytest.fixture
     def mock_generate_endpoint_url(self):
@@ -87,6 +101,128 @@ class TestSendIntentResponse:
             assert mock_response.status_code == status_code
 
 
+class TestSendValidationResponse:
+    @pytest.fixture
+    def mock_session(self):
+        with patch('src.smart_draft_api.get_session') as mock:
+            yield mock.return_value
+
+    def test_send_validation_response_sends_execution_with_timeouts(
+            self, mock_session):
+        mock_session.post.return_value.json.return_value = {
+            "data": {"missing_parameters": []}}
+
+        send_validation_response("interpreter_booking", {"language": "ara"},
+                                 123)
+
+        assert mock_session.post.call_count == 2
+        validation_call, execution_call = mock_session.post.call_args_list
+        assert validation_call.kwargs["timeout"] == (
+            SMART_DRAFT_CONNECT_TIMEOUT,
+            SMART_DRAFT_READ_TIMEOUTS["validation"])
+        assert execution_call.kwargs["timeout"] == (
+            SMART_DRAFT_CONNECT_TIMEOUT,
+            SMART_DRAFT_READ_TIMEOUTS["execution"])
+        assert execution_call.kwargs["json"] == {
+            "conversation_id": 123,
+            "payload": {"language": "ara"},
+            "generated_response": "Complete."}
+
+
+class TestSession:
+    @pytest.fixture(autouse=True)
+    def reset_session(self):
+        close_session()
+        yield
+        close_session()
+
+    def test_get_session_is_reused(self):
+        with patch('src.smart_draft_api.setup_session',
+                   side_effect=lambda: MagicMock()) as mock_setup_session:
+            first_session = get_session()
+            second_session = get_session()
+
+        assert first_session is second_session
+        mock_setup_session.assert_called_once()
+
+    def test_setup_session_mounts_pooled_adapter(self):
+        session = setup_session()
+
+        for prefix in ("http://", "https://"):
+            adapter = session.get_adapter(prefix + "smart-draft.local")
+            assert adapter._pool_connections == SMART_DRAFT_POOL_SIZE
+            assert adapter._pool_maxsize == SMART_DRAFT_POOL_SIZE
+
+    def test_get_timeout_invalid_endpoint(self):
+        with pytest.raises(ValueError):
+            get_timeout("incorrect")
+
+
+class TestGetTimeout:
+    def test_timeout_is_capped_by_deadline(self):
+        deadline = MagicMock()
+        deadline.remaining.return_value = 1.5
+
+        assert get_timeout("validation", deadline) == (
+            min(SMART_DRAFT_CONNECT_TIMEOUT, 1.5), 1.5)
+
+    def test_no_time_left(self):
+        deadline = MagicMock()
+        deadline.remaining.return_value = 0.0
+
+        with pytest.raises(RuntimeError) as exc_info:
+            get_timeout("execution", deadline)
+
+        assert str(exc_info.value) == (
+            "No time left to call the execution endpoint.")
+
+
+@pytest.mark.skipif(httpx is None, reason="httpx is not installed")
+class TestAsyncSmartDraftClient:
+    @staticmethod
+    def run_with_transport(handler, coroutine_factory):
+        async def run():
+            async with AsyncSmartDraftClient(
+                    transport=httpx.MockTransport(handler)) as client:
+                await coroutine_factory(client)
+
+        asyncio.run(run())
+
+    def test_multiplexed_sends(self):
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append((request.method, request.url.path,
+                                  json.loads(request.content)))
+            return httpx.Response(
+                    200, json={"data": {"missing_parameters": ["city"]}})
+
+        self.run_with_transport(handler, lambda client: asyncio.gather(
+                client.send_intent_response(1, "create-booking"),
+                client.send_validation_response(
+                        "create-booking", {"language": "ara"}, 2)))
+
+        assert sorted(requests_seen) == sorted([
+            ("PUT", "/conversations/1/intent-detected",
+             {"detected_intent": "create-booking"}),
+            ("POST", "/intents/create-booking/validate", {"language": "ara"}),
+            ("POST", "/intents/create-booking/execute",
+             {"conversation_id": 2, "payload": {"language": "ara"},
+              "generated_response": "Incomplete, but we don't care, do we?"}),
+        ])
+
+    def test_send_intent_response_failure(self):
+        def handler(request):
+            return httpx.Response(500)
+
+        with pytest.raises(RuntimeError) as exc_info:
+            self.run_with_transport(
+                    handler,
+                    lambda client: client.send_intent_response(1, "other"))
+
+        assert "Failed to send intent response" in str(exc_info.value)
+
+
 class TestGenerateAPIEndpoint:
     @pytest.mark.parametrize("endpoint, intent, conversation_id, expected", [
         ("intent-detection", None, 123,
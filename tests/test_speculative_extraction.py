@@ -0,0 +1,211 @@
+import threading
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.config import MAX_TOKEN_OUTPUT_FOR_PARSING
+from src.data_extraction_service import generate_prompt
+from src.deadline import Deadline
+from src.models import DataParameter, ExtractRequest, Intent, \
+    IntentRequest, Message
+from src.speculative_extraction import (SpendLimiter, estimate_tokens,
+                                        get_speculation_stats,
+                                        resolve_speculation,
+                                        select_candidates,
+                                        start_speculative_extraction)
+from src.token_budget import count_tokens
+
+LANGUAGE = DataParameter(key="language", data_type="string",
+                         description="The language to interpret.")
+BOOKING = Intent(id=1, slug="interpreter_booking",
+                 description="The customer wants to book an interpreter.",
+                 data_parameters=[LANGUAGE])
+CANCELLATION = Intent(id=2, slug="cancel_interpreter_booking",
+                      description="The customer cancels a booked "
+                                  "interpreter.",
+                      data_parameters=[LANGUAGE])
+INVOICE = Intent(id=3, slug="invoice_question",
+                 description="The customer asks about an invoice.",
+                 data_parameters=[])
+INTENT_REQUEST = IntentRequest(
+        messages=[Message(sender="customer@example.com",
+                          recipient="support@example.com",
+                          subject="Booking", role="customer",
+                          message="Please book an Arabic interpreter.")],
+        intents=[BOOKING, CANCELLATION, INVOICE])
+
+
+def create_future(result=None, error=None) -> Future:
+    future: Future = Future()
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+    return future
+
+
+@pytest.fixture(autouse=True)
+def speculation_state():
+    stats = {"launched": 0, "skipped": 0, "hits": 0, "misses": 0}
+    with patch('src.speculative_extraction._slots',
+               threading.BoundedSemaphore(2)), \
+            patch('src.speculative_extraction._spend_limiter',
+                  SpendLimiter(100000)), \
+            patch('src.speculative_extraction._stats', stats):
+        yield
+
+
+class TestSpendLimiter:
+    def test_spend_within_the_limit(self):
+        limiter = SpendLimiter(1000)
+
+        assert limiter.try_spend(600)
+        assert not limiter.try_spend(600)
+        assert limiter.try_spend(400)
+
+    def test_window_frees_old_spend(self):
+        limiter = SpendLimiter(1000, window_seconds=60)
+
+        with patch('src.speculative_extraction.time.monotonic',
+                   return_value=100.0):
+            assert limiter.try_spend(1000)
+
+        with patch('src.speculative_extraction.time.monotonic',
+                   return_value=159.0):
+            assert not limiter.try_spend(1)
+
+        with patch('src.speculative_extraction.time.monotonic',
+                   return_value=160.0):
+            assert limiter.try_spend(1000)
+
+
+class TestSelectCandidates:
+    def test_top_intents_with_parameters(self):
+        assert select_candidates(INTENT_REQUEST) == [BOOKING, CANCELLATION]
+
+    def test_intents_without_parameters_are_skipped(self):
+        request = INTENT_REQUEST.model_copy(update={"intents": [
+            BOOKING.model_copy(update={"data_parameters": None}),
+            CANCELLATION, INVOICE]})
+
+        assert select_candidates(request) == [CANCELLATION]
+
+    @patch('src.speculative_extraction.SPECULATIVE_EXTRACTION_TOP_K', 1)
+    @patch('src.speculative_extraction.SPECULATIVE_EXTRACTION_MIN_SCORE_SHARE',
+           0.9)
+    def test_unclear_ranking_is_not_speculated_on(self):
+        assert select_candidates(INTENT_REQUEST) == []
+
+    def test_no_matching_intent(self):
+        request = INTENT_REQUEST.model_copy(update={"messages": [
+            INTENT_REQUEST.messages[0].model_copy(
+                    update={"subject": "Hello",
+                            "message": "Lovely weather today."})]})
+
+        assert select_candidates(request) == []
+
+
+class TestStartSpeculativeExtraction:
+    def test_extracts_each_candidate(self):
+        futures = start_speculative_extraction(
+                INTENT_REQUEST, lambda intent: {"slug": intent.slug})
+
+        assert {slug: future.result() for slug, future in futures.items()} \
+            == {"interpreter_booking": {"slug": "interpreter_booking"},
+                "cancel_interpreter_booking": {
+                    "slug": "cancel_interpreter_booking"}}
+        assert get_speculation_stats()["launched"] == 2
+
+    @patch('src.speculative_extraction._slots', threading.BoundedSemaphore(1))
+    def test_concurrency_cap(self):
+        release = threading.Event()
+
+        futures = start_speculative_extraction(
+                INTENT_REQUEST, lambda intent: release.wait(5))
+        release.set()
+
+        assert list(futures) == ["interpreter_booking"]
+        assert get_speculation_stats()["skipped"] == 1
+
+    def test_slots_are_freed(self):
+        for _ in range(3):
+            futures = start_speculative_extraction(INTENT_REQUEST,
+                                                   lambda intent: {})
+            for future in futures.values():
+                future.result()
+
+        assert get_speculation_stats()["launched"] == 6
+
+    @patch('src.speculative_extraction._spend_limiter', SpendLimiter(0))
+    def test_spend_limit(self):
+        futures = start_speculative_extraction(INTENT_REQUEST,
+                                               lambda intent: {})
+
+        assert futures == {}
+        assert get_speculation_stats()["skipped"] == 2
+
+    def test_skipped_without_time_for_a_parsing_call(self):
+        extract = MagicMock()
+
+        futures = start_speculative_extraction(
+                INTENT_REQUEST, extract, Deadline.after(1, 0))
+
+        assert futures == {}
+        extract.assert_not_called()
+        assert get_speculation_stats()["skipped"] == 2
+
+    def test_runs_with_time_for_a_parsing_call(self):
+        futures = start_speculative_extraction(
+                INTENT_REQUEST, lambda intent: {}, Deadline.after(60, 0))
+
+        assert len(futures) == 2
+        assert get_speculation_stats()["launched"] == 2
+
+
+class TestEstimateTokens:
+    @patch('src.data_extraction_service.resolve_model_id',
+           return_value="mistral.mistral-7b-instruct-v0:2")
+    def test_counts_the_parsing_prompt_and_answer(self,
+                                                  mock_resolve_model_id):
+        prompt = generate_prompt(ExtractRequest(
+                messages=INTENT_REQUEST.messages,
+                data_parameters=BOOKING.data_parameters))
+
+        assert estimate_tokens(
+                INTENT_REQUEST, BOOKING,
+                "mistral.mistral-7b-instruct-v0:2") == (
+            count_tokens(prompt, "mistral") + MAX_TOKEN_OUTPUT_FOR_PARSING)
+
+    @patch('src.speculative_extraction.render_prompt', return_value="")
+    @patch('src.data_extraction_service.generate_prompt')
+    def test_does_not_render_the_timed_prompt(
+            self, mock_generate_prompt, mock_render_prompt):
+        start_speculative_extraction(INTENT_REQUEST, lambda intent: {})
+
+        mock_generate_prompt.assert_not_called()
+        assert mock_render_prompt.call_count == 2
+
+
+class TestResolveSpeculation:
+    def test_hit_returns_the_detected_intent_extraction(self):
+        other: Future = Future()
+        futures = {"interpreter_booking": create_future({"language": "ar"}),
+                   "cancel_interpreter_booking": other}
+
+        assert resolve_speculation(futures, "interpreter_booking") == {
+            "language": "ar"}
+        assert other.cancelled()
+        assert get_speculation_stats()["hits"] == 1
+
+    def test_miss(self):
+        futures = {"interpreter_booking": create_future({"language": "ar"})}
+
+        assert resolve_speculation(futures, "invoice_question") is None
+        assert get_speculation_stats()["misses"] == 1
+
+    def test_failed_extraction_is_ignored(self):
+        futures = {"interpreter_booking": create_future(
+                error=RuntimeError("Bedrock failed"))}
+
+        assert resolve_speculation(futures, "interpreter_booking") is None
@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.stream_scanner import (IntegerScanner, JsonObjectScanner,
+                                LabelScanner, create_scanner,
+                                read_until_complete)
+
+
+class TestJsonObjectScanner:
+    @pytest.mark.parametrize("chunks, expected", [
+        (['Sure: {"city": ', '"Stockholm"}', ' Let me explain'],
+         'Sure: {"city": "Stockholm"}'),
+        (['{"a": {"b": 1}', ', "c": 2} trailing'],
+         '{"a": {"b": 1}, "c": 2}'),
+        (['{"note": "a } and { in ', 'a string", "x": "\\""}', '}'],
+         '{"note": "a } and { in a string", "x": "\\""}'),
+        (["{'a': '}'}", " and {'b': 1}"], "{'a': '}'}"),
+        (["{'a': 'it\\'s {', ", '"b": "don\'t"}', '}'],
+         "{'a': 'it\\'s {', \"b\": \"don't\"}"),
+    ])
+    def test_stops_after_first_object(self, chunks, expected):
+        response, stopped_early = read_until_complete(
+                iter(chunks), JsonObjectScanner())
+
+        assert response == expected
+        assert stopped_early
+
+    def test_incomplete_object_reads_whole_stream(self):
+        response, stopped_early = read_until_complete(
+                iter(['{"city": ', '"Stockholm"']), JsonObjectScanner())
+
+        assert response == '{"city": "Stockholm"'
+        assert not stopped_early
+
+    def test_braces_before_the_object_start_nothing(self):
+        scanner = JsonObjectScanner()
+
+        assert scanner.feed('} "{" ') is None
+        assert not scanner.complete
+
+
+class TestIntegerScanner:
+    def test_stops_after_first_integer(self):
+        chunks = iter([" Intent", " 1", "2", " because", " the"])
+
+        response, stopped_early = read_until_complete(
+                chunks, IntegerScanner())
+
+        assert response == " Intent 12"
+        assert stopped_early
+        assert list(chunks) == [" the"]
+
+    def test_integer_at_end_of_stream(self):
+        assert read_until_complete(
+                iter(["4", "2"]), IntegerScanner()) == ("42", False)
+
+
+class TestLabelScanner:
+    def test_stops_after_letter_label(self):
+        chunks = iter([" B", "\n", "The customer", " wants"])
+
+        response, stopped_early = read_until_complete(
+                chunks, LabelScanner())
+
+        assert response == " B"
+        assert stopped_early
+        assert list(chunks) == ["The customer", " wants"]
+
+    def test_skips_lead_in(self):
+        chunks = iter(["Lab", "el: 1", "2 because", " the"])
+
+        assert read_until_complete(chunks, LabelScanner()) == (
+            "Label: 12", True)
+
+    def test_label_at_end_of_stream(self):
+        assert read_until_complete(
+                iter(["A", "B"]), LabelScanner()) == ("AB", False)
+
+
+class TestCreateScanner:
+    def test_scanner_per_operation_type(self):
+        assert isinstance(create_scanner("intent"), IntegerScanner)
+        assert isinstance(create_scanner("parsing"), JsonObjectScanner)
+
+    @patch('src.stream_scanner.INTENT_LABEL_ENCODING_ENABLED', True)
+    def test_label_scanner_with_label_encoding(self):
+        assert isinstance(create_scanner("intent"), LabelScanner)
+
+    def test_invalid_operation_type(self):
+        with pytest.raises(ValueError) as exc_info:
+            create_scanner("translation")
+
+        assert str(exc_info.value) == "Invalid operation type."
@@ -0,0 +1,103 @@
+import pytest
+
+from src.thread_compaction import compact_bodies, html_to_text, \
+    normalize_whitespace, split_quoted_history, strip_disclaimers, \
+    strip_signature
+
+REQUEST = ("Hej!\n\nVi behöver en tolk i arabiska den 3 juni kl 10.\n"
+           "Adressen är Storgatan 5.\n\nMed vänlig hälsning\nAnna Berg\n"
+           "070-123 45 67")
+QUOTED_REQUEST = "\n".join(f"> {line}" for line in REQUEST.splitlines())
+
+
+class TestCompactBodies:
+    def test_removes_quoted_history_present_in_thread(self):
+        reply = ("Hej Anna,\n\nVi har bokat en tolk.\n\nDen 1 juni 2024 "
+                 "kl. 09:12 skrev Anna Berg <anna@example.se>:\n"
+                 f"{QUOTED_REQUEST}")
+
+        assert compact_bodies([REQUEST, reply]) == [
+            "Hej!\n\nVi behöver en tolk i arabiska den 3 juni kl 10.\n"
+            "Adressen är Storgatan 5.",
+            "Hej Anna,\n\nVi har bokat en tolk.",
+        ]
+
+    def test_removes_outlook_quoted_history(self):
+        reply = ("Vi har bokat en tolk.\n\nFrom: Anna Berg\nSent: 1 June\n"
+                 f"To: Support\nSubject: Tolk\n\n{REQUEST}")
+
+        assert compact_bodies([REQUEST, reply])[1] == "Vi har bokat en tolk."
+
+    def test_keeps_forwarded_content_missing_from_thread(self):
+        forward = ("FYI\n\n---------- Forwarded message ---------\n"
+                   "From: Clinic\nDate: 2 June\n\nPatienten behöver även en "
+                   "tolk i somaliska på fredag förmiddag.")
+
+        assert compact_bodies([REQUEST, forward])[1] == forward
+
+    def test_removes_covered_inline_quotes_only(self):
+        reply = ("> Vi behöver en tolk i arabiska den 3 juni kl 10.\n"
+                 "Det blir kl 11.\n"
+                 "> En fråga som inte finns någon annanstans i tråden.")
+
+        assert compact_bodies([REQUEST, reply])[1] == (
+            "Det blir kl 11.\n"
+            "> En fråga som inte finns någon annanstans i tråden.")
+
+    def test_keeps_signatures_when_asked(self):
+        assert compact_bodies([REQUEST], strip_signatures=False) == [REQUEST]
+
+    def test_strips_signature_before_disclaimer(self):
+        body = (f"{REQUEST}\n\nCONFIDENTIALITY NOTICE: This e-mail is "
+                "confidential.\n" + "Do not forward it.\n" * 10)
+
+        assert compact_bodies([body]) == [
+            "Hej!\n\nVi behöver en tolk i arabiska den 3 juni kl 10.\n"
+            "Adressen är Storgatan 5."]
+
+    def test_single_message_is_only_cleaned(self):
+        assert compact_bodies(["  Hej!\r\n\r\n\r\n\r\nTack  "]) == [
+            "Hej!\n\nTack"]
+
+
+class TestCompactionSteps:
+    def test_html_to_text(self):
+        assert html_to_text(
+                "<html><head><style>p {}</style></head><body><p>Hej&nbsp;"
+                "Anna</p>Tack<br>Vi ses</body></html>") == (
+            "Hej\xa0Anna\nTack\nVi ses")
+
+    def test_plain_text_is_not_treated_as_html(self):
+        assert html_to_text("a < b and c > d") == "a < b and c > d"
+
+    def test_split_quoted_history(self):
+        text = "Svar.\nOn Mon, 3 Jun 2024, Anna <\nanna@example.se> wrote:\n> Hi"
+
+        assert split_quoted_history(text) == (
+            "Svar.\n",
+            "On Mon, 3 Jun 2024, Anna <\nanna@example.se> wrote:\n> Hi")
+
+    @pytest.mark.parametrize("closing", [
+        "Med vänlig hälsning", "Vänliga hälsningar", "Mvh Anna",
+        "Best regards,", "--"])
+    def test_strip_signature(self, closing):
+        assert strip_signature(f"Call me on Monday.\n\n{closing}\nAnna\n"
+                               "070-123 45 67") == "Call me on Monday.\n\n"
+
+    @pytest.mark.parametrize("text", [
+        "Regards to your team, we need the interpreter at 10.\nAnna",
+        "Best regards from all of us at the clinic and thanks for the "
+        "help.\nAnna",
+        "Best regards,\nAnna\n\n" + "Also, the address is new.\n" * 8,
+    ])
+    def test_keeps_closing_phrases_outside_signature(self, text):
+        assert strip_signature(text) == text
+
+    def test_strip_disclaimers(self):
+        assert strip_disclaimers(
+                "Hej!\n\nSkickat från min iPhone\n\nCONFIDENTIALITY NOTICE: "
+                "This e-mail is confidential.") == "Hej!"
+
+    def test_normalize_whitespace(self):
+        assert normalize_whitespace(
+                "​Hej\xa0 \t Anna \n\n\n\n Tack ") == "Hej Anna\n\nTack"
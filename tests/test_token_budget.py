@@ -0,0 +1,141 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.config import LLAMA_3_70B_MODEL_ID, MIXTRAL_8X7B_MODEL_ID
+from src.models import IntentRequest, Message
+from src.token_budget import approximate_tokens, count_tokens, fit_prompt, \
+    get_input_token_budget, load_tokenizer, record_token_usage, \
+    trim_messages, truncate_message
+
+
+def create_message(role: str, message: str) -> Message:
+    return Message(sender="sender@example.com",
+                   recipient="support@example.com", subject="Booking",
+                   role=role, message=message)
+
+
+def render(request: IntentRequest) -> str:
+    return f"Classify:\n{request.output_stringified_messages()}"
+
+
+class TestCountTokens:
+    @pytest.mark.parametrize("text, family, expected", [
+        ("", "llama", 0),
+        ("Hello, world!", "llama", 4),
+        ("interpretation", "llama", 4),
+        ("interpretation", "mistral", 5),
+        ("0701234567", "llama", 4),
+        ("0701234567", "mistral", 10),
+        ("<|eot_id|>", "llama", 5),
+        ('{"date": "2024-06-03"}', "llama", 11),
+    ])
+    def test_approximate_tokens(self, text, family, expected):
+        assert approximate_tokens(text, family) == expected
+
+    def test_invalid_family(self):
+        with pytest.raises(ValueError, match="Invalid model family."):
+            approximate_tokens("text", "gpt")
+
+    def test_exact_tokenizer_is_used_when_available(self):
+        tokenizer = MagicMock()
+        tokenizer.encode.return_value.ids = [1, 2, 3]
+
+        with patch("src.token_budget.load_tokenizer",
+                   return_value=tokenizer):
+            assert count_tokens("Hello, world!", "llama") == 3
+
+        tokenizer.encode.assert_called_once_with("Hello, world!",
+                                                 add_special_tokens=False)
+
+    def test_no_tokenizer_without_a_path(self):
+        load_tokenizer.cache_clear()
+
+        with patch.dict("src.token_budget.TOKENIZER_PATHS", {"llama": ""}):
+            assert load_tokenizer("llama") is None
+
+        load_tokenizer.cache_clear()
+
+
+class TestInputTokenBudget:
+    def test_budget_leaves_room_for_margin_and_output(self):
+        with patch("src.token_budget.TOKEN_BUDGET_SAFETY_MARGIN", 0.1):
+            assert get_input_token_budget(LLAMA_3_70B_MODEL_ID, 200) == 7172
+            assert get_input_token_budget(MIXTRAL_8X7B_MODEL_ID, 1) == 29490
+
+    def test_unknown_model_gets_the_smallest_window(self):
+        with patch("src.token_budget.TOKEN_BUDGET_SAFETY_MARGIN", 0.0):
+            assert get_input_token_budget("meta.unknown", 0) == 8192
+
+
+class TestTrimMessages:
+    def test_latest_customer_messages_are_kept_first(self):
+        messages = [
+            create_message("customer", "First question " * 10),
+            create_message("coordinator", "First answer " * 10),
+            create_message("customer", "Second question " * 10),
+            create_message("coordinator", "Second answer " * 10),
+        ]
+        tokens = [count_tokens(str(message), "llama") + 1
+                  for message in messages]
+
+        assert trim_messages(messages, tokens[2] + tokens[0] + tokens[3],
+                             "llama") == [messages[0]] + messages[2:]
+        assert trim_messages(messages, tokens[2] + tokens[0],
+                             "llama") == [messages[0], messages[2]]
+        assert trim_messages(messages, tokens[2] + tokens[3],
+                             "llama") == messages[2:]
+
+    def test_message_too_long_for_the_budget_is_truncated(self):
+        messages = [create_message("coordinator", "Short answer."),
+                    create_message("customer", "word " * 1000)]
+
+        trimmed = trim_messages(messages, 100, "llama")
+
+        assert len(trimmed) == 1
+        assert count_tokens(str(trimmed[0]), "llama") < 100
+        assert trimmed[0].message
+        assert messages[1].message.startswith(trimmed[0].message)
+
+    def test_truncate_message_keeps_a_short_message(self):
+        message = create_message("customer", "Hello")
+
+        assert truncate_message(message, 100, "llama") == message
+
+
+class TestFitPrompt:
+    def test_prompt_within_the_budget_is_unchanged(self):
+        request = IntentRequest(
+                messages=[create_message("customer", "Hello")], intents=[])
+
+        assert fit_prompt(request, LLAMA_3_70B_MODEL_ID, 1,
+                          render) == render(request)
+
+    def test_prompt_over_the_budget_drops_messages(self):
+        request = IntentRequest(messages=[
+            create_message("customer", "Old question " * 5000),
+            create_message("coordinator", "Answer"),
+            create_message("customer", "Latest question"),
+        ], intents=[])
+
+        with patch("src.token_budget.set_property") as mock_set_property:
+            prompt = fit_prompt(request, LLAMA_3_70B_MODEL_ID, 1, render)
+
+        assert prompt == render(request.model_copy(
+                update={"messages": request.messages[1:]}))
+        mock_set_property.assert_called_once_with("trimmed_messages", 1)
+
+    def test_overhead_over_the_budget_raises(self):
+        request = IntentRequest(messages=[], intents=[])
+
+        with pytest.raises(ValueError, match="input token budget"):
+            fit_prompt(request, LLAMA_3_70B_MODEL_ID, 1,
+                       lambda _: "word " * 10000)
+
+
+def test_record_token_usage():
+    with patch("src.token_budget.increment") as mock_increment:
+        record_token_usage(LLAMA_3_70B_MODEL_ID, "Hello, world!", "12")
+
+    mock_increment.assert_any_call("estimated_input_tokens", 4)
+    mock_increment.assert_any_call("estimated_output_tokens", 1)